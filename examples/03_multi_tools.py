@@ -70,6 +70,7 @@ def main():
     print("1. Agent 根据问题语义自动选择最合适的工具")
     print("2. 复杂问题可能需要多次工具调用（先查后算）")
     print("3. Agent 能够将多个工具的结果综合起来给出答案")
+    print("4. 像上面这样互不依赖的问题，可以用 agent.run_many([...]) 并发执行")
 
 
 if __name__ == "__main__":
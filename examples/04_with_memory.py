@@ -20,6 +20,7 @@ from src.tools.calculator import CalculatorTool
 from src.tools.weather import WeatherTool
 from src.tools.search import SearchTool
 from src.agent.react import ReActAgent
+from src.memory.history import ConversationHistory, build_llm_summarizer
 
 
 def main():
@@ -39,6 +40,8 @@ def main():
         tool_registry=registry,
         mode="function_calling",
         verbose=True,
+        # 超出 max_turns 的早期对话会被 LLM 压缩成一条摘要，而不是直接丢弃
+        history=ConversationHistory(max_turns=10, summarizer=build_llm_summarizer(llm)),
     )
 
     # ---- 多轮对话演示 ----
@@ -63,7 +66,7 @@ def main():
 
     print("\n📜 完整对话历史：")
     for msg in agent.history.get_messages():
-        role = "👤 用户" if msg["role"] == "user" else "🤖 助手"
+        role = {"user": "👤 用户", "system": "📝 摘要"}.get(msg["role"], "🤖 助手")
         content = msg["content"][:100] + "..." if len(msg["content"]) > 100 else msg["content"]
         print(f"  {role}: {content}")
 
@@ -77,6 +80,7 @@ def main():
     print("2. Agent 能通过历史消息理解指代（'那上海呢' → 天气）")
     print("3. 历史信息帮助 Agent 在多轮间串联数据")
     print("4. max_turns 限制防止上下文过长导致性能下降")
+    print("5. 配置 summarizer 后，被截断的早期对话会压缩为摘要保留关键信息")
 
 
 if __name__ == "__main__":
@@ -9,6 +9,7 @@
     python -m examples.07_debate
 """
 
+import asyncio
 import sys
 import os
 
@@ -59,9 +60,9 @@ def main():
     print(f"\n辩论参与者: {debate._debater_names}")
     print(f"裁判: {debate._judge_role.name}")
 
-    # 开始辩论
+    # 开始辩论（arun 让同一轮的辩手并发发言）
     topic = "Python vs Go：哪个更适合开发后端微服务？请从性能、开发效率、生态、运维等角度分析。"
-    result = debate.run(topic)
+    result = asyncio.run(debate.arun(topic))
 
     print(f"\n{'='*60}")
     print("⚖️  最终裁决:")
@@ -73,6 +74,7 @@ def main():
     print("2. 第二轮辩论中，Agent 能看到对方观点并进行回应")
     print("3. 裁判综合所有轮次的观点做出最终裁决")
     print("4. 这种模式适合需要多角度分析的决策场景")
+    print("5. 同一轮的辩手互不依赖，arun 用 asyncio.gather 并发发言，单轮耗时取决于最慢的辩手")
 
 
 if __name__ == "__main__":
@@ -17,11 +17,11 @@ from src.agent.react import ReActAgent
 from src.llm import LLMClient
 from src.skills.loader import load_skills
 from src.tools.base import ToolRegistry
-from src.tools.calculator import CalculatorTool
+from src.tools.calculator import CALCULATOR
 from src.tools.mcp_registry import load_mcp_tools
 from src.tools.read_local_file import ReadLocalFileTool
 from src.tools.search import SearchTool
-from src.tools.weather import WeatherTool
+from src.tools.weather import WEATHER
 
 EXAMPLE_TASKS = [
     "先查询北京和上海的天气，再比较哪个城市更暖和，并给出一句出行建议。",
@@ -68,8 +68,8 @@ class PlaygroundConfig:
 def build_registry() -> ToolRegistry:
     """构建默认工具集。"""
     registry = ToolRegistry()
-    registry.register(CalculatorTool())
-    registry.register(WeatherTool())
+    registry.register(CALCULATOR)
+    registry.register(WEATHER)
     registry.register(ReadLocalFileTool())
 
     for tool in load_mcp_tools():
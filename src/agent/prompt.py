@@ -1,8 +1,8 @@
 """Agent Prompt 模板。
 
 包含五类核心提示词：
-1. Function Calling 模式
-2. 纯文本解析模式
+1. Function Calling 模式（含没有可用工具时的精简版本）
+2. 纯文本解析模式（含早前步骤的压缩摘要）
 3. Plan-and-Execute 的规划器
 4. Plan-and-Execute 的汇总器
 5. Plan-and-Execute 的验证与反思器
@@ -22,9 +22,13 @@ SYSTEM_PROMPT_FUNCTION_CALLING = """你是一个智能助手，可以使用工
 注意事项：
 - 仔细思考后再决定是否需要使用工具
 - 如果你已经知道答案，直接回答即可，不必强行使用工具
-- 每次只调用一个最相关的工具
+- 相互独立的查询（如同时查询多个城市）可以在同一轮中一次性发起多个工具调用
 - 根据工具返回的结果组织清晰的回答"""
 
+# 没有任何可用工具时（如只负责裁决、写作的角色）使用的精简提示词，
+# 省去工具使用说明，减少每次请求的输入 token
+SYSTEM_PROMPT_NO_TOOLS = """你是一个智能助手。请根据你已有的知识和对话上下文，直接给出清晰、准确的回答；信息不足时请明确说明，不要编造。"""
+
 # ============================================================
 # 模式 2：纯文本解析模式的系统提示词
 # ============================================================
@@ -58,6 +62,10 @@ Final Answer: <你的最终回答>
 - 如果不需要工具，直接给出 Final Answer
 - 不要编造工具不存在的信息"""
 
+# 纯文本解析模式下，上下文过长时把早前的推理步骤压缩为一段摘要
+SYSTEM_PROMPT_STEP_SUMMARIZER = """你是一个推理过程压缩助手。下面是 Agent 早前的若干推理步骤（思考、工具调用与观察结果）。
+请把它们压缩为不超过 300 字的摘要，保留已调用过的工具、关键观察结果、数字与中间结论，不要添加原文没有的信息。"""
+
 # ============================================================
 # 模式 3：Plan-and-Execute 的 Planner 提示词
 # ============================================================
@@ -8,17 +8,22 @@
 
 from __future__ import annotations
 
+import asyncio
+import copy
 import json
 import re
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 
 from src.agent.prompt import (
     SYSTEM_PROMPT_FUNCTION_CALLING,
+    SYSTEM_PROMPT_NO_TOOLS,
     SYSTEM_PROMPT_PLAN_AND_EXECUTE_PLANNER,
     SYSTEM_PROMPT_PLAN_AND_EXECUTE_REFLECTOR,
     SYSTEM_PROMPT_PLAN_AND_EXECUTE_SUMMARIZER,
     SYSTEM_PROMPT_PLAN_AND_EXECUTE_VERIFIER,
+    SYSTEM_PROMPT_STEP_SUMMARIZER,
     SYSTEM_PROMPT_TEXT_PARSING,
 )
 from src.agent.state import AgentRunResult, PlanExecutionState, StepRun, ToolTrace, VerificationResult
@@ -28,9 +33,24 @@ from src.skills import get_skills_prompt_section
 from src.tools.base import ToolRegistry
 
 SUPPORTED_MODES = ("function_calling", "text_parsing", "plan_and_execute")
+# 模式 → 实现方法名。按名字查找，子类覆盖对应方法时仍然生效
+_MODE_RUNNERS = {
+    "function_calling": "_run_function_calling",
+    "text_parsing": "_run_text_parsing",
+    "plan_and_execute": "_run_plan_and_execute",
+}
 SUPPORTED_EXECUTOR_MODES = ("function_calling", "text_parsing")
+STEP_SUMMARY_PREFIX = "[早前步骤摘要]: "
 DEFAULT_FALLBACK_MESSAGE = "抱歉，我在多次尝试后仍未能得出明确结论。请尝试简化问题或提供更多信息。"
 
+# text_parsing 模式与 JSON 提取使用的正则，模块加载时编译一次
+_FINAL_ANSWER_RE = re.compile(r"Final Answer:\s*(.+)", re.DOTALL)
+_ACTION_RE = re.compile(r"Action:\s*(\w+)")
+_ACTION_INPUT_RE = re.compile(r"Action Input:\s*({.*?})", re.DOTALL)
+_FENCED_JSON_RE = re.compile(r"```(?:json)?\s*(\{.*?\}|\[.*?\])\s*```", re.DOTALL)
+_JSON_DECODER = json.JSONDecoder()
+_SENTENCE_ENDINGS = ("。", "！", "？", ".", "!", "?", "\n")
+
 
 class ReActAgent:
     """Agent：支持直接 ReAct 与 Plan-and-Execute 两类策略。"""
@@ -49,6 +69,15 @@ class ReActAgent:
         enable_verifier: bool = True,
         available_skills: set[str] | None = None,
         skills_path: str | Path | None = None,
+        stream: bool = False,
+        parallel_tools: bool = True,
+        history: ConversationHistory | None = None,
+        max_obs_chars: int | None = 2000,
+        max_context_chars: int | None = None,
+        eager_finish: bool = False,
+        eager_finish_chars: int = 1000,
+        preset_openai_tools: list[dict[str, Any]] | None = None,
+        on_chunk: Callable[[str], None] | None = None,
     ):
         """
         Args:
@@ -66,6 +95,23 @@ class ReActAgent:
             enable_verifier: 是否在 plan_and_execute 模式下启用结果验收。
             available_skills: 当前 Agent 可见的 skill 名集合；为 None 时加载全部已发现 skills。
             skills_path: 自定义 skills 根目录，默认使用项目根目录下的 `skills/`。
+            stream: function_calling 模式下是否以流式方式读取 LLM 输出，
+                开启后 verbose 模式会边生成边打印。
+            parallel_tools: 同一轮返回多个工具调用时是否并发执行，
+                观察结果仍按原调用顺序回填。
+            history: 自定义对话历史管理器（如配置了摘要压缩的 ConversationHistory），
+                为 None 时使用默认配置。
+            max_obs_chars: text_parsing 模式下写回上下文的单条观察结果最大字符数，
+                超出部分截断（轨迹中仍保留完整结果）；为 None 时不截断。
+            max_context_chars: text_parsing 模式下本次推理步骤累计的最大字符数，
+                超过时用一次 llm.chat_simple 把较早的步骤压缩为摘要；为 None 时不压缩。
+            eager_finish: 流式模式下，若本步没有任何工具调用且正文已超过 eager_finish_chars，
+                在当前句子结束处提前关闭流并返回，省去长尾生成。会截断回答，默认关闭。
+            eager_finish_chars: 触发 eager_finish 的正文长度阈值。
+            preset_openai_tools: 预先计算好的 OpenAI 工具 schema 列表（如多 Agent 为角色
+                冻结的工具子集），提供时直接使用，不再由 tool_registry 生成。
+            on_chunk: 流式模式下每收到一段正文增量就调用一次（本次响应出现工具调用后
+                不再转发），便于下游边生成边消费。
         """
         self.llm = llm
         self.tools = tool_registry
@@ -79,7 +125,18 @@ class ReActAgent:
         self.enable_verifier = enable_verifier
         self.available_skills = set(available_skills) if available_skills is not None else None
         self.skills_path = Path(skills_path).resolve() if skills_path else None
-        self.history = ConversationHistory()
+        self.stream = stream
+        self.parallel_tools = parallel_tools
+        self.history = history if history is not None else ConversationHistory()
+        self.max_obs_chars = max_obs_chars
+        self.max_context_chars = max_context_chars
+        self.eager_finish = eager_finish
+        self.eager_finish_chars = eager_finish_chars
+        self.preset_openai_tools = preset_openai_tools
+        self.on_chunk = on_chunk
+        # 拼装后的 system prompt 按基础 prompt 缓存：避免每次 run 都重新扫描 skills 目录，
+        # 也保证多次请求的 system 前缀逐字节一致，便于命中服务端 prompt 缓存
+        self._composed_prompts: dict[str, str] = {}
 
     def run(self, query: str) -> str:
         """运行 Agent 处理用户查询。"""
@@ -88,17 +145,48 @@ class ReActAgent:
     def run_with_trace(self, query: str) -> AgentRunResult:
         """运行 Agent，并返回结构化执行轨迹。"""
         self._validate_mode_config()
+        return getattr(self, _MODE_RUNNERS[self.mode])(query)
 
-        if self.mode == "function_calling":
-            return self._run_function_calling(query)
-        if self.mode == "text_parsing":
-            return self._run_text_parsing(query)
-        if self.mode == "plan_and_execute":
-            return self._run_plan_and_execute(query)
+    async def arun(self, query: str) -> str:
+        """run 的异步版本，便于多个 Agent 通过 asyncio.gather 并发执行。"""
+        return (await self.arun_with_trace(query)).final_answer
 
-        raise ValueError(
-            f"不支持的模式: {self.mode}，请使用 {', '.join(repr(mode) for mode in SUPPORTED_MODES)}"
-        )
+    async def arun_with_trace(self, query: str) -> AgentRunResult:
+        """run_with_trace 的异步版本。
+
+        非流式的 function_calling 模式使用 llm.achat 原生异步执行；
+        其他模式在线程中运行同步实现，不阻塞事件循环。
+        """
+        self._validate_mode_config()
+
+        if self.mode == "function_calling" and not self.stream:
+            return await self._arun_function_calling(query)
+        return await asyncio.to_thread(self.run_with_trace, query)
+
+    def run_many(self, queries: list[str]) -> list[str]:
+        """并发处理多个互不依赖的查询，按输入顺序返回结果。
+
+        内部通过 asyncio.run 驱动 arun_many，因此不能在已运行的事件循环中调用，
+        此时请直接 await arun_many。
+        """
+        return asyncio.run(self.arun_many(queries))
+
+    async def arun_many(self, queries: list[str]) -> list[str]:
+        """并发处理多个互不依赖的查询。
+
+        每个查询使用一个浅拷贝的 Agent 与全新的对话历史，互不共享上下文，
+        也不会写入当前 Agent 的历史。
+        """
+        clones = [self._clone_for_query() for _ in queries]
+        return list(await asyncio.gather(*(
+            clone.arun(query) for clone, query in zip(clones, queries)
+        )))
+
+    def _clone_for_query(self) -> ReActAgent:
+        """复制一个共享 LLM 与工具、但拥有独立对话历史的 Agent。"""
+        clone = copy.copy(self)
+        clone.history = ConversationHistory()
+        return clone
 
     @classmethod
     def available_modes(cls) -> tuple[str, ...]:
@@ -111,76 +199,144 @@ class ReActAgent:
 
     def _run_function_calling(self, query: str) -> AgentRunResult:
         """使用 OpenAI Function Calling 模式运行 Agent。"""
-        sys_prompt = self._compose_system_prompt(self.system_prompt or SYSTEM_PROMPT_FUNCTION_CALLING)
+        messages, openai_tools = self._start_function_calling(query)
+        tool_traces: list[ToolTrace] = []
+        tool_memo: dict[tuple[str, str], str] = {}
+
+        for step in range(1, self.max_steps + 1):
+            self._log("\n--- 第 %d 步 ---", step)
+
+            if self.stream:
+                content, tool_calls, observations = self._stream_step(messages, openai_tools, tool_memo)
+            else:
+                response = self.llm.chat(messages, tools=openai_tools)
+                content, tool_calls = self._unpack_message(response.choices[0].message)
+                observations = None
+
+            if not tool_calls:
+                return self._finish_function_calling(query, messages, content, tool_traces)
+
+            if observations is None:
+                observations = self._execute_tool_calls(tool_calls, tool_memo)
+            self._record_tool_step(messages, content, tool_calls, observations, tool_traces)
+
+        return self._fallback_function_calling(query, tool_traces)
+
+    async def _arun_function_calling(self, query: str) -> AgentRunResult:
+        """_run_function_calling 的异步版本，LLM 请求走 llm.achat。"""
+        messages, openai_tools = self._start_function_calling(query)
+        tool_traces: list[ToolTrace] = []
+        tool_memo: dict[tuple[str, str], str] = {}
+
+        for step in range(1, self.max_steps + 1):
+            self._log("\n--- 第 %d 步 ---", step)
+
+            response = await self.llm.achat(messages, tools=openai_tools)
+            content, tool_calls = self._unpack_message(response.choices[0].message)
+
+            if not tool_calls:
+                return self._finish_function_calling(query, messages, content, tool_traces)
+
+            observations = await self._aexecute_tool_calls(tool_calls, tool_memo)
+            self._record_tool_step(messages, content, tool_calls, observations, tool_traces)
+
+        return self._fallback_function_calling(query, tool_traces)
+
+    def _start_function_calling(
+        self, query: str
+    ) -> tuple[list[dict[str, Any]], list[dict[str, Any]] | None]:
+        """构造初始消息列表与工具定义。"""
+        sys_prompt = self._compose_system_prompt(self._function_calling_base_prompt())
         messages: list[dict[str, Any]] = [
             {"role": "system", "content": sys_prompt},
         ]
-        messages.extend(self.history.get_messages())
+        messages.extend(self.history.iter_messages())
         messages.append({"role": "user", "content": query})
 
-        openai_tools = self.tools.to_openai_tools()
-        tool_traces: list[ToolTrace] = []
-
-        self._log(f"\n{'='*60}")
-        self._log(f"用户问题: {query}")
-        self._log(f"{'='*60}")
+        self._log("\n%s\n用户问题: %s\n%s", "=" * 60, query, "=" * 60)
 
-        for step in range(1, self.max_steps + 1):
-            self._log(f"\n--- 第 {step} 步 ---")
-
-            response = self.llm.chat(messages, tools=openai_tools if openai_tools else None)
-            choice = response.choices[0]
-            message = choice.message
-
-            assistant_msg: dict[str, Any] = {"role": "assistant"}
-            if message.content:
-                assistant_msg["content"] = message.content
-            if message.tool_calls:
-                assistant_msg["tool_calls"] = [
-                    {
-                        "id": tc.id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.function.name,
-                            "arguments": tc.function.arguments,
-                        },
-                    }
-                    for tc in message.tool_calls
-                ]
-            messages.append(assistant_msg)
+        openai_tools = (
+            self.preset_openai_tools
+            if self.preset_openai_tools is not None
+            else self.tools.to_openai_tools()
+        )
+        return messages, openai_tools or None
 
-            if not message.tool_calls:
-                final_answer = message.content or ""
-                self._log(f"\n最终回答: {final_answer}")
-                self._save_to_history(query, final_answer)
-                return AgentRunResult(
-                    final_answer=final_answer,
-                    tool_traces=tool_traces,
-                    raw_output=message.content or "",
-                )
+    @staticmethod
+    def _unpack_message(message: Any) -> tuple[str | None, list[dict[str, Any]]]:
+        """将 SDK 返回的 assistant 消息转换为 (content, OpenAI 格式 tool_calls)。"""
+        tool_calls = [
+            {
+                "id": tc.id,
+                "type": "function",
+                "function": {
+                    "name": tc.function.name,
+                    "arguments": tc.function.arguments,
+                },
+            }
+            for tc in message.tool_calls or []
+        ]
+        return message.content, tool_calls
 
-            for tool_call in message.tool_calls:
-                func_name = tool_call.function.name
-                func_args = tool_call.function.arguments
+    def _finish_function_calling(
+        self,
+        query: str,
+        messages: list[dict[str, Any]],
+        content: str | None,
+        tool_traces: list[ToolTrace],
+    ) -> AgentRunResult:
+        """没有工具调用时，以 assistant 内容作为最终回答。"""
+        assistant_msg: dict[str, Any] = {"role": "assistant"}
+        if content:
+            assistant_msg["content"] = content
+        messages.append(assistant_msg)
+
+        final_answer = content or ""
+        self._log("\n最终回答: %s", final_answer)
+        self._save_to_history(query, final_answer)
+        return AgentRunResult(
+            final_answer=final_answer,
+            tool_traces=tool_traces,
+            raw_output=content or "",
+        )
 
-                self._log(f"  Thought: {message.content or '(思考中...)'}")
-                self._log(f"  Action: {func_name}")
-                self._log(f"  Action Input: {func_args}")
+    def _record_tool_step(
+        self,
+        messages: list[dict[str, Any]],
+        content: str | None,
+        tool_calls: list[dict[str, Any]],
+        observations: list[str],
+        tool_traces: list[ToolTrace],
+    ) -> None:
+        """把本轮 assistant 工具调用及其观察结果追加到消息列表与轨迹中。"""
+        assistant_msg: dict[str, Any] = {"role": "assistant"}
+        if content:
+            assistant_msg["content"] = content
+        assistant_msg["tool_calls"] = tool_calls
+        messages.append(assistant_msg)
+
+        for tool_call, observation in zip(tool_calls, observations):
+            func_name = tool_call["function"]["name"]
+            func_args = tool_call["function"]["arguments"]
 
-                observation = self.tools.execute(func_name, func_args)
-                tool_traces.append(ToolTrace(
-                    tool_name=func_name,
-                    tool_input=func_args,
-                    observation=observation,
-                ))
-                self._log(f"  Observation: {observation}")
+            tool_traces.append(ToolTrace(
+                tool_name=func_name,
+                tool_input=func_args,
+                observation=observation,
+            ))
+            self._log(
+                "  Thought: %s\n  Action: %s\n  Action Input: %s\n  Observation: %s",
+                content or "(思考中...)", func_name, func_args, observation,
+            )
 
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "content": observation,
-                })
+            messages.append({
+                "role": "tool",
+                "tool_call_id": tool_call["id"],
+                "content": observation,
+            })
 
+    def _fallback_function_calling(self, query: str, tool_traces: list[ToolTrace]) -> AgentRunResult:
+        """达到最大步数时的回退结果。"""
         self._save_to_history(query, DEFAULT_FALLBACK_MESSAGE)
         return AgentRunResult(
             final_answer=DEFAULT_FALLBACK_MESSAGE,
@@ -188,6 +344,240 @@ class ReActAgent:
             notes=["达到最大推理步数后回退到默认回答。"],
         )
 
+    def _execute_tool_calls(
+        self,
+        tool_calls: list[dict[str, Any]],
+        memo: dict[tuple[str, str], str] | None = None,
+    ) -> list[str]:
+        """执行同一轮的全部工具调用，按原调用顺序返回观察结果。
+
+        同一轮中 (工具名, 参数) 相同的调用只执行一次；idempotent 工具的结果记入 memo，
+        同一次 run 的后续步骤直接复用。每个调用仍各自对应一条观察结果。
+        """
+        memo = {} if memo is None else memo
+        keys, pending = self._pending_tool_calls(tool_calls, memo)
+        calls = list(pending.values())
+
+        if not self.parallel_tools or len(calls) < 2:
+            outputs = [
+                self.tools.execute(tc["function"]["name"], tc["function"]["arguments"])
+                for tc in calls
+            ]
+        else:
+            with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+                futures = [
+                    pool.submit(self.tools.execute, tc["function"]["name"], tc["function"]["arguments"])
+                    for tc in calls
+                ]
+                outputs = [future.result() for future in futures]
+
+        return self._resolve_observations(keys, dict(zip(pending, outputs)), memo)
+
+    async def _aexecute_tool_calls(
+        self,
+        tool_calls: list[dict[str, Any]],
+        memo: dict[tuple[str, str], str] | None = None,
+    ) -> list[str]:
+        """_execute_tool_calls 的异步版本，工具在线程中执行以免阻塞事件循环。"""
+        memo = {} if memo is None else memo
+        keys, pending = self._pending_tool_calls(tool_calls, memo)
+        calls = list(pending.values())
+
+        if not self.parallel_tools or len(calls) < 2:
+            outputs = [
+                await asyncio.to_thread(
+                    self.tools.execute, tc["function"]["name"], tc["function"]["arguments"]
+                )
+                for tc in calls
+            ]
+        else:
+            outputs = await asyncio.gather(*(
+                asyncio.to_thread(self.tools.execute, tc["function"]["name"], tc["function"]["arguments"])
+                for tc in calls
+            ))
+
+        return self._resolve_observations(keys, dict(zip(pending, outputs)), memo)
+
+    @staticmethod
+    def _tool_call_key(name: str, arguments: str | dict[str, Any]) -> tuple[str, str]:
+        """以 (工具名, 规范化后的参数 JSON) 作为去重 key。"""
+        try:
+            parsed = json.loads(arguments) if isinstance(arguments, str) else arguments
+            canonical = json.dumps(parsed, sort_keys=True, ensure_ascii=False)
+        except (TypeError, ValueError):
+            canonical = str(arguments)
+        return name, canonical
+
+    def _pending_tool_calls(
+        self,
+        tool_calls: list[dict[str, Any]],
+        memo: dict[tuple[str, str], str],
+    ) -> tuple[list[tuple[str, str]], dict[tuple[str, str], dict[str, Any]]]:
+        """计算每个调用的 key，并挑出本轮真正需要执行的（去重且未命中 memo 的）调用。"""
+        keys = [
+            self._tool_call_key(tc["function"]["name"], tc["function"]["arguments"])
+            for tc in tool_calls
+        ]
+        pending: dict[tuple[str, str], dict[str, Any]] = {}
+        for key, tool_call in zip(keys, tool_calls):
+            if key not in memo and key not in pending:
+                pending[key] = tool_call
+        return keys, pending
+
+    def _resolve_observations(
+        self,
+        keys: list[tuple[str, str]],
+        results: dict[tuple[str, str], str],
+        memo: dict[tuple[str, str], str],
+    ) -> list[str]:
+        """记录 idempotent 工具的结果，并按调用顺序展开观察结果。"""
+        for key, result in results.items():
+            tool = self.tools.get(key[0])
+            if tool is not None and tool.idempotent:
+                memo[key] = result
+        return [results[key] if key in results else memo[key] for key in keys]
+
+    def _stream_step(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None,
+        memo: dict[tuple[str, str], str],
+    ) -> tuple[str, list[dict[str, Any]], list[str] | None]:
+        """流式执行一步推理。
+
+        开启 parallel_tools 时，某个工具调用的参数 JSON 一旦完整就立即提交执行，
+        与 LLM 继续生成后续工具调用的时间重叠；未能提前提交的调用在流结束后补交。
+        重复调用与 memo 命中的处理与 _execute_tool_calls 一致。
+
+        Returns:
+            (content, tool_calls, observations)；未开启 parallel_tools 时
+            observations 为 None，由调用方按顺序执行工具。
+        """
+        if not self.parallel_tools:
+            content, tool_calls, _ = self._chat_streaming(messages, tools)
+            return content, tool_calls, None
+
+        with ThreadPoolExecutor() as pool:
+            submitted: dict[tuple[str, str], Future[str]] = {}
+
+            def submit(name: str, arguments: str) -> Future[str]:
+                key = self._tool_call_key(name, arguments)
+                if key not in submitted:
+                    if key in memo:
+                        future: Future[str] = Future()
+                        future.set_result(memo[key])
+                    else:
+                        future = pool.submit(self.tools.execute, name, arguments)
+                    submitted[key] = future
+                return submitted[key]
+
+            content, tool_calls, futures = self._chat_streaming(messages, tools, submit)
+            for tool_call, future in zip(tool_calls, futures):
+                if future is None:
+                    submit(tool_call["function"]["name"], tool_call["function"]["arguments"])
+            results = {key: future.result() for key, future in submitted.items()}
+
+        keys = [
+            self._tool_call_key(tc["function"]["name"], tc["function"]["arguments"])
+            for tc in tool_calls
+        ]
+        return content, tool_calls, self._resolve_observations(keys, results, memo)
+
+    def _chat_streaming(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None,
+        submit: Callable[[str, str], Future[str]] | None = None,
+    ) -> tuple[str, list[dict[str, Any]], list[Future[str] | None]]:
+        """以流式方式请求 LLM，边接收边打印，并聚合出完整的 assistant 消息。
+
+        Args:
+            submit: 提供时，参数已完整的工具调用会在流结束前通过它提交执行。
+
+        Returns:
+            (content, tool_calls, futures)，tool_calls 为 OpenAI messages 格式的列表，
+            futures 与 tool_calls 一一对应，未提前提交的位置为 None。
+        """
+        content_parts: list[str] = []
+        content_chars = 0
+        partial_calls: dict[int, dict[str, Any]] = {}
+
+        chunks = self.llm.chat_stream(messages, tools=tools)
+        for delta_text, tool_call_deltas, finish_reason in chunks:
+            if delta_text:
+                if not content_parts:
+                    self._log_stream("  ")
+                content_parts.append(delta_text)
+                content_chars += len(delta_text)
+                self._log_stream(delta_text)
+                if self.on_chunk is not None and not partial_calls:
+                    self.on_chunk(delta_text)
+
+            for tc_delta in tool_call_deltas:
+                call = partial_calls.setdefault(
+                    tc_delta.index,
+                    {"id": "", "name": "", "arguments": [], "future": None},
+                )
+                if tc_delta.id:
+                    call["id"] = tc_delta.id
+                function = tc_delta.function
+                if function is None:
+                    continue
+                if function.name:
+                    call["name"] += function.name
+                if function.arguments:
+                    call["arguments"].append(function.arguments)
+                    if submit is not None and "}" in function.arguments:
+                        self._dispatch_if_complete(call, submit)
+
+            if finish_reason is not None:
+                break
+            if (
+                self.eager_finish
+                and not partial_calls
+                and content_chars >= self.eager_finish_chars
+                and delta_text.endswith(_SENTENCE_ENDINGS)
+            ):
+                self._log_stream(" …")
+                break
+
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()  # 提前结束时释放底层流
+
+        if content_parts:
+            self._log_stream("\n")
+
+        ordered_calls = [call for _, call in sorted(partial_calls.items())]
+        tool_calls = [
+            {
+                "id": call["id"],
+                "type": "function",
+                "function": {
+                    "name": call["name"],
+                    "arguments": "".join(call["arguments"]),
+                },
+            }
+            for call in ordered_calls
+        ]
+        return "".join(content_parts), tool_calls, [call["future"] for call in ordered_calls]
+
+    @staticmethod
+    def _dispatch_if_complete(
+        call: dict[str, Any],
+        submit: Callable[[str, str], Future[str]],
+    ) -> None:
+        """参数 JSON 已完整闭合时，把工具调用提前提交执行。"""
+        if call["future"] is not None or not call["name"]:
+            return
+        arguments = "".join(call["arguments"]).strip()
+        try:
+            _, end = _JSON_DECODER.raw_decode(arguments)
+        except ValueError:
+            return
+        if end == len(arguments):
+            call["future"] = submit(call["name"], arguments)
+
     # ================================================================
     # 模式 2：纯文本解析
     # ================================================================
@@ -200,25 +590,26 @@ class ReActAgent:
         messages: list[dict[str, Any]] = [
             {"role": "system", "content": system_prompt},
         ]
-        messages.extend(self.history.get_messages())
+        messages.extend(self.history.iter_messages())
         messages.append({"role": "user", "content": context})
+        steps_start = len(messages)
+        steps_chars = 0
         tool_traces: list[ToolTrace] = []
 
-        self._log(f"\n{'='*60}")
-        self._log(f"用户问题: {query}")
-        self._log(f"{'='*60}")
+        self._log("\n%s\n用户问题: %s\n%s", "=" * 60, query, "=" * 60)
 
         for step in range(1, self.max_steps + 1):
-            self._log(f"\n--- 第 {step} 步 ---")
+            self._log("\n--- 第 %d 步 ---", step)
 
             response = self.llm.chat(messages)
             text = response.choices[0].message.content or ""
-            self._log(f"  LLM 输出:\n{self._indent(text)}")
+            if self.verbose:
+                self._log("  LLM 输出:\n%s", self._indent(text))
 
-            final_match = re.search(r"Final Answer:\s*(.+)", text, re.DOTALL)
+            final_match = _FINAL_ANSWER_RE.search(text)
             if final_match:
                 final_answer = final_match.group(1).strip()
-                self._log(f"\n最终回答: {final_answer}")
+                self._log("\n最终回答: %s", final_answer)
                 self._save_to_history(query, final_answer)
                 return AgentRunResult(
                     final_answer=final_answer,
@@ -226,8 +617,7 @@ class ReActAgent:
                     raw_output=text,
                 )
 
-            action_match = re.search(r"Action:\s*(\w+)", text)
-            input_match = re.search(r"Action Input:\s*({.*?})", text, re.DOTALL)
+            action_match = _ACTION_RE.search(text)
 
             if not action_match:
                 self._save_to_history(query, text)
@@ -238,10 +628,9 @@ class ReActAgent:
                 )
 
             action_name = action_match.group(1)
-            action_input = input_match.group(1) if input_match else "{}"
+            action_input = self._extract_action_input(text)
 
-            self._log(f"  Action: {action_name}")
-            self._log(f"  Action Input: {action_input}")
+            self._log("  Action: %s\n  Action Input: %s", action_name, action_input)
 
             observation = self.tools.execute(action_name, action_input)
             tool_traces.append(ToolTrace(
@@ -249,13 +638,16 @@ class ReActAgent:
                 tool_input=action_input,
                 observation=observation,
             ))
-            self._log(f"  Observation: {observation}")
+            self._log("  Observation: %s", observation)
 
             messages.append({"role": "assistant", "content": text})
             messages.append({
                 "role": "user",
-                "content": f"Observation: {observation}\n\n请继续思考，或给出 Final Answer。",
+                "content": f"Observation: {self._clip_observation(observation)}\n\n请继续思考，或给出 Final Answer。",
             })
+            steps_chars += len(text) + len(messages[-1]["content"])
+            if self.max_context_chars is not None and steps_chars > self.max_context_chars:
+                steps_chars = self._condense_steps(messages, steps_start)
 
         self._save_to_history(query, DEFAULT_FALLBACK_MESSAGE)
         return AgentRunResult(
@@ -264,6 +656,53 @@ class ReActAgent:
             notes=["达到最大推理步数后回退到默认回答。"],
         )
 
+    def _clip_observation(self, observation: str) -> str:
+        """截断过长的观察结果，避免每一步都重复发送整段工具输出。"""
+        if self.max_obs_chars is None or len(observation) <= self.max_obs_chars:
+            return observation
+        omitted = len(observation) - self.max_obs_chars
+        return f"{observation[:self.max_obs_chars]}\n…[已截断 {omitted} 字符]"
+
+    def _condense_steps(self, messages: list[dict[str, Any]], steps_start: int) -> int:
+        """把除最新一步外的推理步骤（含上一版摘要）压缩为一条摘要消息。
+
+        Returns:
+            压缩后推理步骤的累计字符数。
+        """
+        steps = messages[steps_start:]
+        if len(steps) > 2:
+            earlier, latest = steps[:-2], steps[-2:]
+            transcript = "\n\n".join(message["content"] for message in earlier)
+            summary = self.llm.chat_simple(transcript, system=SYSTEM_PROMPT_STEP_SUMMARIZER).strip()
+            self._log("  🗜️  压缩早前步骤: %d 条消息 -> 1 条摘要", len(earlier))
+            messages[steps_start:] = [
+                {"role": "user", "content": f"{STEP_SUMMARY_PREFIX}{summary}"},
+                *latest,
+            ]
+        return sum(len(message["content"]) for message in messages[steps_start:])
+
+    @staticmethod
+    def _extract_action_input(text: str) -> str:
+        """提取 Action Input 后的 JSON 文本。
+
+        优先用 JSONDecoder.raw_decode 从标记处线性扫描，支持嵌套对象；
+        解析失败时才回退到正则匹配，两者都失败时返回 "{}"。
+        """
+        marker = text.find("Action Input:")
+        if marker != -1:
+            start = marker + len("Action Input:")
+            while start < len(text) and text[start].isspace():
+                start += 1
+            try:
+                _, end = _JSON_DECODER.raw_decode(text, start)
+            except json.JSONDecodeError:
+                pass
+            else:
+                return text[start:end]
+
+        input_match = _ACTION_INPUT_RE.search(text)
+        return input_match.group(1) if input_match else "{}"
+
     # ================================================================
     # 模式 3：Plan-and-Execute
     # ================================================================
@@ -333,7 +772,7 @@ class ReActAgent:
             state.verification = verification
             last_result = self._build_plan_execution_result(final_answer, state)
             if verification.passed:
-                self._log(f"\n最终回答: {final_answer}")
+                self._log("\n最终回答: %s", final_answer)
                 self._save_to_history(query, final_answer)
                 return last_result
 
@@ -514,7 +953,7 @@ class ReActAgent:
         )
 
         if mode == "function_calling":
-            base_prompt = self.system_prompt or SYSTEM_PROMPT_FUNCTION_CALLING
+            base_prompt = self._function_calling_base_prompt()
             return self._compose_system_prompt(f"{base_prompt}\n\n{execution_guidance}")
 
         base_prompt = self.system_prompt or "你是一个智能助手，可以使用工具完成当前子任务。"
@@ -838,8 +1277,23 @@ class ReActAgent:
             skills_path=self.skills_path,
         )
 
+    def _function_calling_base_prompt(self) -> str:
+        """function_calling 模式的基础 system prompt；没有工具时使用不含工具说明的精简版。"""
+        if self.system_prompt:
+            return self.system_prompt
+        return SYSTEM_PROMPT_FUNCTION_CALLING if len(self.tools) else SYSTEM_PROMPT_NO_TOOLS
+
     def _compose_system_prompt(self, base_prompt: str) -> str:
-        """把基础 system prompt 与 skills 提示拼装为最终系统提示。"""
+        """把基础 system prompt 与 skills 提示拼装为最终系统提示。
+
+        结果按 base_prompt 缓存；skills 目录变化后可调用 refresh_system_prompts 重新加载。
+        """
+        composed = self._composed_prompts.get(base_prompt)
+        if composed is None:
+            composed = self._composed_prompts[base_prompt] = self._build_composed_prompt(base_prompt)
+        return composed
+
+    def _build_composed_prompt(self, base_prompt: str) -> str:
         if "<skill_system>" in base_prompt:
             return base_prompt
         skills_section = self._build_skills_prompt()
@@ -847,6 +1301,10 @@ class ReActAgent:
             return base_prompt
         return f"{base_prompt}\n\n{skills_section}"
 
+    def refresh_system_prompts(self) -> None:
+        """清空已拼装的 system prompt 缓存，下次运行时重新加载 skills。"""
+        self._composed_prompts.clear()
+
     def _save_to_history(self, query: str, answer: str) -> None:
         """保存一轮完整对话到历史。"""
         self.history.add_user_message(query)
@@ -854,7 +1312,7 @@ class ReActAgent:
 
     def _extract_json_block(self, text: str) -> str | None:
         """从任意文本中提取 JSON 对象或数组。"""
-        fenced_match = re.search(r"```(?:json)?\s*(\{.*?\}|\[.*?\])\s*```", text, re.DOTALL)
+        fenced_match = _FENCED_JSON_RE.search(text)
         if fenced_match:
             return fenced_match.group(1)
 
@@ -934,10 +1392,20 @@ class ReActAgent:
         for index, step in enumerate(plan, 1):
             self._log(f"  {index}. {step['title']} -> {step['task']}")
 
-    def _log(self, message: str) -> None:
-        """打印调试信息。"""
+    def _log(self, fmt: str, *args: Any) -> None:
+        """打印调试信息。
+
+        支持 %-style 延迟格式化：verbose 关闭时直接返回，不会构造（可能很长的）
+        观察结果字符串；多行内容合并为一次 print 写出。
+        """
+        if not self.verbose:
+            return
+        print(fmt % args if args else fmt)
+
+    def _log_stream(self, text: str) -> None:
+        """流式打印增量文本（不换行，立即刷新）。"""
         if self.verbose:
-            print(message)
+            print(text, end="", flush=True)
 
     @staticmethod
     def _indent(text: str, prefix: str = "    ") -> str:
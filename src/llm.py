@@ -7,20 +7,77 @@
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import importlib.util
+import json
 import os
-from typing import Any
+import threading
+import weakref
+from collections.abc import MutableMapping
+from contextlib import asynccontextmanager, contextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterator
 from urllib.parse import urlparse
 
 from dotenv import load_dotenv
 from openai import OpenAI
 from openai.types.chat import ChatCompletion
 
+if TYPE_CHECKING:
+    from openai import Stream
+    from openai.types.chat import ChatCompletionChunk
+
 load_dotenv()
 
 DEFAULT_OPENAI_BASE_URL = "http://localhost:8002/v1"
 DEFAULT_OPENAI_MODEL = "openai/gpt-oss-20b"
 LOCAL_API_KEY_PLACEHOLDER = "local-vllm"
 LOCAL_HOSTS = {"localhost", "127.0.0.1", "0.0.0.0"}
+DEFAULT_MAX_RETRIES = 2
+
+
+def _build_http_client(asynchronous: bool = False) -> Any:
+    """构造长连接复用的 httpx 客户端。
+
+    安装了 h2 时启用 HTTP/2，让并行工具调用等并发请求复用同一条连接；
+    httpx 不可用时返回 None，交给 OpenAI SDK 使用默认客户端。
+
+    Args:
+        asynchronous: 为 True 时构造 httpx.AsyncClient，供 AsyncOpenAI 使用。
+    """
+    try:
+        import httpx
+    except ImportError:
+        return None
+
+    client_cls = httpx.AsyncClient if asynchronous else httpx.Client
+    return client_cls(
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(max_keepalive_connections=32, keepalive_expiry=60),
+        timeout=httpx.Timeout(60.0, connect=5.0),
+    )
+
+
+def _close_at_loop_shutdown(http: Any) -> AsyncIterator[None]:
+    """登记在当前事件循环结束前关闭异步连接池，返回需由调用方持有的异步生成器。
+
+    asyncio.run 关闭循环前会调用 loop.shutdown_asyncgens()，对在该循环中启动过的
+    异步生成器执行 aclose()；此时循环仍在运行，生成器的 finally 可以正常 await 关闭连接池。
+    """
+
+    async def closer() -> AsyncIterator[None]:
+        try:
+            yield
+        finally:
+            await http.aclose()
+
+    gen = closer()
+    # 首次迭代会触发 firstiter hook 把生成器登记到当前循环；yield 之前没有 await，一步即可推进到位
+    try:
+        gen.__anext__().send(None)  # type: ignore[attr-defined]
+    except StopIteration:
+        pass
+    return gen
 
 
 class LLMClient:
@@ -31,7 +88,22 @@ class LLMClient:
         api_key: str | None = None,
         base_url: str | None = None,
         model: str | None = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        cache: MutableMapping[str, Any] | None = None,
+        cache_control: bool = False,
     ):
+        """
+        Args:
+            api_key: API Key，默认读取 OPENAI_API_KEY。
+            base_url: 接口地址，默认读取 OPENAI_BASE_URL。
+            model: 模型名称，默认读取 OPENAI_MODEL。
+            max_retries: 遇到 429/5xx 等瞬时错误时 SDK 自动重试（指数退避）的次数，
+                      避免一次抖动就中断整个 ReAct 循环。
+            cache: 可选的响应缓存（任意 MutableMapping），chat 与 achat 共用，仅对 temperature == 0 的
+                      非流式请求生效。需要跨进程持久化时可传入 `diskcache.Cache(".llm_cache")`。
+            cache_control: 是否为 system 消息加上 `cache_control: {"type": "ephemeral"}` 显式缓存标记，
+                      仅对支持该扩展的服务（如 Anthropic 兼容网关）开启；OpenAI 会自动缓存稳定前缀。
+        """
         resolved_base_url = base_url or os.getenv("OPENAI_BASE_URL") or DEFAULT_OPENAI_BASE_URL
         resolved_model = model or os.getenv("OPENAI_MODEL") or DEFAULT_OPENAI_MODEL
         resolved_api_key = api_key or os.getenv("OPENAI_API_KEY")
@@ -49,7 +121,77 @@ class LLMClient:
                 "或通过参数传入 api_key。若使用默认本地 vLLM 端点，则会自动使用占位 key。"
             )
 
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        self.max_retries = max_retries
+        self.cache = cache
+        self.cache_control = cache_control
+        # 同一个 key 的并发请求只发送一次（single-flight）：key → [锁, 持有或等待该锁的请求数]，
+        # 计数归零时移除条目，长期运行的客户端不会为每个不同请求残留一把锁
+        self._cache_locks: dict[str, list[Any]] = {}
+        self._cache_locks_guard = threading.Lock()
+        # achat 的 single-flight：(事件循环, key) → [asyncio.Lock, 计数]，asyncio.Lock 只能在所属循环中使用
+        self._async_cache_locks: dict[tuple[asyncio.AbstractEventLoop, str], list[Any]] = {}
+        self._http = _build_http_client()
+        client_kwargs: dict[str, Any] = {"max_retries": max_retries}
+        if self._http is not None:
+            client_kwargs["http_client"] = self._http
+        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url, **client_kwargs)
+        # 事件循环 → (AsyncOpenAI, httpx.AsyncClient, 关闭连接池的异步生成器)。httpx 的异步连接池
+        # 绑定在创建它的事件循环上，每次 asyncio.run 都是新循环，因此按循环各建一套；循环被回收后条目自动释放
+        self._async_clients: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, tuple[Any, Any, Any]
+        ] = weakref.WeakKeyDictionary()
+
+    @property
+    def async_client(self) -> Any:
+        """当前事件循环专属的 AsyncOpenAI 客户端，在该循环中首次调用 achat 时惰性构造。
+
+        必须在运行中的事件循环内访问。连接池的生命周期跟随事件循环：由 asyncio.run 驱动的循环
+        结束前（shutdown_asyncgens 阶段）自动关闭；手动管理的循环需在关闭前 `await llm.aclose()`。
+        """
+        loop = asyncio.get_running_loop()
+        entry = self._async_clients.get(loop)
+        if entry is None:
+            from openai import AsyncOpenAI
+
+            # 顺带丢弃已关闭循环留下的条目：连接池已在循环结束前关闭，或随循环一起失效
+            for stale in [other for other in self._async_clients if other.is_closed()]:
+                self._async_clients.pop(stale, None)
+
+            http = _build_http_client(asynchronous=True)
+            client_kwargs: dict[str, Any] = {"max_retries": self.max_retries}
+            if http is not None:
+                client_kwargs["http_client"] = http
+            client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                **client_kwargs,
+            )
+            closer = _close_at_loop_shutdown(http) if http is not None else None
+            entry = self._async_clients[loop] = (client, http, closer)
+        return entry[0]
+
+    def close(self) -> None:
+        """关闭底层 HTTP 连接池。"""
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+
+    async def aclose(self) -> None:
+        """关闭同步连接池与当前事件循环的异步连接池，并丢弃其他循环遗留的异步客户端。
+
+        异步连接池只能在所属循环中关闭；其他循环的连接池由各自循环结束时的 shutdown_asyncgens 关闭。
+        """
+        self.close()
+        entry = self._async_clients.pop(asyncio.get_running_loop(), None)
+        self._async_clients.clear()
+        if entry is not None and entry[2] is not None:
+            await entry[2].aclose()  # 执行生成器的 finally，关闭连接池
+
+    def __enter__(self) -> LLMClient:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
 
     def chat(
         self,
@@ -57,7 +199,8 @@ class LLMClient:
         tools: list[dict[str, Any]] | None = None,
         temperature: float = 0.7,
         max_tokens: int = 2048,
-    ) -> ChatCompletion:
+        stream: bool = False,
+    ) -> ChatCompletion | Stream[ChatCompletionChunk]:
         """发送对话请求到 LLM。
 
         Args:
@@ -65,13 +208,14 @@ class LLMClient:
             tools: 可选的工具定义列表（OpenAI Function Calling 格式）。
             temperature: 生成温度，越高越随机。
             max_tokens: 最大生成 token 数。
+            stream: 是否以流式方式返回。
 
         Returns:
-            OpenAI ChatCompletion 响应对象。
+            非流式时返回 ChatCompletion；流式时返回 ChatCompletionChunk 迭代流。
         """
         kwargs: dict[str, Any] = {
             "model": self.model,
-            "messages": messages,
+            "messages": self._mark_cacheable(messages) if self.cache_control else messages,
             "temperature": temperature,
             "max_tokens": max_tokens,
         }
@@ -79,8 +223,157 @@ class LLMClient:
         if tools:
             kwargs["tools"] = tools
             kwargs["tool_choice"] = "auto"
+        if stream:
+            kwargs["stream"] = True
+
+        if self.cache is None or stream or temperature != 0:
+            return self.client.chat.completions.create(**kwargs)
+
+        key = self._cache_key(messages, tools, max_tokens)
+        with self._single_flight(key):
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            response = self.client.chat.completions.create(**kwargs)
+            # 工具调用的后续结果依赖真实工具输出，这类响应不缓存
+            if not response.choices[0].message.tool_calls:
+                self.cache[key] = response
+            return response
+
+    @staticmethod
+    def _mark_cacheable(messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """为开头的 system 消息加上显式缓存标记（不修改原消息列表）。"""
+        if not messages or messages[0].get("role") != "system":
+            return messages
+        system = messages[0]
+        content = system.get("content")
+        if not isinstance(content, str):
+            return messages
+        marked = {
+            **system,
+            "content": [{"type": "text", "text": content, "cache_control": {"type": "ephemeral"}}],
+        }
+        return [marked, *messages[1:]]
+
+    def _cache_key(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None,
+        max_tokens: int,
+    ) -> str:
+        """根据模型、消息、工具与 max_tokens 生成稳定的缓存 key。"""
+        payload = json.dumps(
+            {"model": self.model, "messages": messages, "tools": tools, "max_tokens": max_tokens},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-        return self.client.chat.completions.create(**kwargs)
+    @contextmanager
+    def _single_flight(self, key: str) -> Iterator[None]:
+        """持有某个缓存 key 专属的锁；最后一个使用者离开时释放该 key 的锁条目。"""
+        with self._cache_locks_guard:
+            entry = self._cache_locks.get(key)
+            if entry is None:
+                entry = self._cache_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._cache_locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._cache_locks[key]
+
+    @asynccontextmanager
+    async def _async_single_flight(self, key: str) -> AsyncIterator[None]:
+        """_single_flight 的异步版本：同一循环内同一 key 的并发协程只有一个真正发出请求。"""
+        lock_key = (asyncio.get_running_loop(), key)
+        with self._cache_locks_guard:
+            entry = self._async_cache_locks.get(lock_key)
+            if entry is None:
+                entry = self._async_cache_locks[lock_key] = [asyncio.Lock(), 0]
+            entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            with self._cache_locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._async_cache_locks[lock_key]
+
+    async def achat(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+    ) -> ChatCompletion:
+        """chat 的异步版本，供多个 Agent 通过 asyncio.gather 并发请求。缓存规则与 chat 相同。"""
+        kwargs: dict[str, Any] = {
+            "model": self.model,
+            "messages": self._mark_cacheable(messages) if self.cache_control else messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+
+        if tools:
+            kwargs["tools"] = tools
+            kwargs["tool_choice"] = "auto"
+
+        if self.cache is None or temperature != 0:
+            return await self.async_client.chat.completions.create(**kwargs)
+
+        key = self._cache_key(messages, tools, max_tokens)
+        async with self._async_single_flight(key):
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            response = await self.async_client.chat.completions.create(**kwargs)
+            # 工具调用的后续结果依赖真实工具输出，这类响应不缓存
+            if not response.choices[0].message.tool_calls:
+                self.cache[key] = response
+            return response
+
+    def chat_stream(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+    ) -> Iterator[tuple[str, list[Any], str | None]]:
+        """流式对话，逐块产出增量内容。
+
+        Yields:
+            (delta_text, tool_call_deltas, finish_reason) 三元组：
+            delta_text 为本块新增文本，tool_call_deltas 为本块的工具调用增量列表，
+            finish_reason 仅在最后一块非空。
+            收到 finish_reason 或调用方关闭生成器时，底层 HTTP 流会被立即关闭。
+        """
+        stream = self.chat(
+            messages,
+            tools=tools,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+        )
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                delta = choice.delta
+                yield delta.content or "", list(delta.tool_calls or []), choice.finish_reason
+                if choice.finish_reason is not None:
+                    break  # 生成已结束，不再等待流上剩余的空块
+        finally:
+            # 调用方提前停止迭代（或生成结束）时立即释放底层 HTTP 连接
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
 
     def chat_simple(self, prompt: str, system: str = "") -> str:
         """简单的单轮对话，返回文本内容。"""
@@ -92,6 +385,16 @@ class LLMClient:
         response = self.chat(messages)
         return response.choices[0].message.content or ""
 
+    async def achat_simple(self, prompt: str, system: str = "") -> str:
+        """chat_simple 的异步版本。"""
+        messages: list[dict[str, Any]] = []
+        if system:
+            messages.append({"role": "system", "content": system})
+        messages.append({"role": "user", "content": prompt})
+
+        response = await self.achat(messages)
+        return response.choices[0].message.content or ""
+
     @staticmethod
     def _is_local_base_url(base_url: str) -> bool:
         """判断 base_url 是否指向本地 OpenAI 兼容端点。"""
@@ -1,3 +1,3 @@
-from src.memory.history import ConversationHistory
+from src.memory.history import ConversationHistory, build_llm_summarizer
 
-__all__ = ["ConversationHistory"]
+__all__ = ["ConversationHistory", "build_llm_summarizer"]
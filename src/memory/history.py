@@ -3,57 +3,219 @@
 管理多轮对话的消息历史，支持：
 - 添加用户/助手消息
 - 获取消息列表
-- 按最大轮数截断历史
+- 按最大轮数截断历史（固定前缀 + 批量截断，尽量保持发送给 LLM 的前缀稳定）
+- 可选地按 token 预算截断（优先使用 tiktoken 计数）
+- 可选地把被截断的中间段压缩为一条摘要消息
 """
 
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, Callable, Iterator
+
+SUMMARY_PREFIX = "[早前对话摘要]: "
+
+SUMMARIZER_SYSTEM_PROMPT = (
+    "你是一个对话摘要助手。请把给定的对话记录压缩为不超过 200 字的摘要，"
+    "保留关键事实、数字、结论和工具返回的结果，不要添加对话中没有的信息。"
+)
+
+
+def build_llm_summarizer(llm: Any) -> Callable[[list[dict[str, Any]]], str]:
+    """构造基于 LLM 的摘要函数，可直接作为 ConversationHistory 的 summarizer。
+
+    每次截断事件只调用一次 `llm.chat_simple`，而不是每轮对话都调用。
+
+    Args:
+        llm: 提供 `chat_simple(prompt, system=...)` 的 LLM 客户端。
+    """
+
+    def summarize(messages: list[dict[str, Any]]) -> str:
+        transcript = "\n".join(
+            f"{message['role']}: {message.get('content') or ''}"
+            for message in messages
+        )
+        return llm.chat_simple(transcript, system=SUMMARIZER_SYSTEM_PROMPT)
+
+    return summarize
 
 
 class ConversationHistory:
     """对话历史管理器。"""
 
-    def __init__(self, max_turns: int = 20):
+    def __init__(
+        self,
+        max_turns: int = 20,
+        pinned_turns: int = 0,
+        buffer_turns: int = 0,
+        summarizer: Callable[[list[dict[str, Any]]], str] | None = None,
+        max_tokens: int | None = None,
+        reserve_tokens: int = 1024,
+        tokenizer_model: str = "gpt-4o-mini",
+    ):
         """
         Args:
             max_turns: 保留的最大对话轮数（一轮 = 一问一答）。
                       超过时丢弃最早的对话。
+            pinned_turns: 始终保留的最早对话轮数，截断只发生在它们之后的中间段。
+            buffer_turns: 超出 max_turns 多少轮后才触发一次截断。批量截断让消息前缀
+                      在多轮之间保持不变，便于命中服务端的 prompt 前缀缓存。
+            summarizer: 可选的摘要函数，接收被移出的消息列表并返回摘要文本；
+                      设置后被移出的中间段会替换为一条摘要消息，而不是直接丢弃。
+            max_tokens: 历史消息的 token 上限，为 None 时只按轮数截断。
+                      单条工具结果可能远长于普通对话，按 token 截断能避免撑爆上下文窗口。
+            reserve_tokens: 从 max_tokens 中预留给本轮问题与回答的 token 数。
+            tokenizer_model: 用于 tiktoken 计数的模型名；未安装 tiktoken 时退化为按字节估算。
         """
         self.max_turns = max_turns
+        self.pinned_turns = pinned_turns
+        self.buffer_turns = buffer_turns
+        self.summarizer = summarizer
+        self.max_tokens = max_tokens
+        self.reserve_tokens = reserve_tokens
+        self.tokenizer_model = tokenizer_model
         self._messages: list[dict[str, Any]] = []
+        self._summary_message: dict[str, Any] | None = None
+        # 与 _messages 一一对应的 token 数缓存，仅在设置 max_tokens 时维护
+        self._token_counts: list[int] = []
+        self._total_tokens = 0
+        self._encoder: Any = None
 
     def add_user_message(self, content: str) -> None:
         """添加用户消息。"""
-        self._messages.append({"role": "user", "content": content})
+        self._append({"role": "user", "content": content})
         self._truncate()
 
     def add_assistant_message(self, content: str) -> None:
         """添加助手消息。"""
-        self._messages.append({"role": "assistant", "content": content})
+        self._append({"role": "assistant", "content": content})
         self._truncate()
 
     def get_messages(self) -> list[dict[str, Any]]:
         """获取消息历史副本。"""
         return list(self._messages)
 
+    def iter_messages(self) -> Iterator[dict[str, Any]]:
+        """零拷贝遍历消息历史，适合直接 extend 到请求消息列表的热路径。
+
+        遍历期间不要修改历史；需要独立副本时请使用 get_messages。
+        """
+        return iter(self._messages)
+
     def clear(self) -> None:
         """清空对话历史。"""
         self._messages.clear()
+        self._summary_message = None
+        self._token_counts.clear()
+        self._total_tokens = 0
+
+    def _append(self, message: dict[str, Any]) -> None:
+        """追加一条消息，并同步 token 计数缓存。"""
+        self._messages.append(message)
+        if self.max_tokens is not None:
+            count = self._count_tokens(message)
+            self._token_counts.append(count)
+            self._total_tokens += count
 
     def _truncate(self) -> None:
-        """按最大轮数截断历史。
+        """按最大轮数与 token 预算截断历史。
 
-        保留最新的 max_turns 轮对话（每轮 2 条消息）。
+        保留最早的 pinned_turns 轮与最新的对话，总计 max_turns 轮（每轮 2 条消息）；
+        只有超出部分累积到 buffer_turns 轮以上时才真正截断一次。
+        设置 max_tokens 时，还会继续移出最早的中间段对话，直到总 token 数不超过
+        max_tokens - reserve_tokens（最新一轮总会保留）。
         """
         max_messages = self.max_turns * 2
-        if len(self._messages) > max_messages:
-            self._messages = self._messages[-max_messages:]
+        over_turns = self._turn_message_count() > max_messages + self.buffer_turns * 2
+        over_tokens = (
+            self.max_tokens is not None
+            and self._total_tokens > self.max_tokens - self.reserve_tokens
+        )
+        if not over_turns and not over_tokens:
+            return
+
+        pinned_count = min(self.pinned_turns * 2, max_messages)
+        body_start = pinned_count + (1 if self._summary_message is not None else 0)
+        body = self._messages[body_start:]
+
+        split = max(len(body) - (max_messages - pinned_count), 0) if over_turns else 0
+        if over_tokens:
+            split = self._token_split(body_start, body, split)
+        while split < len(body) and body[split]["role"] != "user":
+            split += 1  # 按整轮移出，避免保留半轮对话
+        if split <= 0:
+            return
+
+        evicted, recent = body[:split], body[split:]
+        self._summary_message = self._summarize(evicted)
+        middle = [self._summary_message] if self._summary_message is not None else []
+        self._messages = self._messages[:pinned_count] + middle + recent
+
+        if self.max_tokens is not None:
+            middle_counts = [self._count_tokens(message) for message in middle]
+            self._token_counts = (
+                self._token_counts[:pinned_count]
+                + middle_counts
+                + self._token_counts[body_start + split:]
+            )
+            self._total_tokens = sum(self._token_counts)
+
+    def _token_split(self, body_start: int, body: list[dict[str, Any]], split: int) -> int:
+        """在按轮数确定的切分点基础上，继续后移直到满足 token 预算。"""
+        budget = self.max_tokens - self.reserve_tokens
+        # 最新一轮（最后一条 user 消息起）不参与移出
+        last_user = next(
+            (i for i in range(len(body) - 1, -1, -1) if body[i]["role"] == "user"),
+            len(body),
+        )
+        remaining = self._total_tokens - sum(
+            self._token_counts[body_start:body_start + split]
+        )
+        while split < last_user and remaining > budget:
+            remaining -= self._token_counts[body_start + split]
+            split += 1
+        return split
+
+    def _summarize(self, evicted: list[dict[str, Any]]) -> dict[str, Any] | None:
+        """将被移出的消息（连同上一版摘要）压缩为一条摘要消息。"""
+        if self.summarizer is None:
+            return None
+        previous = [self._summary_message] if self._summary_message is not None else []
+        summary = self.summarizer(previous + evicted).strip()
+        if not summary:
+            return None
+        return {"role": "system", "content": f"{SUMMARY_PREFIX}{summary}"}
+
+    def _count_tokens(self, message: dict[str, Any]) -> int:
+        """计算单条消息内容的 token 数。"""
+        content = message.get("content") or ""
+        encoder = self._get_encoder()
+        if encoder is not None:
+            return len(encoder.encode(content))
+        # 无 tiktoken 时保守估算：中文约 1 token/字（3 字节），英文约 3 字节/token
+        return len(content.encode("utf-8")) // 3 + 1
+
+    def _get_encoder(self) -> Any:
+        """惰性加载 tiktoken 编码器；不可用时返回 None。"""
+        if self._encoder is None:
+            try:
+                import tiktoken
+
+                try:
+                    self._encoder = tiktoken.encoding_for_model(self.tokenizer_model)
+                except KeyError:
+                    self._encoder = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                self._encoder = False  # 未安装或加载失败，后续直接走估算
+        return self._encoder or None
+
+    def _turn_message_count(self) -> int:
+        """不含摘要消息的对话消息数。"""
+        return len(self._messages) - (1 if self._summary_message is not None else 0)
 
     @property
     def turn_count(self) -> int:
         """当前对话轮数。"""
-        return len(self._messages) // 2
+        return self._turn_message_count() // 2
 
     def __len__(self) -> int:
         return len(self._messages)
@@ -9,6 +9,12 @@
 
 from __future__ import annotations
 
+import hashlib
+import io
+import sys
+import threading
+import time
+import weakref
 from abc import ABC, abstractmethod
 from typing import Any, Callable
 
@@ -19,6 +25,21 @@ from src.multi.roles import AgentRole
 from src.multi.shared_state import SharedState
 from src.tools.base import ToolRegistry
 
+# 日志缓冲超过该大小时立即写出
+LOG_FLUSH_THRESHOLD = 64 * 1024
+# 缓冲区曾经增长到超过该大小时，写出后重建 StringIO 以释放内存
+LOG_BUFFER_SOFT_MAX = 1024 * 1024
+
+_EMPTY: tuple[Callable[..., None], ...] = ()
+
+# 全局工具注册中心 → {(角色工具名, 全局工具数): 角色工具子集}。
+# ToolRegistry 只增不删且不允许同名覆盖，全局工具数不变时同一组工具名得到的子集必然相同；
+# 以全局注册中心为弱引用 key，注册中心被回收后缓存随之释放。
+_ROLE_REGISTRY_CACHE: weakref.WeakKeyDictionary[
+    ToolRegistry, dict[tuple[tuple[str, ...], int], ToolRegistry]
+] = weakref.WeakKeyDictionary()
+_ROLE_REGISTRY_LOCK = threading.Lock()
+
 
 class BaseMultiAgent(ABC):
     """多 Agent 协作基类。所有协作模式必须继承此类。"""
@@ -40,7 +61,21 @@ class BaseMultiAgent(ABC):
         self.verbose = verbose
         self.state = SharedState()
         self._agents: dict[str, ReActAgent] = {}
-        self._hooks: dict[str, list[Callable[..., None]]] = {}
+        # 每个事件的回调保存为不可变元组快照，触发时无需复制，也不受注册并发影响
+        self._hooks: dict[str, tuple[Callable[..., None], ...]] = {}
+        # 并发分派子任务时保护共享状态的写入
+        self._state_lock = threading.Lock()
+        # 子任务结果缓存，默认关闭，通过 enable_cache 开启
+        self.cache_enabled = False
+        self.cache_ttl: float | None = None
+        self._response_cache: dict[str, tuple[float, str]] = {}
+        # 开启后分派结束不再重置 Agent 的对话历史，后续任务只需发送增量信息，
+        # 已发送过的前缀（system + 早前轮次）保持不变，便于命中服务端 prompt 缓存
+        self.persistent_dispatch = False
+        # verbose 日志先写入缓冲，在每个分派/步骤边界（即各 hook 事件点，无论是否注册了回调）、
+        # 超过阈值或 run 结束时批量写出，长时间运行时进度仍能及时显示
+        self._log_buf = io.StringIO()
+        self._log_lock = threading.Lock()
 
     # ================================================================
     # Agent 管理
@@ -53,26 +88,41 @@ class BaseMultiAgent(ABC):
             role: 角色定义。
             **agent_kwargs: 传递给 ReActAgent 的额外参数。
         """
-        # 为该角色创建专属的工具注册中心（仅包含角色允许的工具）
-        role_tools = ToolRegistry()
-        for tool_name in role.tools:
-            tool = self.global_tools.get(tool_name)
-            if tool is not None:
-                role_tools.register(tool)
-
+        role_tools = self._role_tool_registry(role)
         agent = ReActAgent(
             llm=self.llm,
             tool_registry=role_tools,
             mode=agent_kwargs.pop("mode", "function_calling"),
             max_steps=agent_kwargs.pop("max_steps", 10),
             verbose=False,  # 由 MultiAgent 统一控制日志
-            system_prompt=self._build_system_prompt(role),
+            system_prompt=self._build_system_prompt(role, has_tools=len(role_tools) > 0),
             available_skills=set(role.skills) if role.skills is not None else None,
+            # 角色的工具子集在创建时冻结，每一步都发送同一份 schema
+            preset_openai_tools=role_tools.to_openai_tools(),
         )
         agent._role_name = role.name
         agent._role_system_prompt = role.system_prompt
         self._agents[role.name] = agent
 
+    def _role_tool_registry(self, role: AgentRole) -> ToolRegistry:
+        """返回该角色专属的工具注册中心（仅包含角色允许的工具）。
+
+        相同的工具组合在多个 MultiAgent 实例之间共用同一个子集，
+        其 OpenAI schema 列表也只构建一次。Agent 不会修改自己的工具注册中心。
+        """
+        key = (tuple(role.tools), len(self.global_tools))
+        with _ROLE_REGISTRY_LOCK:
+            per_global = _ROLE_REGISTRY_CACHE.setdefault(self.global_tools, {})
+            role_tools = per_global.get(key)
+            if role_tools is None:
+                role_tools = ToolRegistry()
+                for tool_name in role.tools:
+                    tool = self.global_tools.get(tool_name)
+                    if tool is not None:
+                        role_tools.register(tool)
+                per_global[key] = role_tools
+        return role_tools
+
     def get_agent(self, name: str) -> ReActAgent | None:
         """获取指定名称的 Agent。"""
         return self._agents.get(name)
@@ -83,13 +133,17 @@ class BaseMultiAgent(ABC):
         return list(self._agents.keys())
 
     @staticmethod
-    def _build_system_prompt(role: AgentRole) -> str:
-        """将角色提示词与通用 Agent 指令合并为完整的 system prompt。"""
-        from src.agent.prompt import SYSTEM_PROMPT_FUNCTION_CALLING
+    def _build_system_prompt(role: AgentRole, has_tools: bool = True) -> str:
+        """将角色提示词与通用 Agent 指令合并为完整的 system prompt。
+
+        角色没有可用工具时（如裁判），附加不含工具说明的精简指令。
+        """
+        from src.agent.prompt import SYSTEM_PROMPT_FUNCTION_CALLING, SYSTEM_PROMPT_NO_TOOLS
 
+        agent_prompt = SYSTEM_PROMPT_FUNCTION_CALLING if has_tools else SYSTEM_PROMPT_NO_TOOLS
         return (
             f"{role.system_prompt}\n\n"
-            f"{SYSTEM_PROMPT_FUNCTION_CALLING}"
+            f"{agent_prompt}"
         )
 
     # ================================================================
@@ -111,42 +165,179 @@ class BaseMultiAgent(ABC):
     # 子任务分派
     # ================================================================
 
-    def _dispatch(self, agent_name: str, task: str) -> str:
+    def _dispatch(
+        self,
+        agent_name: str,
+        task: str,
+        use_cache: bool = True,
+        on_chunk: Callable[[str], None] | None = None,
+        result_key: str | None = None,
+        record: bool = True,
+    ) -> str:
         """将子任务分派给指定 Agent 执行。
 
         Args:
             agent_name: Agent 角色名。
             task: 子任务描述。
+            use_cache: 开启缓存时是否允许命中缓存；重试等需要真正重新执行的场景传 False。
+            on_chunk: 提供时以流式方式执行，Agent 输出的正文增量逐段回调；
+                命中缓存时不会回调。
+            result_key: 结果写入共享状态时使用的 key，默认为 Agent 名；
+                同一个 Agent 执行多个步骤时传入各步骤自己的 key，避免结果互相覆盖。
+            record: 为 False 时只执行任务：不查询/写入缓存、不记录消息与结果、不触发 hook，
+                适合结果可能被丢弃的中间执行（如流水线按段落试跑下一步）。
 
         Returns:
             Agent 的执行结果。
         """
         agent = self._agents.get(agent_name)
         if agent is None:
-            error = f"错误：Agent '{agent_name}' 不存在。可用：{self.agent_names}"
-            self._log(error)
-            return error
-
-        self._fire_hook("on_agent_start", agent_name=agent_name, task=task)
-        self.state.add_message(Message(
-            sender="system",
-            receiver=agent_name,
-            content=task,
-            msg_type=MessageType.TASK,
-        ))
+            return self._missing_agent(agent_name)
+        key, cached = (
+            self._lookup_cache(agent_name, task, use_cache, result_key) if record else (None, None)
+        )
+        if cached is not None:
+            return cached
+        if record:
+            self._begin_dispatch(agent_name, task)
 
         # 角色 prompt 已通过 system_prompt 参数注入，直接执行任务
         try:
-            result = agent.run(task)
+            if on_chunk is None:
+                result = agent.run(task)
+            else:
+                result = self._run_streaming(agent, task, on_chunk)
+        except Exception as e:
+            result = f"错误：Agent '{agent_name}' 执行失败：{e}"
+            if record:
+                self._fire_hook("on_error", agent_name=agent_name, error=e)
+
+        if not record:
+            if not self.persistent_dispatch:
+                agent.reset()
+            return result
+        self._store_cache(key, result)
+        return self._end_dispatch(agent_name, agent, result, result_key)
+
+    async def _adispatch(
+        self,
+        agent_name: str,
+        task: str,
+        use_cache: bool = True,
+        result_key: str | None = None,
+    ) -> str:
+        """_dispatch 的异步版本，多个互不依赖的子任务可以通过 asyncio.gather 并发分派。"""
+        agent = self._agents.get(agent_name)
+        if agent is None:
+            return self._missing_agent(agent_name)
+        key, cached = self._lookup_cache(agent_name, task, use_cache, result_key)
+        if cached is not None:
+            return cached
+        self._begin_dispatch(agent_name, task)
+
+        try:
+            result = await agent.arun(task)
         except Exception as e:
             result = f"错误：Agent '{agent_name}' 执行失败：{e}"
             self._fire_hook("on_error", agent_name=agent_name, error=e)
 
-        agent.reset()  # 每次执行后重置单 Agent 的对话历史
-        self.state.add_result(agent_name, result)
+        self._store_cache(key, result)
+        return self._end_dispatch(agent_name, agent, result, result_key)
+
+    @staticmethod
+    def _run_streaming(agent: ReActAgent, task: str, on_chunk: Callable[[str], None]) -> str:
+        """临时切换到流式模式执行一次任务，结束后恢复 Agent 原有配置。"""
+        stream, previous = agent.stream, agent.on_chunk
+        agent.stream, agent.on_chunk = True, on_chunk
+        try:
+            return agent.run(task)
+        finally:
+            agent.stream, agent.on_chunk = stream, previous
+
+    def _missing_agent(self, agent_name: str) -> str:
+        """Agent 不存在时的错误信息。"""
+        error = f"错误：Agent '{agent_name}' 不存在。可用：{self.agent_names}"
+        self._log(error)
+        return error
+
+    def _begin_dispatch(self, agent_name: str, task: str) -> None:
+        """分派前的公共逻辑：触发 hook 并记录任务消息。"""
+        self._fire_hook("on_agent_start", agent_name=agent_name, task=task)
+        with self._state_lock:
+            self.state.add_message(Message(
+                sender="system",
+                receiver=agent_name,
+                content=task,
+                msg_type=MessageType.TASK,
+            ))
+
+    def _end_dispatch(
+        self,
+        agent_name: str,
+        agent: ReActAgent,
+        result: str,
+        result_key: str | None = None,
+    ) -> str:
+        """分派后的公共逻辑：重置 Agent、记录结果并触发 hook。"""
+        if not self.persistent_dispatch:
+            agent.reset()  # 每次执行后重置单 Agent 的对话历史
+        return self._record_result(agent_name, result, result_key)
+
+    def _record_result(self, agent_name: str, result: str, result_key: str | None = None) -> str:
+        """把结果写入共享状态并触发 on_agent_finish。"""
+        with self._state_lock:
+            self.state.add_result(result_key or agent_name, result)
         self._fire_hook("on_agent_finish", agent_name=agent_name, result=result)
         return result
 
+    # ================================================================
+    # 结果缓存
+    # ================================================================
+
+    def enable_cache(self, ttl: float | None = None) -> None:
+        """开启子任务结果缓存：相同 (Agent, 任务) 的重复分派直接返回上次结果。
+
+        Args:
+            ttl: 缓存有效期（秒），为 None 时不过期。
+        """
+        self.cache_enabled = True
+        self.cache_ttl = ttl
+
+    def clear_cache(self) -> None:
+        """清空子任务结果缓存。"""
+        self._response_cache.clear()
+
+    def _lookup_cache(
+        self, agent_name: str, task: str, use_cache: bool, result_key: str | None = None
+    ) -> tuple[str | None, str | None]:
+        """查询缓存，返回 (缓存 key, 命中的结果)；未开启缓存时 key 为 None。
+
+        命中时与正常分派一样记录结果，并触发 on_cache_hit 与 on_agent_finish。
+        persistent_dispatch 下同一任务的结果取决于 Agent 的对话历史，不使用缓存。
+        """
+        if not (self.cache_enabled and use_cache) or self.persistent_dispatch:
+            return None, None
+
+        key = hashlib.sha256(f"{agent_name}\x00{task}".encode("utf-8")).hexdigest()
+        entry = self._response_cache.get(key)
+        if entry is None:
+            return key, None
+        stored_at, result = entry
+        if self.cache_ttl is not None and time.monotonic() - stored_at > self.cache_ttl:
+            self._response_cache.pop(key, None)
+            return key, None
+
+        self._fire_hook("on_cache_hit", agent_name=agent_name, task=task)
+        with self._state_lock:
+            self.state.add_result(result_key or agent_name, result)
+        self._fire_hook("on_agent_finish", agent_name=agent_name, result=result)
+        return key, result
+
+    def _store_cache(self, key: str | None, result: str) -> None:
+        """缓存成功的结果（错误结果不缓存）。"""
+        if key is not None and not result.startswith("错误："):
+            self._response_cache[key] = (time.monotonic(), result)
+
     def _broadcast(self, message: Message) -> None:
         """向所有 Agent 广播消息。"""
         message.receiver = "all"
@@ -164,16 +355,23 @@ class BaseMultiAgent(ABC):
             - on_agent_finish(agent_name, result)
             - on_step_complete(step, state)
             - on_error(agent_name, error)
+            - on_cache_hit(agent_name, task)
 
         Args:
             event: 事件名。
             callback: 回调函数。
         """
-        self._hooks.setdefault(event, []).append(callback)
+        self._hooks[event] = self._hooks.get(event, _EMPTY) + (callback,)
 
     def _fire_hook(self, event: str, **kwargs: Any) -> None:
-        """触发指定事件的所有回调。"""
-        for callback in self._hooks.get(event, []):
+        """触发指定事件的所有回调。
+
+        hook 事件点就是分派开始/结束与步骤完成等边界，无论是否注册了回调都在此写出
+        已缓冲的日志：既保持进度实时可见，也保证回调自行打印的内容排在之前的日志之后。
+        """
+        self._flush_log()
+        callbacks = self._hooks.get(event, _EMPTY)
+        for callback in callbacks:
             try:
                 callback(**kwargs)
             except Exception:
@@ -184,9 +382,31 @@ class BaseMultiAgent(ABC):
     # ================================================================
 
     def _log(self, message: str) -> None:
-        """打印日志。"""
-        if self.verbose:
-            print(message)
+        """打印日志（写入缓冲，批量输出）。"""
+        if not self.verbose:
+            return
+        with self._log_lock:
+            self._log_buf.write(message)
+            self._log_buf.write("\n")
+            if self._log_buf.tell() < LOG_FLUSH_THRESHOLD:
+                return
+        self._flush_log()
+
+    def _flush_log(self) -> None:
+        """把缓冲中的日志一次性写到标准输出。
+
+        子类的 run/arun 需在 finally 中调用，保证退出（包括异常）时写出剩余日志。
+        """
+        with self._log_lock:
+            size = self._log_buf.tell()
+            if size == 0:
+                return
+            sys.stdout.write(self._log_buf.getvalue())
+            if size > LOG_BUFFER_SOFT_MAX:
+                self._log_buf = io.StringIO()
+            else:
+                self._log_buf.seek(0)
+                self._log_buf.truncate()
 
     def _log_header(self, title: str) -> None:
         """打印区块标题。"""
@@ -196,8 +416,10 @@ class BaseMultiAgent(ABC):
 
     def _log_agent(self, agent_name: str, action: str, detail: str = "") -> None:
         """打印 Agent 相关日志。"""
-        msg = f"  [{agent_name}] {action}"
-        if detail:
-            preview = detail[:200] + "..." if len(detail) > 200 else detail
-            msg += f": {preview}"
-        self._log(msg)
+        if not self.verbose:
+            return
+        if not detail:
+            self._log(f"  [{agent_name}] {action}")
+            return
+        ellipsis = "..." if len(detail) > 200 else ""
+        self._log(f"  [{agent_name}] {action}: {detail[:200]}{ellipsis}")
@@ -6,10 +6,19 @@
     Round 1: 所有 Agent 独立回答
     Round 2: 看到对方观点后修正
     Round 3: 裁判综合裁决
+
+同一轮的辩手只依赖之前轮次的观点，彼此独立：同步 run 用线程池并发分派，
+异步 arun 用 asyncio.gather 并发分派；观点与日志仍按辩手注册顺序记录。
+
+persistent=True 时辩手在整场辩论中保留对话历史：第 1 轮发送话题，之后每轮只发送
+其他人的新观点，已发送的前缀逐字节不变，便于命中服务端 prompt 缓存。
 """
 
 from __future__ import annotations
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 from src.llm import LLMClient
 from src.multi.base import BaseMultiAgent
 from src.multi.message import Message, MessageType
@@ -40,15 +49,25 @@ class DebateMultiAgent(BaseMultiAgent):
         tool_registry: ToolRegistry,
         max_rounds: int = 2,
         verbose: bool = True,
+        persistent: bool = False,
     ):
         """
         Args:
             max_rounds: 最大辩论轮数（不含裁决轮）。
+            persistent: 辩手是否在整场辩论中保留对话历史，后续轮次只发送增量观点。
         """
         super().__init__(llm=llm, tool_registry=tool_registry, verbose=verbose)
         self._max_rounds = max_rounds
         self._judge_role: AgentRole | None = None
         self._debater_names: list[str] = []
+        self.persistent_dispatch = persistent
+        # persistent 模式下每位辩手尚未看到的第一轮下标（all_rounds 中的位置）；
+        # 不在表中表示该辩手还没有成功发言过，对话历史为空
+        self._unseen_from: dict[str, int] = {}
+        # 每轮观点预先格式化好的片段：_round_blobs[i][name] 对应第 i+1 轮该辩手的观点。
+        # 片段只对 _blobs_source 这一个 all_rounds 列表对象有效（run/arun 只会向它追加）
+        self._round_blobs: list[dict[str, str]] = []
+        self._blobs_source: list[dict[str, str]] | None = None
 
     def set_judge(self, role: AgentRole) -> None:
         """设置裁判角色。"""
@@ -62,6 +81,86 @@ class DebateMultiAgent(BaseMultiAgent):
 
     def run(self, task: str) -> str:
         """执行辩论。"""
+        try:
+            error = self._start_debate(task)
+            if error:
+                return error
+
+            # 记录所有轮次的观点
+            all_rounds: list[dict[str, str]] = []
+
+            for round_num in range(1, self._max_rounds + 1):
+                self._begin_round(round_num)
+                # 子任务只依赖之前轮次的观点，先全部构建好再并发分派
+                sub_tasks = [
+                    self._build_debater_task(task, round_num, debater_name, all_rounds)
+                    for debater_name in self._debater_names
+                ]
+                for debater_name in self._debater_names:
+                    self._log(f"\n  🎤 [{debater_name}] 发言中...")
+
+                with ThreadPoolExecutor(max_workers=len(self._debater_names)) as pool:
+                    futures = [
+                        pool.submit(self._dispatch, debater_name, sub_task)
+                        for debater_name, sub_task in zip(self._debater_names, sub_tasks)
+                    ]
+                    results = [future.result() for future in futures]
+
+                round_opinions: dict[str, str] = {}
+                for debater_name, result in zip(self._debater_names, results):
+                    self._record_opinion(round_num, debater_name, result, round_opinions)
+
+                self._end_round(round_num, round_opinions, all_rounds)
+
+            self._begin_judging()
+            final = self._judge(task, all_rounds)
+            self._finish_debate()
+            return final
+        finally:
+            self._flush_log()
+
+    async def arun(self, task: str) -> str:
+        """异步执行辩论。
+
+        同一轮的辩手只依赖之前轮次的观点，彼此独立，因此通过 asyncio.gather
+        并发发言，单轮耗时从各辩手耗时之和降为其中的最大值。
+        """
+        try:
+            error = self._start_debate(task)
+            if error:
+                return error
+
+            all_rounds: list[dict[str, str]] = []
+
+            for round_num in range(1, self._max_rounds + 1):
+                self._begin_round(round_num)
+                sub_tasks = [
+                    self._build_debater_task(task, round_num, debater_name, all_rounds)
+                    for debater_name in self._debater_names
+                ]
+                for debater_name in self._debater_names:
+                    self._log(f"\n  🎤 [{debater_name}] 发言中...")
+
+                results = await asyncio.gather(*(
+                    self._adispatch(debater_name, sub_task)
+                    for debater_name, sub_task in zip(self._debater_names, sub_tasks)
+                ))
+
+                round_opinions: dict[str, str] = {}
+                for debater_name, result in zip(self._debater_names, results):
+                    self._record_opinion(round_num, debater_name, result, round_opinions)
+
+                self._end_round(round_num, round_opinions, all_rounds)
+
+            self._begin_judging()
+            final = await self._ajudge(task, all_rounds)
+            self._finish_debate()
+            return final
+        finally:
+            self._flush_log()
+
+    def _start_debate(self, task: str) -> str | None:
+        """校验配置并初始化状态，配置不完整时返回错误信息。"""
         if not self._debater_names:
             return "错误：没有辩论参与者。"
         if self._judge_role is None:
@@ -70,92 +169,155 @@ class DebateMultiAgent(BaseMultiAgent):
         self.state.reset()
         self.state.task = task
         self.state.status = "executing"
+        self._round_blobs.clear()
+        self._blobs_source = None
+        if self.persistent_dispatch:
+            self._unseen_from.clear()
+            for agent in self._agents.values():
+                agent.reset()  # 清掉上一场辩论保留的历史
 
         self._log_header(f"Debate 辩论模式开始")
         self._log(f"  话题: {task}")
         self._log(f"  参与者: {self._debater_names}")
         self._log(f"  裁判: {self._judge_role.name}")
         self._log(f"  最大轮数: {self._max_rounds}")
+        return None
 
-        # 记录所有轮次的观点
-        all_rounds: list[dict[str, str]] = []
-
-        for round_num in range(1, self._max_rounds + 1):
-            self.state.current_step = round_num
-            self._log(f"\n{'─'*50}")
-            self._log(f"  📢 第 {round_num} 轮辩论")
-            self._log(f"{'─'*50}")
-
-            round_opinions: dict[str, str] = {}
-
-            for debater_name in self._debater_names:
-                # 构建该轮的任务
-                if round_num == 1:
-                    sub_task = (
-                        f"请就以下话题发表你的观点：\n\n{task}\n\n"
-                        f"要求：给出你的核心观点、论据和结论。"
-                    )
-                else:
-                    # 后续轮次附上其他人的观点
-                    others_opinions = self._format_opinions(all_rounds, exclude=debater_name)
-                    sub_task = (
-                        f"话题：{task}\n\n"
-                        f"以下是其他参与者在之前轮次的观点：\n{others_opinions}\n\n"
-                        f"请你针对其他人的观点进行回应，可以反驳、补充或修正自己的观点。"
-                        f"给出你更新后的核心观点和论据。"
-                    )
-
-                self._log(f"\n  🎤 [{debater_name}] 发言中...")
-                result = self._dispatch(debater_name, sub_task)
-                round_opinions[debater_name] = result
-                self._log_agent(debater_name, "观点", result)
-
-                self.state.add_message(Message(
-                    sender=debater_name,
-                    receiver="all",
-                    content=result,
-                    msg_type=MessageType.RESULT,
-                    metadata={"round": round_num},
-                ))
-
-            all_rounds.append(round_opinions)
-            self._fire_hook("on_step_complete", step=round_num, state=self.state)
+    def _begin_round(self, round_num: int) -> None:
+        self.state.current_step = round_num
+        self._log(f"\n{'─'*50}")
+        self._log(f"  📢 第 {round_num} 轮辩论")
+        self._log(f"{'─'*50}")
 
+    def _build_debater_task(
+        self,
+        task: str,
+        round_num: int,
+        debater_name: str,
+        all_rounds: list[dict[str, str]],
+    ) -> str:
+        """构建某位辩手在该轮的任务。"""
+        unseen_from = self._unseen_from.get(debater_name)
+        if self.persistent_dispatch and unseen_from is not None:
+            # 话题与之前的观点已在对话历史中，只发送新增的观点
+            new_opinions = self._format_opinions(all_rounds, exclude=debater_name, start=unseen_from)
+            return (
+                f"新信息：\n{new_opinions}\n\n"
+                f"请你针对其他人的观点进行回应，可以反驳、补充或修正自己的观点。"
+                f"给出你更新后的核心观点和论据。"
+            )
+        if round_num == 1:
+            return (
+                f"请就以下话题发表你的观点：\n\n{task}\n\n"
+                f"要求：给出你的核心观点、论据和结论。"
+            )
+        # 后续轮次附上其他人的观点
+        others_opinions = self._format_opinions(all_rounds, exclude=debater_name)
+        return (
+            f"话题：{task}\n\n"
+            f"以下是其他参与者在之前轮次的观点：\n{others_opinions}\n\n"
+            f"请你针对其他人的观点进行回应，可以反驳、补充或修正自己的观点。"
+            f"给出你更新后的核心观点和论据。"
+        )
+
+    def _record_opinion(
+        self,
+        round_num: int,
+        debater_name: str,
+        result: str,
+        round_opinions: dict[str, str],
+    ) -> None:
+        round_opinions[debater_name] = result
+        self._log_agent(debater_name, "观点", result)
+        if self.persistent_dispatch and not result.startswith("错误："):
+            # 本轮任务已写入该辩手的历史，下一轮从本轮的观点开始发送
+            self._unseen_from[debater_name] = round_num - 1
+
+        self.state.add_message(Message(
+            sender=debater_name,
+            receiver="all",
+            content=result,
+            msg_type=MessageType.RESULT,
+            metadata={"round": round_num},
+        ))
+
+    def _end_round(
+        self,
+        round_num: int,
+        round_opinions: dict[str, str],
+        all_rounds: list[dict[str, str]],
+    ) -> None:
+        all_rounds.append(round_opinions)
+        self._fire_hook("on_step_complete", step=round_num, state=self.state)
+
+    def _begin_judging(self) -> None:
         # 裁决阶段
         self._log(f"\n{'─'*50}")
         self._log(f"  ⚖️  裁判裁决")
         self._log(f"{'─'*50}")
 
         self.state.status = "reviewing"
-        final = self._judge(task, all_rounds)
 
+    def _finish_debate(self) -> None:
         self.state.status = "done"
         self._log_header("Debate 完成")
         self._log(f"  {self.state.summary()}")
 
-        return final
-
     def _judge(self, topic: str, all_rounds: list[dict[str, str]]) -> str:
         """裁判做最终裁决。"""
+        judge_name, prompt = self._prepare_judge(topic, all_rounds)
+        result = self._dispatch(judge_name, prompt)
+        self._log_agent(judge_name, "裁决结果", result)
+        return result
+
+    async def _ajudge(self, topic: str, all_rounds: list[dict[str, str]]) -> str:
+        """_judge 的异步版本。"""
+        judge_name, prompt = self._prepare_judge(topic, all_rounds)
+        result = await self._adispatch(judge_name, prompt)
+        self._log_agent(judge_name, "裁决结果", result)
+        return result
+
+    def _prepare_judge(self, topic: str, all_rounds: list[dict[str, str]]) -> tuple[str, str]:
+        """生成裁判名与裁决 prompt。"""
         rounds_summary = self._format_all_rounds(all_rounds)
         prompt = JUDGE_PROMPT.format(topic=topic, rounds_summary=rounds_summary)
 
         judge_name = self._judge_role.name
         self._log(f"\n  🔨 [{judge_name}] 正在裁决...")
-        result = self._dispatch(judge_name, prompt)
-        self._log_agent(judge_name, "裁决结果", result)
-        return result
+        return judge_name, prompt
 
     def _format_opinions(
-        self, all_rounds: list[dict[str, str]], exclude: str = ""
+        self, all_rounds: list[dict[str, str]], exclude: str = "", start: int = 0
     ) -> str:
-        """格式化历史观点（排除指定参与者）。"""
-        lines = []
-        for i, round_ops in enumerate(all_rounds, 1):
-            for name, opinion in round_ops.items():
-                if name != exclude:
-                    lines.append(f"[第{i}轮 - {name}]:\n{opinion}\n")
-        return "\n".join(lines) if lines else "(暂无其他观点)"
+        """格式化历史观点（排除指定参与者），start 为起始轮次下标。
+
+        每条观点只格式化一次，之后每位辩手每轮只需按排除条件拼接缓存的片段。
+        """
+        blobs = self._opinion_blobs(all_rounds)
+        text = "\n".join(
+            blob
+            for round_blobs in blobs[start:len(all_rounds)]
+            for name, blob in round_blobs.items()
+            if name != exclude
+        )
+        return text or "(暂无其他观点)"
+
+    def _opinion_blobs(self, all_rounds: list[dict[str, str]]) -> list[dict[str, str]]:
+        """补齐尚未格式化的轮次并返回全部片段。
+
+        缓存按 all_rounds 列表对象的身份区分：换了一个列表（另一场辩论或调用方自建的记录）
+        就从头重新格式化，而不是根据长度猜测是否还是同一份记录。
+        """
+        blobs = self._round_blobs
+        if self._blobs_source is not all_rounds:
+            blobs.clear()
+            self._blobs_source = all_rounds
+        for i in range(len(blobs), len(all_rounds)):
+            blobs.append({
+                name: f"[第{i + 1}轮 - {name}]:\n{opinion}\n"
+                for name, opinion in all_rounds[i].items()
+            })
+        return blobs
 
     def _format_all_rounds(self, all_rounds: list[dict[str, str]]) -> str:
         """格式化所有轮次的观点（给裁判看）。"""
@@ -6,11 +6,17 @@
 
 from __future__ import annotations
 
+import re
+import string
+import time
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 from typing import Any, Callable
 
+# 单调时钟与墙上时钟的差值，导入时计算一次，用于把单调时间戳换算成日期
+_WALL_CLOCK_OFFSET_NS = time.time_ns() - time.monotonic_ns()
+
 
 class MessageType(Enum):
     """消息类型枚举。"""
@@ -21,7 +27,7 @@ class MessageType(Enum):
     SYSTEM = "system"       # 系统消息（状态变更等）
 
 
-@dataclass
+@dataclass(slots=True)
 class Message:
     """Agent 间通信的标准消息。"""
 
@@ -30,7 +36,15 @@ class Message:
     content: str                            # 消息内容
     msg_type: MessageType = MessageType.TASK
     metadata: dict[str, Any] = field(default_factory=dict)
-    timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
+    # 单调时钟纳秒数：创建消息时只取整数，需要可读时间时再用 isoformat_timestamp 转换
+    timestamp: int = field(default_factory=time.monotonic_ns)
+
+    @property
+    def isoformat_timestamp(self) -> str:
+        """消息创建时间的 ISO 8601 字符串（本地时间）。"""
+        return datetime.fromtimestamp(
+            (self.timestamp + _WALL_CLOCK_OFFSET_NS) / 1e9
+        ).isoformat()
 
     def __repr__(self) -> str:
         content_preview = self.content[:60] + "..." if len(self.content) > 60 else self.content
@@ -41,7 +55,43 @@ class Message:
         )
 
 
-@dataclass
+_FIELD_ROOT_RE = re.compile(r"[.\[]")
+_TEMPLATE_FIELDS = frozenset({"task", "prev_result", "all_results"})
+
+
+@dataclass(frozen=True, slots=True)
+class _CompiledTemplate:
+    """预解析的任务模板：按字面量与占位符拆分，渲染时直接拼接。"""
+
+    source: str
+    segments: tuple[tuple[str, str | None], ...]
+    fields: frozenset[str]
+    simple: bool  # 不含格式说明、转换符或属性访问，可走拼接快速路径
+
+    @classmethod
+    def compile(cls, template: str) -> _CompiledTemplate:
+        segments: list[tuple[str, str | None]] = []
+        fields: set[str] = set()
+        simple = True
+        for literal, field_name, format_spec, conversion in string.Formatter().parse(template):
+            if field_name is not None:
+                fields.add(_FIELD_ROOT_RE.split(field_name, 1)[0])
+                if format_spec or conversion or field_name not in _TEMPLATE_FIELDS:
+                    simple = False
+            segments.append((literal, field_name))
+        return cls(template, tuple(segments), frozenset(fields), simple)
+
+    def render(self, values: dict[str, str]) -> str:
+        if not self.simple:
+            # 复杂占位符（或未知字段）交给 str.format，保持原有行为与报错
+            return self.source.format(**values)
+        return "".join(
+            literal if name is None else literal + values[name]
+            for literal, name in self.segments
+        )
+
+
+@dataclass(slots=True)
 class PipelineStep:
     """流水线步骤定义（纯数据类，不依赖 LLM）。
 
@@ -49,9 +99,43 @@ class PipelineStep:
         {task}        - 原始任务
         {prev_result} - 上一步的输出
         {all_results} - 所有步骤的输出汇总
+
+    transform 只加工本步骤的输出（随后作为下一步的任务内容进入 user 消息），
+    不要借它改写角色的 system prompt：system 前缀需要在多次请求间保持逐字节一致，
+    服务端的 prompt 缓存才能命中。
+
+    stream_to_next 为 True 时，本步骤以流式方式执行，每生成完一个段落（以空行分隔）
+    就交给下一步处理，两步的 LLM 调用在时间上重叠；下一步的输出为各段落结果按顺序
+    拼接。下一步模板不引用 {prev_result}、引用了 {all_results}、两步为同一 Agent
+    或本步骤设置了 transform 时退化为普通的逐步执行。
     """
 
     agent_name: str
     task_template: str = "{task}"
     retry: int = 1
     transform: Callable[[str], str] | None = None
+    stream_to_next: bool = False
+    _compiled: _CompiledTemplate | None = field(default=None, init=False, repr=False, compare=False)
+
+    def render(self, *, task: str, prev_result: str, all_results: Callable[[], str]) -> str:
+        """渲染任务模板。
+
+        模板只解析一次（task_template 被修改后会重新解析）；
+        只有模板引用了 {all_results} 时才调用 all_results() 生成汇总。
+        """
+        compiled = self._compiled_template()
+        values = {"task": task, "prev_result": prev_result}
+        if "all_results" in compiled.fields:
+            values["all_results"] = all_results()
+        return compiled.render(values)
+
+    def uses_field(self, name: str) -> bool:
+        """模板是否引用了指定占位符。"""
+        return name in self._compiled_template().fields
+
+    def _compiled_template(self) -> _CompiledTemplate:
+        """返回预解析的模板，task_template 被修改后重新解析。"""
+        compiled = self._compiled
+        if compiled is None or compiled.source != self.task_template:
+            compiled = self._compiled = _CompiledTemplate.compile(self.task_template)
+        return compiled
@@ -2,6 +2,8 @@
 
 一个 Planner Agent 负责拆解任务、动态分派给专业 Agent 执行，
 并根据执行结果决定下一步行动，支持失败后的重新规划。
+计划中的步骤可以声明依赖（deps），互不依赖的步骤会并发执行
+（run 使用线程池，arun 在单个事件循环中通过 asyncio.gather 分派）。
 
 示例流程:
     task → [Planner 规划] → step1 → [Agent A] → step2 → [Agent B] → ... → [汇总] → final
@@ -9,14 +11,19 @@
 
 from __future__ import annotations
 
+import asyncio
 import json
-import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 from src.llm import LLMClient
 from src.multi.base import BaseMultiAgent
 from src.tools.base import ToolRegistry
 
+_JSON_DECODER = json.JSONDecoder()
+
+NO_PLAN_ERROR = "错误：无法生成执行计划。"
+
 PLANNER_PROMPT = """你是一个任务规划和编排专家。你需要将复杂任务拆解为子任务，并分配给合适的 Agent 执行。
 
 可用的 Agent：
@@ -25,14 +32,16 @@ PLANNER_PROMPT = """你是一个任务规划和编排专家。你需要将复杂
 你需要输出一个 JSON 格式的执行计划，格式如下：
 ```json
 [
-  {{"agent": "agent_name", "task": "具体的子任务描述"}},
-  {{"agent": "agent_name", "task": "具体的子任务描述"}}
+  {{"agent": "agent_name", "task": "具体的子任务描述", "deps": []}},
+  {{"agent": "agent_name", "task": "具体的子任务描述", "deps": [1]}}
 ]
 ```
 
 规则：
 - 每个子任务要具体明确，让对应的 Agent 能直接执行
 - 合理安排顺序，后面的任务可以依赖前面的结果
+- deps 列出该步骤依赖的前面步骤序号（从 1 开始），互不依赖的步骤会并发执行；
+  不需要任何前面步骤的结果时写 []
 - agent 名称必须是可用 Agent 之一
 - 只输出 JSON，不要输出其他内容"""
 
@@ -68,151 +77,387 @@ class OrchestratorMultiAgent(BaseMultiAgent):
 
     def run(self, task: str) -> str:
         """执行编排模式。"""
-        original_task = task
-        working_task = task
-        total_attempts = self._max_replan + 1
-        last_error = "错误：无法生成执行计划。"
-
-        for attempt in range(1, total_attempts + 1):
-            self.state.reset()
-            self.state.task = original_task
-            self.state.status = "planning"
-            self.state.metadata["attempt"] = attempt
-
-            self._log_header(f"Orchestrator 编排模式开始（尝试 {attempt}/{total_attempts}）")
-            self._log(f"  原始任务: {original_task}")
-            if attempt > 1:
-                self._log(f"  当前工作任务: {working_task}")
-            self._log(f"  可用 Agent: {self.agent_names}")
-
-            # Step 1: 规划
-            plan = self._plan(working_task)
-            if not plan:
-                last_error = "错误：无法生成执行计划。"
-                self._log(f"  ⚠️  {last_error}")
-                if attempt < total_attempts:
-                    working_task = self._build_replan_task(
-                        original_task=original_task,
-                        working_task=working_task,
-                        plan=[],
-                        errors=[last_error],
-                    )
-                    self._log("  🔁 进入下一轮重新规划。")
-                    continue
-
-                self.state.status = "failed"
-                return last_error
-
-            self.state.plan = [f"{p['agent']}: {p['task']}" for p in plan]
-            self._log(f"\n📋 执行计划 ({len(plan)} 步):")
-            for i, step in enumerate(plan, 1):
-                self._log(f"  {i}. [{step['agent']}] {step['task']}")
-
-            # Step 2: 按计划执行
-            self.state.status = "executing"
-            execution_errors: list[str] = []
-
-            for i, step in enumerate(plan):
-                self.state.current_step = i + 1
-                agent_name = step["agent"]
-                sub_task = step["task"]
-
-                if self.state.results:
-                    sub_task += f"\n\n[参考信息] 前面步骤的结果:\n{self.state.get_all_results()}"
-
-                self._log(f"\n--- 执行步骤 {i + 1}: [{agent_name}] ---")
-                self._log_agent(agent_name, "接收任务", step["task"])
-
-                if agent_name not in self._agents:
-                    error = f"错误：Agent '{agent_name}' 不存在。"
-                    self._log(f"  ⚠️  {error}")
-                    execution_errors.append(error)
+        try:
+            working_task = task
+            errors: list[str] = []
+            for attempt in range(1, self._max_replan + 2):
+                self._begin_attempt(task, working_task, attempt)
+
+                # Step 1: 规划
+                plan = self._plan(working_task)
+
+                # Step 2: 按依赖关系分层执行，同一层的步骤并发分派
+                if plan:
+                    self._begin_execution(plan)
+                    errors = self._execute_plan(plan)
+                else:
+                    errors = [NO_PLAN_ERROR]
+
+                # Step 3: 汇总
+                if not errors:
+                    self._begin_summary()
+                    return self._finish(self._summarize(task))
+
+                working_task = self._next_working_task(task, working_task, plan, errors, attempt)
+                if working_task is None:
                     break
 
-                result = self._dispatch(agent_name, sub_task)
-                self._log_agent(agent_name, "输出结果", result)
-                self._fire_hook("on_step_complete", step=i + 1, state=self.state)
+            self.state.status = "failed"
+            return errors[-1]
+        finally:
+            self._flush_log()
+
+    async def arun(self, task: str) -> str:
+        """run 的异步版本：规划与汇总走 llm.achat_simple，同一层的步骤通过 asyncio.gather 并发分派。"""
+        try:
+            working_task = task
+            errors: list[str] = []
+            for attempt in range(1, self._max_replan + 2):
+                self._begin_attempt(task, working_task, attempt)
+
+                plan = await self._aplan(working_task)
 
-                if result.startswith("错误："):
-                    execution_errors.append(
-                        f"步骤 {i + 1} 的 Agent '{agent_name}' 执行失败：{result}"
-                    )
+                if plan:
+                    self._begin_execution(plan)
+                    errors = await self._aexecute_plan(plan)
+                else:
+                    errors = [NO_PLAN_ERROR]
+
+                if not errors:
+                    self._begin_summary()
+                    return self._finish(await self._asummarize(task))
+
+                working_task = self._next_working_task(task, working_task, plan, errors, attempt)
+                if working_task is None:
                     break
 
-            if execution_errors:
-                last_error = execution_errors[-1]
-                self._log(f"\n⚠️  本轮执行失败：{last_error}")
-                if attempt < total_attempts:
-                    working_task = self._build_replan_task(
-                        original_task=original_task,
-                        working_task=working_task,
-                        plan=plan,
-                        errors=execution_errors,
-                    )
-                    self._log("🔁 根据失败信息重新规划下一轮。")
-                    continue
-
-                self.state.status = "failed"
-                return last_error
-
-            # Step 3: 汇总
-            self.state.status = "reviewing"
-            self._log(f"\n--- 汇总阶段 ---")
-            final = self._summarize(original_task)
-
-            self.state.status = "done"
-            self._log_header("Orchestrator 完成")
-            self._log(f"  {self.state.summary()}")
-            return final
-
-        self.state.status = "failed"
-        return last_error
-
-    def _plan(self, task: str) -> list[dict[str, str]]:
+            self.state.status = "failed"
+            return errors[-1]
+        finally:
+            self._flush_log()
+
+    def _begin_attempt(self, original_task: str, working_task: str, attempt: int) -> None:
+        """每轮尝试开始：重置状态并打印概况。"""
+        self.state.reset()
+        self.state.task = original_task
+        self.state.status = "planning"
+        self.state.metadata["attempt"] = attempt
+
+        self._log_header(f"Orchestrator 编排模式开始（尝试 {attempt}/{self._max_replan + 1}）")
+        self._log(f"  原始任务: {original_task}")
+        if attempt > 1:
+            self._log(f"  当前工作任务: {working_task}")
+        self._log(f"  可用 Agent: {self.agent_names}")
+
+    def _begin_execution(self, plan: list[dict[str, Any]]) -> None:
+        """记录并打印计划，进入执行阶段。"""
+        self.state.plan = [f"{p['agent']}: {p['task']}" for p in plan]
+        self._log(f"\n📋 执行计划 ({len(plan)} 步):")
+        for i, step in enumerate(plan, 1):
+            deps_text = f" (依赖: {[d + 1 for d in step['deps']]})" if step["deps"] else ""
+            self._log(f"  {i}. [{step['agent']}] {step['task']}{deps_text}")
+        self.state.status = "executing"
+
+    def _begin_summary(self) -> None:
+        """进入汇总阶段。"""
+        self.state.status = "reviewing"
+        self._log(f"\n--- 汇总阶段 ---")
+
+    def _finish(self, final: str) -> str:
+        """汇总完成，标记结束。"""
+        self.state.status = "done"
+        self._log_header("Orchestrator 完成")
+        self._log(f"  {self.state.summary()}")
+        return final
+
+    def _next_working_task(
+        self,
+        original_task: str,
+        working_task: str,
+        plan: list[dict[str, Any]],
+        errors: list[str],
+        attempt: int,
+    ) -> str | None:
+        """本轮失败后构造下一轮的工作任务；已用完重规划次数时返回 None。"""
+        if plan:
+            self._log(f"\n⚠️  本轮执行失败：{errors[-1]}")
+        else:
+            self._log(f"  ⚠️  {errors[-1]}")
+        if attempt > self._max_replan:
+            return None
+
+        next_task = self._build_replan_task(
+            original_task=original_task,
+            working_task=working_task,
+            plan=plan,
+            errors=errors,
+        )
+        self._log("🔁 根据失败信息重新规划下一轮。" if plan else "  🔁 进入下一轮重新规划。")
+        return next_task
+
+    def _execute_plan(self, plan: list[dict[str, Any]]) -> list[str]:
+        """按依赖关系执行计划，返回执行错误列表（为空表示全部成功）。
+
+        每一轮取出依赖已全部完成的步骤并发执行；每个步骤只附带其依赖步骤的结果作为上下文。
+        同一个 Agent 实例不能同时执行两个任务（对话历史与流式配置都挂在实例上），
+        因此同一层内分给同一 Agent 的步骤在一个线程里按顺序执行，不同 Agent 之间并发。
+        """
+        step_results: dict[int, str] = {}
+        pending = list(range(len(plan)))
+
+        while pending:
+            ready, sub_tasks, error = self._next_layer(plan, pending, step_results)
+            if error is not None:
+                return [error]
+            pending = [i for i in pending if i not in ready]
+
+            groups = self._group_by_agent(plan, ready, sub_tasks)
+            if len(groups) == 1:
+                group_results = [self._dispatch_steps(plan, groups[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+                    futures = [pool.submit(self._dispatch_steps, plan, group) for group in groups]
+                    group_results = [future.result() for future in futures]
+            results = self._ungroup(ready, groups, group_results)
+
+            error = self._record_layer(plan, ready, results, step_results)
+            if error is not None:
+                return [error]
+
+        return []
+
+    async def _aexecute_plan(self, plan: list[dict[str, Any]]) -> list[str]:
+        """_execute_plan 的异步版本，同一层的步骤在一个事件循环中并发分派。"""
+        step_results: dict[int, str] = {}
+        pending = list(range(len(plan)))
+
+        while pending:
+            ready, sub_tasks, error = self._next_layer(plan, pending, step_results)
+            if error is not None:
+                return [error]
+            pending = [i for i in pending if i not in ready]
+
+            groups = self._group_by_agent(plan, ready, sub_tasks)
+            group_results = await asyncio.gather(*(
+                self._adispatch_steps(plan, group) for group in groups
+            ))
+            results = self._ungroup(ready, groups, group_results)
+
+            error = self._record_layer(plan, ready, results, step_results)
+            if error is not None:
+                return [error]
+
+        return []
+
+    @staticmethod
+    def _group_by_agent(
+        plan: list[dict[str, Any]],
+        ready: list[int],
+        sub_tasks: list[str],
+    ) -> list[list[tuple[int, str]]]:
+        """把一层的 (步骤下标, 子任务) 按 Agent 分组，组内保持步骤顺序。"""
+        groups: dict[str, list[tuple[int, str]]] = {}
+        for i, sub_task in zip(ready, sub_tasks):
+            groups.setdefault(plan[i]["agent"], []).append((i, sub_task))
+        return list(groups.values())
+
+    @staticmethod
+    def _ungroup(
+        ready: list[int],
+        groups: list[list[tuple[int, str]]],
+        group_results: list[list[str]],
+    ) -> list[str]:
+        """把按 Agent 分组的结果还原为与 ready 一一对应的列表。"""
+        by_index = {
+            i: result
+            for group, results in zip(groups, group_results)
+            for (i, _), result in zip(group, results)
+        }
+        return [by_index[i] for i in ready]
+
+    @staticmethod
+    def _step_key(plan: list[dict[str, Any]], index: int) -> str:
+        """步骤结果在共享状态中的 key；同一 Agent 的多个步骤各占一条，汇总时都能看到。"""
+        return f"{index + 1}:{plan[index]['agent']}"
+
+    def _dispatch_steps(self, plan: list[dict[str, Any]], group: list[tuple[int, str]]) -> list[str]:
+        """按顺序执行分给同一个 Agent 的若干步骤。"""
+        return [
+            self._dispatch(plan[i]["agent"], sub_task, result_key=self._step_key(plan, i))
+            for i, sub_task in group
+        ]
+
+    async def _adispatch_steps(
+        self, plan: list[dict[str, Any]], group: list[tuple[int, str]]
+    ) -> list[str]:
+        """_dispatch_steps 的异步版本。"""
+        return [
+            await self._adispatch(plan[i]["agent"], sub_task, result_key=self._step_key(plan, i))
+            for i, sub_task in group
+        ]
+
+    def _next_layer(
+        self,
+        plan: list[dict[str, Any]],
+        pending: list[int],
+        step_results: dict[int, str],
+    ) -> tuple[list[int], list[str], str | None]:
+        """取出依赖已完成的步骤并构造子任务，返回 (步骤下标, 子任务, 错误)。"""
+        ready = [i for i in pending if all(dep in step_results for dep in plan[i]["deps"])]
+        sub_tasks: list[str] = []
+        for i in ready:
+            agent_name = plan[i]["agent"]
+            self._log(f"\n--- 执行步骤 {i + 1}: [{agent_name}] ---")
+            self._log_agent(agent_name, "接收任务", plan[i]["task"])
+
+            if agent_name not in self._agents:
+                error = f"错误：Agent '{agent_name}' 不存在。"
+                self._log(f"  ⚠️  {error}")
+                return ready, sub_tasks, error
+            sub_tasks.append(self._build_step_task(plan, i, step_results))
+        return ready, sub_tasks, None
+
+    def _record_layer(
+        self,
+        plan: list[dict[str, Any]],
+        ready: list[int],
+        results: list[str],
+        step_results: dict[int, str],
+    ) -> str | None:
+        """按步骤顺序记录一层的结果；遇到失败的步骤时返回错误信息。"""
+        for i, result in zip(ready, results):
+            agent_name = plan[i]["agent"]
+            self.state.current_step = i + 1
+            self._log_agent(agent_name, "输出结果", result)
+            self._fire_hook("on_step_complete", step=i + 1, state=self.state)
+
+            if result.startswith("错误："):
+                return f"步骤 {i + 1} 的 Agent '{agent_name}' 执行失败：{result}"
+            step_results[i] = result
+        return None
+
+    @staticmethod
+    def _build_step_task(
+        plan: list[dict[str, Any]],
+        index: int,
+        step_results: dict[int, str],
+    ) -> str:
+        """构造某一步的子任务：任务描述 + 其依赖步骤的结果。"""
+        step = plan[index]
+        if not step["deps"]:
+            return step["task"]
+        # 所有片段一次 join，依赖结果较长时只拷贝一遍
+        parts = [step["task"], "\n\n[参考信息] 前面步骤的结果:\n"]
+        for i, dep in enumerate(step["deps"]):
+            if i:
+                parts.append("\n\n")
+            parts.extend(("[", plan[dep]["agent"], "] 的结果:\n", step_results[dep]))
+        return "".join(parts)
+
+    def _plan(self, task: str) -> list[dict[str, Any]]:
         """用 LLM 生成执行计划。"""
+        response = self.llm.chat_simple(prompt=task, system=self._planner_prompt())
+        return self._parse_planner_output(response)
+
+    async def _aplan(self, task: str) -> list[dict[str, Any]]:
+        """_plan 的异步版本。"""
+        response = await self.llm.achat_simple(prompt=task, system=self._planner_prompt())
+        return self._parse_planner_output(response)
+
+    def _planner_prompt(self) -> str:
+        """构造 Planner 的 system prompt。"""
         agents_desc = "\n".join(
             f"- {name}: {getattr(agent, '_role_system_prompt', '通用Agent')[:80]}..."
             for name, agent in self._agents.items()
         )
-
-        prompt = PLANNER_PROMPT.format(agents_description=agents_desc)
         self._log(f"\n🤔 正在规划...")
+        return PLANNER_PROMPT.format(agents_description=agents_desc)
 
-        response = self.llm.chat_simple(prompt=task, system=prompt)
+    def _parse_planner_output(self, response: str) -> list[dict[str, Any]]:
+        """打印 Planner 输出并解析计划。"""
         self._log(f"  Planner 输出: {response[:300]}...")
-
         return self._parse_plan(response)
 
-    def _parse_plan(self, text: str) -> list[dict[str, str]]:
+    def _parse_plan(self, text: str) -> list[dict[str, Any]]:
         """从 LLM 输出中解析执行计划 JSON。"""
-        json_match = re.search(r"\[.*\]", text, re.DOTALL)
-        if not json_match:
+        plan = self._extract_json_list(text)
+        if plan is None:
             return []
 
         try:
-            plan = json.loads(json_match.group())
-            validated = []
+            validated: list[dict[str, Any]] = []
             for item in plan:
                 if isinstance(item, dict) and "agent" in item and "task" in item:
-                    validated.append({"agent": item["agent"], "task": item["task"]})
+                    validated.append({
+                        "agent": item["agent"],
+                        "task": item["task"],
+                        "deps": self._parse_deps(item.get("deps"), len(validated)),
+                    })
             return validated
-        except (json.JSONDecodeError, TypeError):
+        except TypeError:
             return []
 
+    @staticmethod
+    def _extract_json_list(text: str) -> list[Any] | None:
+        """提取文本中的 JSON 数组。
+
+        先直接解析最外层的 [...]（最常见的情况，不经过正则）；失败时（如计划前后
+        还有带方括号的说明文字）依次从每个 '[' 处尝试 raw_decode。
+        """
+        start = text.find("[")
+        end = text.rfind("]")
+        if start < 0 or end < start:
+            return None
+        try:
+            value = json.loads(text[start:end + 1])
+            return value if isinstance(value, list) else None
+        except json.JSONDecodeError:
+            pass
+
+        while start >= 0:
+            try:
+                value, _ = _JSON_DECODER.raw_decode(text, start)
+            except json.JSONDecodeError:
+                pass
+            else:
+                if isinstance(value, list):
+                    return value
+            start = text.find("[", start + 1)
+        return None
+
+    @staticmethod
+    def _parse_deps(raw_deps: Any, index: int) -> list[int]:
+        """把 1 起始的依赖序号转换为 0 起始下标。
+
+        未声明 deps 时依赖前面所有步骤（保持顺序执行的语义）；
+        只保留指向前面步骤的合法序号，保证计划无环。
+        """
+        if not isinstance(raw_deps, list):
+            return list(range(index))
+        deps = {dep - 1 for dep in raw_deps if isinstance(dep, int) and 1 <= dep <= index}
+        return sorted(deps)
+
     def _summarize(self, task: str) -> str:
         """汇总所有 Agent 的结果。"""
-        prompt = SUMMARIZER_PROMPT.format(
+        return self.llm.chat_simple(prompt=self._summarizer_prompt(task))
+
+    async def _asummarize(self, task: str) -> str:
+        """_summarize 的异步版本。"""
+        return await self.llm.achat_simple(prompt=self._summarizer_prompt(task))
+
+    def _summarizer_prompt(self, task: str) -> str:
+        """构造汇总 prompt。"""
+        return SUMMARIZER_PROMPT.format(
             task=task,
             all_results=self.state.get_all_results(),
         )
-        return self.llm.chat_simple(prompt=prompt)
 
     def _build_replan_task(
         self,
         *,
         original_task: str,
         working_task: str,
-        plan: list[dict[str, str]],
+        plan: list[dict[str, Any]],
         errors: list[str],
     ) -> str:
         """构造带失败上下文的下一轮规划任务。"""
@@ -230,7 +475,7 @@ class OrchestratorMultiAgent(BaseMultiAgent):
         )
 
     @staticmethod
-    def _format_plan(plan: list[dict[str, str]]) -> str:
+    def _format_plan(plan: list[dict[str, Any]]) -> str:
         """格式化计划文本。"""
         if not plan:
             return "(暂无有效计划)"
@@ -1,7 +1,7 @@
 """Pipeline 流水线模式
 
 Agent 按固定顺序依次处理，上一个的输出是下一个的输入。
-支持自定义任务模板和失败重试。
+支持自定义任务模板、失败重试，以及相邻两步按段落流式衔接。
 
 示例流程:
     task → [研究员] → 素材 → [分析师] → 观点 → [写作者] → 报告
@@ -9,6 +9,10 @@ Agent 按固定顺序依次处理，上一个的输出是下一个的输入。
 
 from __future__ import annotations
 
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
 from src.llm import LLMClient
 from src.multi.base import BaseMultiAgent
 from src.multi.message import PipelineStep
@@ -34,55 +38,167 @@ class PipelineMultiAgent(BaseMultiAgent):
 
     def run(self, task: str) -> str:
         """执行流水线。"""
-        if not self._steps:
-            return "错误：流水线没有定义任何步骤。"
-
-        self.state.reset()
-        self.state.task = task
-        self.state.status = "executing"
-        self.state.plan = [f"Step {i+1}: {s.agent_name}" for i, s in enumerate(self._steps)]
-
-        self._log_header(f"Pipeline 流水线开始 ({len(self._steps)} 步)")
-        self._log(f"  任务: {task}")
-
-        prev_result = ""
-        final_result = ""
-
-        for i, step in enumerate(self._steps):
-            self.state.current_step = i + 1
-            self._log(f"\n--- 步骤 {i+1}/{len(self._steps)}: [{step.agent_name}] ---")
-
-            # 渲染任务模板
-            rendered_task = step.task_template.format(
-                task=task,
-                prev_result=prev_result,
-                all_results=self.state.get_all_results(),
-            )
-            self._log_agent(step.agent_name, "接收任务", rendered_task)
-
-            # 执行（含重试）
-            result = self._execute_with_retry(step, rendered_task)
-
-            # 可选的结果转换
-            if step.transform is not None:
-                result = step.transform(result)
-
-            prev_result = result
-            final_result = result
-            self._log_agent(step.agent_name, "输出结果", result)
-            self._fire_hook("on_step_complete", step=i + 1, state=self.state)
-
-        self.state.status = "done"
-        self._log_header("Pipeline 完成")
-        self._log(f"  {self.state.summary()}")
-
-        return final_result
-
-    def _execute_with_retry(self, step: PipelineStep, task: str) -> str:
-        """带重试的执行。"""
+        try:
+            if not self._steps:
+                return "错误：流水线没有定义任何步骤。"
+
+            self.state.reset()
+            self.state.task = task
+            self.state.status = "executing"
+            self.state.plan = [f"Step {i+1}: {s.agent_name}" for i, s in enumerate(self._steps)]
+
+            self._log_header(f"Pipeline 流水线开始 ({len(self._steps)} 步)")
+            self._log(f"  任务: {task}")
+
+            prev_result = ""
+            final_result = ""
+
+            i = 0
+            while i < len(self._steps):
+                step = self._steps[i]
+                next_step = self._steps[i + 1] if i + 1 < len(self._steps) else None
+                self.state.current_step = i + 1
+                self._log(f"\n--- 步骤 {i+1}/{len(self._steps)}: [{step.agent_name}] ---")
+
+                # 渲染任务模板
+                rendered_task = step.render(
+                    task=task,
+                    prev_result=prev_result,
+                    all_results=self.state.get_all_results,
+                )
+                self._log_agent(step.agent_name, "接收任务", rendered_task)
+
+                # 执行（含重试）；可流式时下一步按段落同步处理
+                piped_result = None
+                if next_step is not None and self._can_stream(step, next_step):
+                    result, piped_result = self._execute_streamed(step, next_step, task, rendered_task)
+                else:
+                    result = self._execute_with_retry(step, rendered_task)
+
+                prev_result = final_result = self._complete_step(i, step, result)
+                i += 1
+
+                if piped_result is not None:
+                    # 下一步已在流式阶段逐段处理完毕：流式阶段不记录任何状态，
+                    # 确认采用拼接结果后才补记任务消息、结果并触发 hook，顺序与普通执行一致
+                    self.state.current_step = i + 1
+                    self._log(f"\n--- 步骤 {i+1}/{len(self._steps)}: [{next_step.agent_name}] (流式) ---")
+                    piped_task = next_step.render(
+                        task=task,
+                        prev_result=prev_result,
+                        all_results=self.state.get_all_results,
+                    )
+                    self._begin_dispatch(next_step.agent_name, piped_task)
+                    self._record_result(next_step.agent_name, piped_result)
+                    prev_result = final_result = self._complete_step(i, next_step, piped_result)
+                    i += 1
+
+            self.state.status = "done"
+            self._log_header("Pipeline 完成")
+            self._log(f"  {self.state.summary()}")
+
+            return final_result
+        finally:
+            self._flush_log()
+
+    def _complete_step(self, index: int, step: PipelineStep, result: str) -> str:
+        """应用可选的结果转换，记录日志并触发 on_step_complete。"""
+        if step.transform is not None:
+            result = step.transform(result)
+        self._log_agent(step.agent_name, "输出结果", result)
+        self._fire_hook("on_step_complete", step=index + 1, state=self.state)
+        return result
+
+    @staticmethod
+    def _can_stream(step: PipelineStep, next_step: PipelineStep) -> bool:
+        """判断本步骤能否把输出按段落流式交给下一步。"""
+        return (
+            step.stream_to_next
+            and step.transform is None
+            and step.agent_name != next_step.agent_name
+            and next_step.uses_field("prev_result")
+            and not next_step.uses_field("all_results")
+        )
+
+    def _execute_streamed(
+        self,
+        step: PipelineStep,
+        next_step: PipelineStep,
+        task: str,
+        rendered_task: str,
+    ) -> tuple[str, str | None]:
+        """流式执行本步骤，每完成一个段落就交给后台线程中的下一步处理。
+
+        Returns:
+            (本步骤结果, 下一步结果)。本步骤失败、命中缓存或流式内容与最终结果不一致时
+            下一步结果为 None，由调用方按普通方式重新执行下一步。
+        """
+        sections: queue.Queue[str | None] = queue.Queue()
+        streamed: list[str] = []
+        pending = ""
+
+        def on_chunk(text: str) -> None:
+            nonlocal pending
+            streamed.append(text)
+            pending += text
+            while "\n\n" in pending:
+                section, _, pending = pending.partition("\n\n")
+                if section.strip():
+                    sections.put(section)
+
+        def consume() -> list[str]:
+            outputs: list[str] = []
+            while (section := sections.get()) is not None:
+                section_task = next_step.render(
+                    task=task,
+                    prev_result=section,
+                    all_results=self.state.get_all_results,
+                )
+                outputs.append(self._execute_with_retry(next_step, section_task, record=False))
+            return outputs
+
+        complete = False
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            consumer = pool.submit(consume)
+            try:
+                result = self._execute_with_retry(step, rendered_task, on_chunk=on_chunk)
+                # 只有流式内容就是最终结果时，已交出的段落才有效
+                complete = bool(streamed) and "".join(streamed).strip() == result.strip()
+                if complete and pending.strip():
+                    sections.put(pending)
+            finally:
+                sections.put(None)
+            outputs = consumer.result()
+
+        # 任一段落的下游处理失败时整体作废，交给调用方按普通方式重跑下一步，
+        # 避免错误信息夹在拼接结果中间被当作成功结果往下传
+        if (
+            not complete
+            or not outputs
+            or result.startswith("错误：")
+            or any(output.startswith("错误：") for output in outputs)
+        ):
+            return result, None
+        return result, "\n\n".join(outputs)
+
+    def _execute_with_retry(
+        self,
+        step: PipelineStep,
+        task: str,
+        on_chunk: Callable[[str], None] | None = None,
+        record: bool = True,
+    ) -> str:
+        """带重试的执行。on_chunk 只用于第一次尝试；record 原样传给 _dispatch。"""
         last_error = ""
         for attempt in range(1, step.retry + 1):
-            result = self._dispatch(step.agent_name, task)
+            # 重试必须真正重新执行，不走缓存
+            result = self._dispatch(
+                step.agent_name,
+                task,
+                use_cache=attempt == 1,
+                on_chunk=on_chunk if attempt == 1 else None,
+                record=record,
+            )
             if not result.startswith("错误："):
                 return result
             last_error = result
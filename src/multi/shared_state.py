@@ -5,13 +5,14 @@
 
 from __future__ import annotations
 
+import heapq
 from dataclasses import dataclass, field
 from typing import Any, Literal
 
 from src.multi.message import Message, MessageType
 
 
-@dataclass
+@dataclass(slots=True)
 class SharedState:
     """多 Agent 协作的共享状态。"""
 
@@ -23,14 +24,32 @@ class SharedState:
     current_step: int = 0
     max_steps: int = 20
     metadata: dict[str, Any] = field(default_factory=dict)
+    # get_all_results 的增量缓存：每个 Agent 一段格式化文本，顺序与 results 一致
+    _result_chunks: list[str] = field(default_factory=list, init=False, repr=False, compare=False)
+    _chunk_index: dict[str, int] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _all_results_cache: str | None = field(default=None, init=False, repr=False, compare=False)
+    # 按接收者分桶的消息下标（保持到达顺序），get_messages_for 只合并两个桶
+    _by_receiver: dict[str, list[int]] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _indexed_count: int = field(default=0, init=False, repr=False, compare=False)
 
     def add_message(self, message: Message) -> None:
         """记录一条消息。"""
         self.messages.append(message)
+        if self._indexed_count == len(self.messages) - 1:
+            self._by_receiver.setdefault(message.receiver, []).append(self._indexed_count)
+            self._indexed_count += 1
 
     def add_result(self, agent_name: str, result: str) -> None:
         """记录某个 Agent 的执行结果。"""
         self.results[agent_name] = result
+        chunk = f"[{agent_name}] 的结果:\n{result}"
+        index = self._chunk_index.get(agent_name)
+        if index is None:
+            self._chunk_index[agent_name] = len(self._result_chunks)
+            self._result_chunks.append(chunk)
+        else:
+            self._result_chunks[index] = chunk  # 覆盖结果时保持原有顺序
+        self._all_results_cache = None
         self.add_message(Message(
             sender=agent_name,
             receiver="system",
@@ -43,27 +62,54 @@ class SharedState:
         return self.results.get(agent_name)
 
     def get_all_results(self) -> str:
-        """获取所有 Agent 结果的格式化文本。"""
+        """获取所有 Agent 结果的格式化文本。
+
+        每条结果只在 add_result 时格式化一次，拼接结果缓存到下一次 add_result 之前。
+        """
         if not self.results:
             return "(暂无结果)"
-        lines = []
-        for name, result in self.results.items():
-            lines.append(f"[{name}] 的结果:\n{result}")
-        return "\n\n".join(lines)
+        if len(self._result_chunks) != len(self.results):
+            self._rebuild_result_chunks()  # results 被直接修改过，缓存已失效
+        if self._all_results_cache is None:
+            self._all_results_cache = "\n\n".join(self._result_chunks)
+        return self._all_results_cache
+
+    def _rebuild_result_chunks(self) -> None:
+        """按 results 重新生成格式化缓存。"""
+        self._result_chunks = [
+            f"[{name}] 的结果:\n{result}" for name, result in self.results.items()
+        ]
+        self._chunk_index = {name: i for i, name in enumerate(self.results)}
+        self._all_results_cache = None
 
     def get_messages_for(self, receiver: str) -> list[Message]:
         """获取发给指定 Agent 的消息。"""
-        return [
-            m for m in self.messages
-            if m.receiver == receiver or m.receiver == "all"
-        ]
+        if self._indexed_count != len(self.messages):
+            self._rebuild_receiver_index()  # messages 被直接修改过，重建索引
+        direct = self._by_receiver.get(receiver, [])
+        if receiver == "all":
+            return [self.messages[i] for i in direct]
+        broadcast = self._by_receiver.get("all", [])
+        return [self.messages[i] for i in heapq.merge(direct, broadcast)]
+
+    def _rebuild_receiver_index(self) -> None:
+        """按 messages 重新生成接收者索引。"""
+        self._by_receiver = {}
+        for i, message in enumerate(self.messages):
+            self._by_receiver.setdefault(message.receiver, []).append(i)
+        self._indexed_count = len(self.messages)
 
     def reset(self) -> None:
         """重置状态（保留 max_steps 配置）。"""
         self.task = ""
         self.plan.clear()
         self.results.clear()
+        self._result_chunks.clear()
+        self._chunk_index.clear()
+        self._all_results_cache = None
         self.messages.clear()
+        self._by_receiver.clear()
+        self._indexed_count = 0
         self.status = "idle"
         self.current_step = 0
         self.metadata.clear()
@@ -1,21 +1,23 @@
 from src.tools.base import Tool, ToolRegistry
-from src.tools.calculator import CalculatorTool
+from src.tools.calculator import CALCULATOR, CalculatorTool
 from src.tools.mcp_adapter import MCPToolAdapter
 from src.tools.mcp_client import MCPStdioClient
 from src.tools.mcp_registry import get_mcp_config_path, load_mcp_tools
 from src.tools.read_local_file import ReadLocalFileTool
-from src.tools.weather import WeatherTool
+from src.tools.weather import WEATHER, WeatherTool
 from src.tools.search import SearchTool
 
 __all__ = [
     "Tool",
     "ToolRegistry",
+    "CALCULATOR",
     "CalculatorTool",
     "MCPToolAdapter",
     "MCPStdioClient",
     "get_mcp_config_path",
     "load_mcp_tools",
     "ReadLocalFileTool",
+    "WEATHER",
     "WeatherTool",
     "SearchTool",
 ]
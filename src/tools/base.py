@@ -12,12 +12,32 @@ from __future__ import annotations
 
 import json
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, ClassVar
+
+
+def openai_tool_schema(name: str, description: str, parameters: dict[str, Any]) -> dict[str, Any]:
+    """构造 OpenAI Function Calling 格式的工具定义。"""
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": parameters,
+        },
+    }
 
 
 class Tool(ABC):
     """工具抽象基类。所有工具必须继承此类并实现 run 方法。"""
 
+    # 相同参数多次调用是否总是返回相同结果、且没有副作用。
+    # 为 True 时，Agent 在同一次 run 中会复用之前的调用结果。
+    idempotent: bool = False
+
+    # 名称、描述与参数都是类常量的工具可以在类上预先构造好 schema，所有实例共用；
+    # 这份字典会被原样发送给 LLM，任何调用方都不应修改它
+    _SCHEMA: ClassVar[dict[str, Any] | None] = None
+
     @property
     @abstractmethod
     def name(self) -> str:
@@ -45,15 +65,20 @@ class Tool(ABC):
         """
 
     def to_openai_tool(self) -> dict[str, Any]:
-        """转换为 OpenAI Function Calling 工具格式。"""
-        return {
-            "type": "function",
-            "function": {
-                "name": self.name,
-                "description": self.description,
-                "parameters": self.parameters,
-            },
-        }
+        """转换为 OpenAI Function Calling 工具格式。
+
+        工具的名称、描述与参数在实例生命周期内视为不变，结果在首次调用时缓存，
+        同一工具注册到多个 ToolRegistry（如多 Agent 的角色子集）时共用同一份。
+        类上定义了 _SCHEMA 时直接返回它。
+        """
+        if self._SCHEMA is not None:
+            return self._SCHEMA
+        cached = self.__dict__.get("_openai_tool")
+        if cached is None:
+            cached = self._openai_tool = openai_tool_schema(
+                self.name, self.description, self.parameters
+            )
+        return cached
 
     def __repr__(self) -> str:
         return f"Tool(name={self.name!r})"
@@ -64,12 +89,17 @@ class ToolRegistry:
 
     def __init__(self) -> None:
         self._tools: dict[str, Tool] = {}
+        # 工具集合在 register 之间不会变化，缓存 schema 列表避免每次 run 都重建
+        self._openai_tools_cache: list[dict[str, Any]] | None = None
+        self._description_cache: str | None = None
 
     def register(self, tool: Tool) -> None:
         """注册一个工具。"""
         if tool.name in self._tools:
             raise ValueError(f"工具 '{tool.name}' 已注册，请勿重复注册。")
         self._tools[tool.name] = tool
+        self._openai_tools_cache = None
+        self._description_cache = None
 
     def get(self, name: str) -> Tool | None:
         """根据名称获取工具。"""
@@ -104,16 +134,24 @@ class ToolRegistry:
             return f"错误：工具 '{name}' 执行失败：{e}"
 
     def to_openai_tools(self) -> list[dict[str, Any]]:
-        """将所有工具转换为 OpenAI Function Calling 格式列表。"""
-        return [tool.to_openai_tool() for tool in self._tools.values()]
+        """将所有工具转换为 OpenAI Function Calling 格式列表。
+
+        结果在下次 register 之前会被缓存并复用，同一个列表对象每一步都原样发送，
+        保证工具 schema 的字节序列稳定。调用方不应修改返回的列表。
+        """
+        if self._openai_tools_cache is None:
+            self._openai_tools_cache = [tool.to_openai_tool() for tool in self._tools.values()]
+        return self._openai_tools_cache
 
     def get_tools_description(self) -> str:
-        """生成工具描述文本，用于纯文本模式的 Prompt。"""
-        lines = []
-        for tool in self._tools.values():
-            params = json.dumps(tool.parameters, ensure_ascii=False, indent=2)
-            lines.append(f"- **{tool.name}**: {tool.description}\n  参数: {params}")
-        return "\n".join(lines)
+        """生成工具描述文本，用于纯文本模式的 Prompt（在下次 register 之前缓存）。"""
+        if self._description_cache is None:
+            lines = []
+            for tool in self._tools.values():
+                params = json.dumps(tool.parameters, ensure_ascii=False, indent=2)
+                lines.append(f"- **{tool.name}**: {tool.description}\n  参数: {params}")
+            self._description_cache = "\n".join(lines)
+        return self._description_cache
 
     @property
     def tool_names(self) -> list[str]:
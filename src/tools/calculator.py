@@ -1,29 +1,49 @@
 """计算器工具
 
 安全地执行数学表达式，使用 ast 模块进行安全解析，
-防止代码注入攻击。
+防止代码注入攻击。解析结果编译为后缀字节码并按表达式缓存，
+由一个简单的栈式虚拟机执行。
 """
 
 from __future__ import annotations
 
 import ast
+import functools
 import math
-import operator
-from typing import Any
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable
 
-from src.tools.base import Tool
+from src.tools.base import Tool, openai_tool_schema
+
+# 字节码操作码：表达式先编译为后缀形式的 (opcode, arg) 序列，再由栈式虚拟机执行
+LOAD_CONST = 0
+ADD = 1
+SUB = 2
+MUL = 3
+DIV = 4
+FLOORDIV = 5
+MOD = 6
+POW = 7
+NEG = 8
+POS = 9
+CALL = 10  # arg 为 (函数对象, 参数个数)
+CALL1 = 11  # 单参数调用，arg 即函数对象
 
 # 支持的运算符
-_OPERATORS = {
-    ast.Add: operator.add,
-    ast.Sub: operator.sub,
-    ast.Mult: operator.mul,
-    ast.Div: operator.truediv,
-    ast.FloorDiv: operator.floordiv,
-    ast.Mod: operator.mod,
-    ast.Pow: operator.pow,
-    ast.USub: operator.neg,
-    ast.UAdd: operator.pos,
+_BINARY_OPCODES = {
+    ast.Add: ADD,
+    ast.Sub: SUB,
+    ast.Mult: MUL,
+    ast.Div: DIV,
+    ast.FloorDiv: FLOORDIV,
+    ast.Mod: MOD,
+    ast.Pow: POW,
+}
+_UNARY_OPCODES = {
+    ast.USub: NEG,
+    ast.UAdd: POS,
 }
 
 # 支持的数学函数
@@ -40,82 +60,354 @@ _MATH_FUNCTIONS = {
     "e": math.e,
 }
 
+Bytecode = tuple[tuple[int, Any], ...]
+
+# 向量模式（numexpr）允许的函数与节点类型
+_VECTOR_FUNCTIONS = frozenset({"abs", "sqrt", "sin", "cos", "tan", "log", "log10"})
+_VECTOR_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Call, ast.Name, ast.Load,
+    *_BINARY_OPCODES, *_UNARY_OPCODES,
+)
+
+# 合法表达式里不可能出现的片段（名字只能取自 _MATH_FUNCTIONS），命中时无需调用解析器
+_BLOCKLIST = ("import", "__", "lambda", "exec", "open", "compile")
+
+# CalculatorTool 默认缓存的表达式结果条数
+RESULT_CACHE_SIZE = 512
+
+# Python 3.13+ 的 ast.parse 支持 optimize，可在解析时折叠常量子表达式（如 pi/2 中的字面量部分）
+_PARSE_OPTIONS: dict[str, Any] = {"optimize": 2} if sys.version_info >= (3, 13) else {}
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_expression(expression: str) -> Bytecode:
+    """解析并编译表达式，结果按表达式缓存。
+
+    语法错误（SyntaxError）与不支持的语法（ValueError）会直接抛出，不会被缓存。
+    Agent 循环中经常重复计算同一个表达式，缓存后只需执行字节码。
+    """
+    tree = ast.parse(expression, mode="eval", **_PARSE_OPTIONS)
+    return tuple(_compile(tree))
+
+
+_Fragment = list[tuple[int, Any]]
+# 工作栈条目：(节点, None) 表示首次访问；(节点, (子节点数, 指令)) 表示子节点都已编译完
+_WorkItem = tuple[ast.AST, tuple[int, tuple[int, Any]] | None]
+
+
+def _compile(tree: ast.AST) -> list[tuple[int, Any]]:
+    """把 AST 编译为后缀字节码，只含常量的子表达式在编译期折叠为 LOAD_CONST。
+
+    用显式工作栈做后序遍历，而不是逐层递归：节点第一次出栈时按 type(node) 查
+    _VISITORS 分派，由对应函数校验节点并登记它最后要追加的指令、压入子节点；
+    第二次出栈时子节点的字节码片段已按顺序位于 fragments 末尾，合并后追加该指令并尝试折叠。
+    深层嵌套的表达式不会创建成串的栈帧。
+    """
+    root = tree.body if isinstance(tree, ast.Expression) else tree
+    work: list[_WorkItem] = [(root, None)]
+    fragments: list[_Fragment] = []
+    visitors = _VISITORS
+    while work:
+        node, pending = work.pop()
+        if pending is not None:
+            argc, instruction = pending
+            start = len(fragments) - argc
+            code = [op for fragment in fragments[start:] for op in fragment]
+            del fragments[start:]
+            code.append(instruction)
+            fragments.append(_fold(code))
+            continue
+        visitor = visitors.get(type(node))
+        if visitor is None:
+            raise ValueError(f"不支持的表达式类型: {type(node).__name__}")
+        visitor(node, work, fragments)
+    return fragments[0]
 
-def _safe_eval(node: ast.AST) -> float:
-    """递归地安全计算 AST 节点的值。"""
-    if isinstance(node, ast.Expression):
-        return _safe_eval(node.body)
-    elif isinstance(node, ast.Constant):
-        if isinstance(node.value, (int, float)):
-            return float(node.value)
+
+def _visit_constant(node: ast.Constant, work: list[_WorkItem], fragments: list[_Fragment]) -> None:
+    if not isinstance(node.value, (int, float)):
         raise ValueError(f"不支持的常量类型: {type(node.value)}")
-    elif isinstance(node, ast.BinOp):
-        op_type = type(node.op)
-        if op_type not in _OPERATORS:
-            raise ValueError(f"不支持的运算符: {op_type.__name__}")
-        left = _safe_eval(node.left)
-        right = _safe_eval(node.right)
-        return _OPERATORS[op_type](left, right)
-    elif isinstance(node, ast.UnaryOp):
-        op_type = type(node.op)
-        if op_type not in _OPERATORS:
-            raise ValueError(f"不支持的一元运算符: {op_type.__name__}")
-        operand = _safe_eval(node.operand)
-        return _OPERATORS[op_type](operand)
-    elif isinstance(node, ast.Call):
-        if isinstance(node.func, ast.Name) and node.func.id in _MATH_FUNCTIONS:
-            func = _MATH_FUNCTIONS[node.func.id]
-            if callable(func):
-                args = [_safe_eval(arg) for arg in node.args]
-                return float(func(*args))
-            return float(func)
+    fragments.append([(LOAD_CONST, float(node.value))])
+
+
+def _visit_binop(node: ast.BinOp, work: list[_WorkItem], fragments: list[_Fragment]) -> None:
+    opcode = _BINARY_OPCODES.get(type(node.op))
+    if opcode is None:
+        raise ValueError(f"不支持的运算符: {type(node.op).__name__}")
+    work.append((node, (2, (opcode, None))))
+    work.append((node.right, None))
+    work.append((node.left, None))
+
+
+def _visit_unaryop(node: ast.UnaryOp, work: list[_WorkItem], fragments: list[_Fragment]) -> None:
+    opcode = _UNARY_OPCODES.get(type(node.op))
+    if opcode is None:
+        raise ValueError(f"不支持的一元运算符: {type(node.op).__name__}")
+    work.append((node, (1, (opcode, None))))
+    work.append((node.operand, None))
+
+
+def _visit_call(node: ast.Call, work: list[_WorkItem], fragments: list[_Fragment]) -> None:
+    if not (isinstance(node.func, ast.Name) and node.func.id in _MATH_FUNCTIONS):
         raise ValueError(f"不支持的函数: {ast.dump(node.func)}")
-    elif isinstance(node, ast.Name):
-        if node.id in _MATH_FUNCTIONS:
-            val = _MATH_FUNCTIONS[node.id]
-            if not callable(val):
-                return float(val)
+    func = _MATH_FUNCTIONS[node.func.id]
+    if not callable(func):
+        fragments.append([(LOAD_CONST, float(func))])
+        return
+    # 编译期就把函数对象放进指令参数，执行时不再按名字查表
+    argc = len(node.args)
+    instruction = (CALL1, func) if argc == 1 else (CALL, (func, argc))
+    work.append((node, (argc, instruction)))
+    work.extend((arg, None) for arg in reversed(node.args))
+
+
+def _visit_name(node: ast.Name, work: list[_WorkItem], fragments: list[_Fragment]) -> None:
+    val = _MATH_FUNCTIONS.get(node.id)
+    if val is None or callable(val):
         raise ValueError(f"不支持的变量: {node.id}")
-    else:
-        raise ValueError(f"不支持的表达式类型: {type(node).__name__}")
+    fragments.append([(LOAD_CONST, float(val))])
+
+
+# 按节点类型精确分派（一次字典查找代替 isinstance 链）；未登记的类型一律不支持
+_VISITORS: dict[type[ast.AST], Callable[[Any, list[_WorkItem], list[_Fragment]], None]] = {
+    ast.Constant: _visit_constant,
+    ast.BinOp: _visit_binop,
+    ast.UnaryOp: _visit_unaryop,
+    ast.Call: _visit_call,
+    ast.Name: _visit_name,
+}
+
+
+def _fold(code: list[tuple[int, Any]]) -> list[tuple[int, Any]]:
+    """操作数全部是常量时在编译期求值；求值出错（如除以零）则保留原字节码，留到运行时报错。"""
+    if all(opcode == LOAD_CONST for opcode, _ in code[:-1]):
+        try:
+            return [(LOAD_CONST, _execute(code))]
+        except (ArithmeticError, ValueError, TypeError):
+            pass
+    return code
+
+
+def _execute(
+    code: Bytecode | list[tuple[int, Any]],
+    stack: list[float] | None = None,
+) -> float:
+    """栈式虚拟机：顺序执行后缀字节码，不递归、不做类型判断。
+
+    运算直接内联为 Python 运算符，按常见程度排列分支，省去每个运算符一次
+    operator.* 的函数调用。
+
+    Args:
+        code: 后缀字节码。
+        stack: 可复用的操作数栈，调用方需保证传入时为空；为 None 时新建。
+    """
+    if stack is None:
+        stack = []
+    push = stack.append
+    pop = stack.pop
+    for opcode, arg in code:
+        if opcode == LOAD_CONST:
+            push(arg)
+        elif opcode == ADD:
+            right = pop()
+            stack[-1] = stack[-1] + right
+        elif opcode == SUB:
+            right = pop()
+            stack[-1] = stack[-1] - right
+        elif opcode == MUL:
+            right = pop()
+            stack[-1] = stack[-1] * right
+        elif opcode == DIV:
+            right = pop()
+            stack[-1] = stack[-1] / right
+        elif opcode == CALL1:
+            stack[-1] = float(arg(stack[-1]))
+        elif opcode == CALL:
+            func, argc = arg
+            args = stack[len(stack) - argc:]
+            del stack[len(stack) - argc:]
+            push(float(func(*args)))
+        elif opcode == NEG:
+            stack[-1] = -stack[-1]
+        elif opcode == POW:
+            right = pop()
+            stack[-1] = stack[-1] ** right
+        elif opcode == FLOORDIV:
+            right = pop()
+            stack[-1] = stack[-1] // right
+        elif opcode == MOD:
+            right = pop()
+            stack[-1] = stack[-1] % right
+        else:  # POS
+            stack[-1] = +stack[-1]
+    return stack[0]
 
 
 class CalculatorTool(Tool):
     """安全的数学计算器工具。"""
 
+    idempotent = True
+
+    # 描述与参数 schema 是静态的，定义为类常量，属性访问时不再重复构造
+    _DESCRIPTION = (
+        "数学计算器，可以安全地计算数学表达式。"
+        "支持加减乘除、幂运算、取模，以及 sqrt、sin、cos、tan、log 等函数。"
+        "示例：'2 + 3 * 4'、'sqrt(16)'、'sin(pi/2)'"
+    )
+    _PARAMETERS: dict[str, Any] = {
+        "type": "object",
+        "properties": {
+            "expression": {
+                "type": "string",
+                "description": "要计算的数学表达式，例如 '2 + 3 * 4' 或 'sqrt(16)'",
+            }
+        },
+        "required": ["expression"],
+    }
+    _SCHEMA = openai_tool_schema("calculator", _DESCRIPTION, _PARAMETERS)
+
+    def __init__(self, cache_size: int = RESULT_CACHE_SIZE) -> None:
+        """
+        Args:
+            cache_size: 结果缓存的最大条数（LRU 淘汰），为 0 时不缓存。
+        """
+        # 表达式 → 格式化结果；只缓存成功的结果，错误信息含原始表达式，缓存它们没有意义
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+
     @property
     def name(self) -> str:
         return "calculator"
 
     @property
     def description(self) -> str:
-        return (
-            "数学计算器，可以安全地计算数学表达式。"
-            "支持加减乘除、幂运算、取模，以及 sqrt、sin、cos、tan、log 等函数。"
-            "示例：'2 + 3 * 4'、'sqrt(16)'、'sin(pi/2)'"
-        )
+        return self._DESCRIPTION
 
     @property
     def parameters(self) -> dict[str, Any]:
-        return {
-            "type": "object",
-            "properties": {
-                "expression": {
-                    "type": "string",
-                    "description": "要计算的数学表达式，例如 '2 + 3 * 4' 或 'sqrt(16)'",
-                }
-            },
-            "required": ["expression"],
-        }
-
-    def run(self, expression: str, **_: Any) -> str:
+        return self._PARAMETERS
+
+    def run(self, expression: str, values: dict[str, Any] | None = None, **_: Any) -> str:
+        """计算表达式。
+
+        Args:
+            expression: 数学表达式。
+            values: 可选的变量名 → 数组映射；提供时切换到向量模式，
+                    用 numexpr 对整个数组逐元素求值，结果按列表返回（不缓存）。
+        """
+        if values is not None:
+            return self._evaluate_vector(expression, values)
+        return self.run_many([expression])[0]
+
+    def run_many(self, expressions: list[str]) -> list[str]:
+        """按顺序批量计算多个表达式，返回与输入一一对应的结果。
+
+        Agent 循环里常常连续计算多个表达式，批量接口在整批之间复用同一个操作数栈，
+        并把热路径上的全局查找提前为局部变量。
+        """
+        evaluate = self._evaluate
+        lookup = self._lookup
+        remember = self._remember
+        stack: list[float] = []
+        results: list[str] = []
+        for expression in expressions:
+            result = lookup(expression)
+            if result is None:
+                stack.clear()
+                result = evaluate(expression, stack)
+                remember(expression, result)
+            results.append(result)
+        return results
+
+    def _lookup(self, expression: str) -> str | None:
+        """从结果缓存中取出表达式的结果，未命中时返回 None。"""
+        with self._cache_lock:
+            cached = self._cache.get(expression)
+            if cached is not None:
+                self._cache.move_to_end(expression)
+            return cached
+
+    def _remember(self, expression: str, result: str) -> None:
+        """缓存成功的计算结果，超出容量时淘汰最久未用的条目。"""
+        if self._cache_size <= 0 or result.startswith("错误："):
+            return
+        with self._cache_lock:
+            self._cache[expression] = result
+            self._cache.move_to_end(expression)
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    @staticmethod
+    def _evaluate_vector(expression: str, values: dict[str, Any]) -> str:
+        """向量模式：校验表达式后交给 numexpr 在数组上求值。
+
+        numexpr 自带的语法校验因版本而异，这里先按白名单检查 AST：
+        只允许算术运算、数值常量、values 中的变量以及 numexpr 支持的数学函数。
+        """
         try:
             tree = ast.parse(expression, mode="eval")
-            result = _safe_eval(tree)
-            if result == int(result):
+            for node in ast.walk(tree):
+                if not isinstance(node, _VECTOR_NODES):
+                    raise ValueError(f"不支持的表达式类型: {type(node).__name__}")
+                if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+                    raise ValueError(f"不支持的常量类型: {type(node.value)}")
+                if isinstance(node, ast.Call) and not (
+                    isinstance(node.func, ast.Name) and node.func.id in _VECTOR_FUNCTIONS
+                ):
+                    raise ValueError(f"不支持的函数: {ast.dump(node.func)}")
+                if (
+                    isinstance(node, ast.Name)
+                    and node.id not in values
+                    and node.id not in _VECTOR_FUNCTIONS
+                    and node.id not in ("pi", "e")
+                ):
+                    raise ValueError(f"不支持的变量: {node.id}")
+        except (ValueError, SyntaxError) as e:
+            return f"错误：无法计算表达式 '{expression}'：{e}"
+
+        try:
+            import numexpr
+        except ImportError:
+            return "错误：向量模式需要安装 numexpr（pip install numexpr）"
+
+        try:
+            result = numexpr.evaluate(
+                expression, local_dict={"pi": math.pi, "e": math.e, **values}
+            )
+        except ZeroDivisionError:
+            return "错误：除以零"
+        except (ValueError, TypeError, KeyError) as e:
+            return f"错误：无法计算表达式 '{expression}'：{e}"
+        return str(result.tolist())
+
+    @staticmethod
+    def _evaluate(expression: str, stack: list[float] | None = None) -> str:
+        """计算表达式并格式化结果，失败时返回错误信息。"""
+        for fragment in _BLOCKLIST:
+            if fragment in expression:
+                return f"错误：无法计算表达式 '{expression}'：包含不支持的内容 '{fragment}'"
+        try:
+            code = _compile_expression(expression)
+            # 能在编译期算完的表达式已折叠为单个常量，直接取值；只有折叠失败的字节码才交给虚拟机
+            if len(code) == 1 and code[0][0] == LOAD_CONST:
+                result = code[0][1]
+            else:
+                result = _execute(code, stack)
+            if not isinstance(result, float):
+                # 负数的分数次幂（如 (-8)**0.5）在 Python 中得到复数，计算器只支持实数
+                return f"错误：无法计算表达式 '{expression}'：结果不是实数"
+            if result.is_integer():
                 return str(int(result))
             return str(round(result, 10))
         except ZeroDivisionError:
             return "错误：除以零"
+        except RecursionError:
+            # 编译器本身不递归，但 ast.parse 对极深的嵌套仍有深度限制
+            return "错误：表达式嵌套过深"
         except (ValueError, TypeError, SyntaxError) as e:
             return f"错误：无法计算表达式 '{expression}'：{e}"
+
+
+# 共享的默认实例：工具无配置状态，结果缓存带锁，可在多个 registry / Agent 间复用
+CALCULATOR = CalculatorTool()
@@ -7,9 +7,11 @@
 from __future__ import annotations
 
 import os
+import re
+from functools import lru_cache
 from typing import Any
 
-from src.tools.base import Tool
+from src.tools.base import Tool, openai_tool_schema
 from src.tools.mcp_client import MCPStdioClient
 
 # 模拟搜索结果
@@ -28,10 +30,78 @@ _MOCK_RESULTS: dict[str, list[dict[str, str]]] = {
     ],
 }
 
+# 小写关键词 -> (优先级, 结果)；优先级即 _MOCK_RESULTS 中的声明顺序
+_MOCK_LOWER: dict[str, tuple[int, list[dict[str, str]]]] = {
+    keyword.lower(): (priority, results)
+    for priority, (keyword, results) in enumerate(_MOCK_RESULTS.items())
+}
+
+# 结果是静态数据，导入时就把每个关键词的结果块格式化好，run 只需拼上首行
+_PREFORMATTED: dict[str, str] = {
+    keyword: "\n".join(
+        f"  {i}. [{result['title']}]({result['url']})\n     {result['snippet']}"
+        for i, result in enumerate(results, 1)
+    )
+    for keyword, (_, results) in _MOCK_LOWER.items()
+}
+
+# 按声明顺序排列的小写关键词，逐个查找时第一个命中即为优先级最高的结果
+_LOWERED_KEYWORDS: tuple[str, ...] = tuple(_MOCK_LOWER)
+
+# 无自动机时的退路：所有关键词编译为一个按声明顺序排列的正则分支，由 re 在 C 层一次扫描。
+# 用零宽先行断言包住分支，finditer 会在每个起点报告该处优先级最高的关键词，
+# 重叠的命中也不会被更靠左的匹配吞掉。
+_KEYWORD_RE = re.compile(
+    "(?=(" + "|".join(re.escape(keyword) for keyword in _LOWERED_KEYWORDS) + "))"
+)
+
+
+@lru_cache(maxsize=1)
+def _keyword_automaton() -> Any:
+    """惰性构建关键词的 Aho-Corasick 自动机；未安装 pyahocorasick 时返回 None。"""
+    try:
+        import ahocorasick
+    except ImportError:
+        return None
+
+    automaton = ahocorasick.Automaton()
+    for keyword in _LOWERED_KEYWORDS:
+        automaton.add_word(keyword, keyword)
+    automaton.make_automaton()
+    return automaton
+
+
+def _match_keyword(query_lower: str) -> str | None:
+    """返回 query 中命中的关键词；多个命中时取声明顺序最靠前的一个。
+
+    有自动机时一次扫描 query 即可找出全部命中（O(|query|)），
+    否则退化为关键词正则分支的一次扫描。
+    """
+    automaton = _keyword_automaton()
+    if automaton is None:
+        hits = (match.group(1) for match in _KEYWORD_RE.finditer(query_lower))
+    else:
+        hits = (keyword for _, keyword in automaton.iter(query_lower))
+    return min(hits, key=lambda keyword: _MOCK_LOWER[keyword][0], default=None)
+
 
 class SearchTool(Tool):
     """网页搜索工具，支持 mock 与 MCP 两种后端。"""
 
+    # 描述与参数 schema 是静态的，定义为类常量，属性访问时不再重复构造
+    _DESCRIPTION = "搜索互联网获取相关信息。当你需要查找最新资讯、事实性知识或不确定的信息时使用。"
+    _PARAMETERS: dict[str, Any] = {
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "搜索关键词",
+            }
+        },
+        "required": ["query"],
+    }
+    _SCHEMA = openai_tool_schema("search", _DESCRIPTION, _PARAMETERS)
+
     def __init__(
         self,
         *,
@@ -83,20 +153,11 @@ class SearchTool(Tool):
 
     @property
     def description(self) -> str:
-        return "搜索互联网获取相关信息。当你需要查找最新资讯、事实性知识或不确定的信息时使用。"
+        return self._DESCRIPTION
 
     @property
     def parameters(self) -> dict[str, Any]:
-        return {
-            "type": "object",
-            "properties": {
-                "query": {
-                    "type": "string",
-                    "description": "搜索关键词",
-                }
-            },
-            "required": ["query"],
-        }
+        return self._PARAMETERS
 
     def backend_label(self) -> str:
         if self.backend == "mock":
@@ -136,14 +197,9 @@ class SearchTool(Tool):
 
     @staticmethod
     def _run_mock(query: str) -> str:
-        query_lower = query.lower()
-        for keyword, results in _MOCK_RESULTS.items():
-            if keyword in query_lower:
-                lines = [f"搜索 '{query}' 的结果："]
-                for i, result in enumerate(results, 1):
-                    lines.append(f"  {i}. [{result['title']}]({result['url']})")
-                    lines.append(f"     {result['snippet']}")
-                return "\n".join(lines)
+        keyword = _match_keyword(query.lower())
+        if keyword is not None:
+            return f"搜索 '{query}' 的结果：\n{_PREFORMATTED[keyword]}"
 
         return (
             f"搜索 '{query}' 的结果：\n"
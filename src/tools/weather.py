@@ -9,7 +9,7 @@ from __future__ import annotations
 import random
 from typing import Any
 
-from src.tools.base import Tool
+from src.tools.base import Tool, openai_tool_schema
 
 # 模拟天气数据
 _MOCK_WEATHER: dict[str, dict[str, Any]] = {
@@ -26,50 +26,77 @@ _MOCK_WEATHER: dict[str, dict[str, Any]] = {
 }
 
 
+def _format_weather(city: str, data: dict[str, Any]) -> str:
+    """把一条天气数据格式化为工具返回的文本。"""
+    return (
+        f"{city}天气：{data['weather']}，"
+        f"温度 {data['temp']}°C，"
+        f"湿度 {data['humidity']}%，"
+        f"风力 {data['wind']}"
+    )
+
+
+# 预设城市的数据是静态的，导入时一次性格式化，查询时只剩一次字典查找
+_WEATHER_FORMATTED: dict[str, str] = {
+    city: _format_weather(city, data) for city, data in _MOCK_WEATHER.items()
+}
+
+
+# 未预设城市的随机数据来源；独立的 Random 实例省去每次对 random 模块全局实例的查找
+_RNG = random.Random()
+_WEATHERS = ("晴", "多云", "阴", "小雨", "大雨", "雪")
+_WINDS = ("微风", "北风2级", "东风3级", "南风2级", "西北风3级")
+
+
+def _random_format(city: str) -> str:
+    """为未预设的城市随机生成一条天气数据。"""
+    rng = _RNG
+    data = {
+        "temp": rng.randint(-5, 38),
+        "weather": rng.choice(_WEATHERS),
+        "humidity": rng.randint(20, 95),
+        "wind": rng.choice(_WINDS),
+    }
+    return _format_weather(city, data)
+
+
 class WeatherTool(Tool):
     """天气查询工具（Mock 数据）。"""
 
+    idempotent = True
+
+    # 描述与参数 schema 是静态的，定义为类常量，属性访问时不再重复构造
+    _DESCRIPTION = (
+        "查询指定城市的当前天气信息，包括温度、天气状况、湿度和风力。"
+        "支持中国主要城市的天气查询。"
+    )
+    _PARAMETERS: dict[str, Any] = {
+        "type": "object",
+        "properties": {
+            "city": {
+                "type": "string",
+                "description": "要查询天气的城市名称，例如 '北京'、'上海'",
+            }
+        },
+        "required": ["city"],
+    }
+    _SCHEMA = openai_tool_schema("weather", _DESCRIPTION, _PARAMETERS)
+
     @property
     def name(self) -> str:
         return "weather"
 
     @property
     def description(self) -> str:
-        return (
-            "查询指定城市的当前天气信息，包括温度、天气状况、湿度和风力。"
-            "支持中国主要城市的天气查询。"
-        )
+        return self._DESCRIPTION
 
     @property
     def parameters(self) -> dict[str, Any]:
-        return {
-            "type": "object",
-            "properties": {
-                "city": {
-                    "type": "string",
-                    "description": "要查询天气的城市名称，例如 '北京'、'上海'",
-                }
-            },
-            "required": ["city"],
-        }
+        return self._PARAMETERS
 
     def run(self, city: str, **_: Any) -> str:
-        data = _MOCK_WEATHER.get(city)
-
-        if data is None:
-            # 对于未预设的城市，随机生成数据
-            weathers = ["晴", "多云", "阴", "小雨", "大雨", "雪"]
-            winds = ["微风", "北风2级", "东风3级", "南风2级", "西北风3级"]
-            data = {
-                "temp": random.randint(-5, 38),
-                "weather": random.choice(weathers),
-                "humidity": random.randint(20, 95),
-                "wind": random.choice(winds),
-            }
+        return _WEATHER_FORMATTED.get(city) or _random_format(city)
+
 
-        return (
-            f"{city}天气：{data['weather']}，"
-            f"温度 {data['temp']}°C，"
-            f"湿度 {data['humidity']}%，"
-            f"风力 {data['wind']}"
-        )
+# 共享的默认实例：WeatherTool 无实例状态，可在多个 registry / Agent 间复用
+WEATHER = WeatherTool()
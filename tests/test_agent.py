@@ -4,11 +4,15 @@
 集成测试需要配置 API Key 后运行 examples/ 中的示例。
 """
 
+import asyncio
+import io
 import os
 import sys
 import tempfile
+import threading
 import types
 import unittest
+from contextlib import redirect_stdout
 from pathlib import Path
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -38,8 +42,9 @@ if "openai" not in sys.modules:
     sys.modules["openai.types.chat"] = chat_module
 
 from src.agent import ReActAgent, SUPPORTED_MODES
-from src.memory.history import ConversationHistory
-from src.tools.base import ToolRegistry
+from src.agent.state import AgentRunResult
+from src.memory.history import ConversationHistory, build_llm_summarizer
+from src.tools.base import Tool, ToolRegistry
 from src.tools.calculator import CalculatorTool
 from src.tools.read_local_file import ReadLocalFileTool
 from src.tools.search import SearchTool
@@ -74,12 +79,21 @@ class _FakeToolCall:
         self.function = _FakeToolFunction(name, arguments)
 
 
+def _stream_tool_delta(index, tool_id=None, name=None, arguments=None):
+    return types.SimpleNamespace(
+        index=index,
+        id=tool_id,
+        function=types.SimpleNamespace(name=name, arguments=arguments),
+    )
+
+
 class FakeLLM:
     """用于测试 Agent 的轻量级 LLM 替身。"""
 
-    def __init__(self, *, simple_responses=None, chat_responses=None):
+    def __init__(self, *, simple_responses=None, chat_responses=None, stream_responses=None):
         self.simple_responses = list(simple_responses or [])
         self.chat_responses = list(chat_responses or [])
+        self.stream_responses = list(stream_responses or [])
         self.simple_calls: list[tuple[str, str]] = []
         self.chat_calls: list[dict] = []
 
@@ -97,11 +111,49 @@ class FakeLLM:
             return response
         return _FakeResponse(content=response)
 
+    async def achat(self, messages, tools=None, temperature=0.7, max_tokens=2048):
+        return self.chat(messages, tools=tools, temperature=temperature, max_tokens=max_tokens)
+
+    def chat_stream(self, messages, tools=None, temperature=0.7, max_tokens=2048):
+        self.chat_calls.append(
+            {
+                "messages": list(messages),
+                "tools": tools,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+            }
+        )
+        chunks = self.stream_responses.pop(0) if self.stream_responses else []
+        yield from chunks
+
     def chat_simple(self, prompt: str, system: str = "") -> str:
         self.simple_calls.append((prompt, system))
         return self.simple_responses.pop(0) if self.simple_responses else ""
 
 
+class _BarrierTool(Tool):
+    """只有两个调用同时到达时才能返回的工具，用于验证并发执行。"""
+
+    def __init__(self):
+        self.barrier = threading.Barrier(2, timeout=2)
+
+    @property
+    def name(self) -> str:
+        return "barrier"
+
+    @property
+    def description(self) -> str:
+        return "barrier"
+
+    @property
+    def parameters(self) -> dict:
+        return {"type": "object", "properties": {"tag": {"type": "string"}}}
+
+    def run(self, tag: str = "", **_) -> str:
+        self.barrier.wait()
+        return f"done:{tag}"
+
+
 class TestConversationHistory(unittest.TestCase):
     def setUp(self):
         self.history = ConversationHistory(max_turns=3)
@@ -135,6 +187,81 @@ class TestConversationHistory(unittest.TestCase):
         self.history.clear()
         self.assertEqual(len(self.history), 0)
 
+    def test_pinned_turns_and_buffer_keep_prefix_stable(self):
+        history = ConversationHistory(max_turns=3, pinned_turns=1, buffer_turns=2)
+        for i in range(5):
+            history.add_user_message(f"问题{i}")
+            history.add_assistant_message(f"回答{i}")
+
+        # 5 轮未超过 max_turns + buffer_turns，不截断
+        self.assertEqual(history.turn_count, 5)
+
+        history.add_user_message("问题5")
+        history.add_assistant_message("回答5")
+
+        contents = [m["content"] for m in history.get_messages()]
+        self.assertEqual(contents, ["问题0", "回答0", "问题4", "回答4", "问题5", "回答5"])
+
+    def test_summarizer_replaces_evicted_middle(self):
+        evicted_batches = []
+
+        def summarizer(messages):
+            evicted_batches.append([m["content"] for m in messages])
+            return f"共 {len(messages)} 条"
+
+        history = ConversationHistory(max_turns=2, pinned_turns=1, summarizer=summarizer)
+        for i in range(4):
+            history.add_user_message(f"问题{i}")
+            history.add_assistant_message(f"回答{i}")
+
+        messages = history.get_messages()
+        self.assertEqual(messages[0]["content"], "问题0")
+        self.assertEqual(messages[2]["role"], "system")
+        self.assertIn("[早前对话摘要]", messages[2]["content"])
+        self.assertEqual(messages[-1]["content"], "回答3")
+        self.assertEqual(history.turn_count, 2)
+        # 第二次截断时，上一版摘要会一并交给 summarizer
+        self.assertEqual(len(evicted_batches), 2)
+        self.assertIn("[早前对话摘要]: 共 2 条", evicted_batches[-1])
+
+    def test_llm_summarizer_condenses_with_single_call_per_eviction(self):
+        fake_llm = FakeLLM(simple_responses=["用户问过北京天气：晴，12°C。"])
+        history = ConversationHistory(max_turns=1, summarizer=build_llm_summarizer(fake_llm))
+        history.add_user_message("北京天气？")
+        history.add_assistant_message("晴，12°C。")
+        history.add_user_message("上海呢？")
+        history.add_assistant_message("多云，18°C。")
+
+        self.assertEqual(len(fake_llm.simple_calls), 1)
+        prompt, system = fake_llm.simple_calls[0]
+        self.assertIn("user: 北京天气？", prompt)
+        self.assertIn("摘要", system)
+        messages = history.get_messages()
+        self.assertEqual(messages[0]["content"], "[早前对话摘要]: 用户问过北京天气：晴，12°C。")
+        self.assertEqual(messages[-1]["content"], "多云，18°C。")
+
+    def test_max_tokens_evicts_oversized_turns_but_keeps_latest(self):
+        history = ConversationHistory(max_turns=10, max_tokens=300, reserve_tokens=100)
+        history.add_user_message("搜索一下长文档")
+        history.add_assistant_message("x" * 3000)
+        # 最新一轮即使超出预算也保留
+        self.assertEqual(len(history), 2)
+
+        history.add_user_message("总结一下")
+        history.add_assistant_message("好的")
+        self.assertEqual(
+            [message["content"] for message in history.get_messages()],
+            ["总结一下", "好的"],
+        )
+        self.assertEqual(history._total_tokens, sum(history._token_counts))
+
+    def test_iter_messages_yields_history_without_copy(self):
+        self.history.add_user_message("问题")
+        self.history.add_assistant_message("回答")
+        messages = self.history.get_messages()
+        self.assertEqual(list(self.history.iter_messages()), messages)
+        self.assertIs(next(self.history.iter_messages()), messages[0])
+
     def test_immutable_get(self):
         self.history.add_user_message("测试")
         messages = self.history.get_messages()
@@ -180,6 +307,15 @@ class TestReActAgentModes(unittest.TestCase):
         self.assertEqual(ReActAgent.available_modes(), SUPPORTED_MODES)
         self.assertIn("plan_and_execute", SUPPORTED_MODES)
 
+    def test_run_with_trace_dispatches_to_overridden_mode_runner(self):
+        class TracingAgent(ReActAgent):
+            def _run_text_parsing(self, query):
+                return AgentRunResult(final_answer=f"text:{query}")
+
+        agent = TracingAgent(llm=FakeLLM(), tool_registry=self.registry, mode="text_parsing", verbose=False)
+
+        self.assertEqual(agent.run("问题"), "text:问题")
+
     def test_invalid_mode_raises_error(self):
         agent = ReActAgent(
             llm=FakeLLM(),
@@ -217,6 +353,279 @@ class TestReActAgentModes(unittest.TestCase):
         self.assertIn('"expression": "2+3"', result.tool_traces[0].tool_input)
         self.assertIn("5", result.tool_traces[0].observation)
 
+    def test_function_calling_streaming_aggregates_tool_call_deltas(self):
+        fake_llm = FakeLLM(
+            stream_responses=[
+                [
+                    ("", [_stream_tool_delta(0, "call_1", "calculator", '{"expr')], None),
+                    ("", [_stream_tool_delta(0, arguments='ession": "6*7"}')], None),
+                    ("", [], "tool_calls"),
+                ],
+                [
+                    ("答案", [], None),
+                    ("是 42。", [], "stop"),
+                ],
+            ]
+        )
+        agent = ReActAgent(
+            llm=fake_llm,
+            tool_registry=self.registry,
+            mode="function_calling",
+            verbose=False,
+            stream=True,
+        )
+
+        result = agent.run_with_trace("请计算 6*7")
+
+        self.assertEqual(result.final_answer, "答案是 42。")
+        self.assertEqual(len(result.tool_traces), 1)
+        self.assertEqual(result.tool_traces[0].tool_input, '{"expression": "6*7"}')
+        self.assertEqual(result.tool_traces[0].observation, "42")
+        assistant_msg = fake_llm.chat_calls[1]["messages"][-2]
+        self.assertEqual(assistant_msg["tool_calls"][0]["id"], "call_1")
+
+    def test_function_calling_streaming_forwards_content_deltas_to_on_chunk(self):
+        chunks = []
+        fake_llm = FakeLLM(
+            stream_responses=[
+                [
+                    ("先查一下", [], None),
+                    ("", [_stream_tool_delta(0, "call_1", "calculator", '{"expression": "6*7"}')], None),
+                    ("。", [], "tool_calls"),
+                ],
+                [("答案", [], None), ("是 42。", [], "stop")],
+            ]
+        )
+        agent = ReActAgent(
+            llm=fake_llm,
+            tool_registry=self.registry,
+            verbose=False,
+            stream=True,
+            on_chunk=chunks.append,
+        )
+
+        agent.run("请计算 6*7")
+
+        self.assertEqual(chunks, ["先查一下", "答案", "是 42。"])
+
+    def test_function_calling_streaming_dispatches_tools_before_stream_ends(self):
+        calculator = CalculatorTool()
+        started = threading.Event()
+        original_run = calculator.run
+
+        def tracked_run(**kwargs):
+            started.set()
+            return original_run(**kwargs)
+
+        calculator.run = tracked_run
+        registry = ToolRegistry()
+        registry.register(calculator)
+        observed_during_stream = []
+
+        def first_step():
+            yield "", [_stream_tool_delta(0, "call_1", "calculator", '{"expression": "6*7"}')], None
+            # 第一个调用的参数已完整，应在流结束前开始执行
+            observed_during_stream.append(started.wait(timeout=2))
+            yield "", [_stream_tool_delta(1, "call_2", "calculator", '{"expression": "1+1"}')], None
+            yield "", [], "tool_calls"
+
+        fake_llm = FakeLLM(stream_responses=[first_step(), [("完成", [], "stop")]])
+        agent = ReActAgent(llm=fake_llm, tool_registry=registry, verbose=False, stream=True)
+
+        result = agent.run_with_trace("计算两个表达式")
+
+        self.assertEqual(observed_during_stream, [True])
+        self.assertEqual([trace.observation for trace in result.tool_traces], ["42", "2"])
+        self.assertEqual(result.final_answer, "完成")
+
+    def test_function_calling_deduplicates_tool_calls_within_and_across_steps(self):
+        weather = WeatherTool()
+        executed = []
+        original_run = weather.run
+
+        def counting_run(**kwargs):
+            executed.append(kwargs)
+            return original_run(**kwargs)
+
+        weather.run = counting_run
+        registry = ToolRegistry()
+        registry.register(weather)
+        fake_llm = FakeLLM(
+            chat_responses=[
+                _FakeResponse(tool_calls=[
+                    _FakeToolCall("call_1", "weather", '{"city": "北京"}'),
+                    _FakeToolCall("call_2", "weather", '{ "city":"北京" }'),
+                ]),
+                _FakeResponse(tool_calls=[_FakeToolCall("call_3", "weather", '{"city": "北京"}')]),
+                _FakeResponse(content="北京晴"),
+            ]
+        )
+        agent = ReActAgent(llm=fake_llm, tool_registry=registry, verbose=False)
+
+        result = agent.run_with_trace("北京天气")
+
+        self.assertEqual(len(executed), 1)
+        self.assertEqual(len(result.tool_traces), 3)
+        self.assertEqual(len({trace.observation for trace in result.tool_traces}), 1)
+        tool_ids = [m["tool_call_id"] for m in fake_llm.chat_calls[-1]["messages"] if m["role"] == "tool"]
+        self.assertEqual(tool_ids, ["call_1", "call_2", "call_3"])
+
+    def test_function_calling_eager_finish_stops_reading_long_answer(self):
+        closed = []
+
+        def narrative():
+            try:
+                yield "第一句话已经足够。", [], None
+                yield "后面的长尾内容", [], None
+                yield "。", [], "stop"
+            finally:
+                closed.append(True)
+
+        fake_llm = FakeLLM(stream_responses=[narrative()])
+        agent = ReActAgent(
+            llm=fake_llm,
+            tool_registry=self.registry,
+            verbose=False,
+            stream=True,
+            eager_finish=True,
+            eager_finish_chars=5,
+        )
+
+        self.assertEqual(agent.run("讲讲"), "第一句话已经足够。")
+        self.assertEqual(closed, [True])
+
+    def test_function_calling_executes_parallel_tool_calls_concurrently(self):
+        registry = ToolRegistry()
+        registry.register(_BarrierTool())
+        fake_llm = FakeLLM(
+            chat_responses=[
+                _FakeResponse(tool_calls=[
+                    _FakeToolCall("call_a", "barrier", '{"tag": "a"}'),
+                    _FakeToolCall("call_b", "barrier", '{"tag": "b"}'),
+                ]),
+                _FakeResponse(content="完成"),
+            ]
+        )
+        agent = ReActAgent(llm=fake_llm, tool_registry=registry, verbose=False)
+
+        result = agent.run_with_trace("并行执行")
+
+        self.assertEqual(
+            [trace.observation for trace in result.tool_traces],
+            ["done:a", "done:b"],
+        )
+        tool_messages = [m for m in fake_llm.chat_calls[1]["messages"] if m["role"] == "tool"]
+        self.assertEqual([m["tool_call_id"] for m in tool_messages], ["call_a", "call_b"])
+
+    def test_arun_uses_async_chat_and_runs_tools_concurrently(self):
+        registry = ToolRegistry()
+        registry.register(_BarrierTool())
+        fake_llm = FakeLLM(
+            chat_responses=[
+                _FakeResponse(tool_calls=[
+                    _FakeToolCall("call_a", "barrier", '{"tag": "a"}'),
+                    _FakeToolCall("call_b", "barrier", '{"tag": "b"}'),
+                ]),
+                _FakeResponse(content="完成"),
+            ]
+        )
+        agent = ReActAgent(llm=fake_llm, tool_registry=registry, verbose=False)
+
+        result = asyncio.run(agent.arun_with_trace("并行执行"))
+
+        self.assertEqual(result.final_answer, "完成")
+        self.assertEqual(
+            [trace.observation for trace in result.tool_traces],
+            ["done:a", "done:b"],
+        )
+        self.assertEqual(agent.history.turn_count, 1)
+
+    def test_run_many_answers_independent_queries_with_isolated_history(self):
+        fake_llm = FakeLLM(chat_responses=["答案一", "答案二"])
+        agent = ReActAgent(llm=fake_llm, tool_registry=self.registry, verbose=False)
+
+        results = agent.run_many(["问题一", "问题二"])
+
+        self.assertEqual(sorted(results), ["答案一", "答案二"])
+        self.assertEqual(agent.history.turn_count, 0)
+        for call in fake_llm.chat_calls:
+            self.assertEqual(len([m for m in call["messages"] if m["role"] == "user"]), 1)
+
+    def test_log_formats_lazily_only_when_verbose(self):
+        class _Unprintable:
+            def __str__(self):
+                raise AssertionError("verbose 关闭时不应格式化参数")
+
+        quiet = ReActAgent(llm=FakeLLM(), tool_registry=self.registry, verbose=False)
+        quiet._log("  Observation: %s", _Unprintable())
+
+        loud = ReActAgent(llm=FakeLLM(), tool_registry=self.registry, verbose=True)
+        buffer = io.StringIO()
+        with redirect_stdout(buffer):
+            loud._log("  Action: %s\n  Action Input: %s", "calculator", "{}")
+            loud._log("100% 完成")
+        self.assertEqual(buffer.getvalue(), "  Action: calculator\n  Action Input: {}\n100% 完成\n")
+
+    def test_function_calling_without_tools_sends_short_prompt_and_no_tools(self):
+        fake_llm = FakeLLM(chat_responses=["直接回答"])
+        agent = ReActAgent(llm=fake_llm, tool_registry=ToolRegistry(), verbose=False)
+
+        self.assertEqual(agent.run("你好"), "直接回答")
+        call = fake_llm.chat_calls[0]
+        self.assertIsNone(call["tools"])
+        self.assertNotIn("工具", call["messages"][0]["content"].split("<skill_system>")[0])
+
+    def test_text_parsing_extracts_nested_action_input(self):
+        text = 'Thought: 查询\nAction: search\nAction Input: {"query": "北京", "filters": {"lang": "zh"}}\n'
+        self.assertEqual(
+            ReActAgent._extract_action_input(text),
+            '{"query": "北京", "filters": {"lang": "zh"}}',
+        )
+        # 非法 JSON 时回退到正则
+        self.assertEqual(ReActAgent._extract_action_input("Action Input: {bad}"), "{bad}")
+        self.assertEqual(ReActAgent._extract_action_input("Action: search"), "{}")
+
+    def test_text_parsing_clips_observations_and_condenses_earlier_steps(self):
+        fake_llm = FakeLLM(
+            simple_responses=["已算出 1+2=3"],
+            chat_responses=[
+                'Thought: 先算\nAction: calculator\nAction Input: {"expression": "1+2"}',
+                'Thought: 再算\nAction: calculator\nAction Input: {"expression": "2**40"}',
+                "Thought: 完成\nFinal Answer: 好了",
+            ],
+        )
+        agent = ReActAgent(
+            llm=fake_llm,
+            tool_registry=self.registry,
+            mode="text_parsing",
+            verbose=False,
+            max_obs_chars=5,
+            max_context_chars=1,
+        )
+
+        result = agent.run_with_trace("算两次")
+
+        self.assertEqual(result.final_answer, "好了")
+        self.assertEqual(result.tool_traces[1].observation, "1099511627776")
+        self.assertEqual(len(fake_llm.simple_calls), 1)
+        self.assertIn("Observation: 3", fake_llm.simple_calls[0][0])
+        final_messages = fake_llm.chat_calls[-1]["messages"]
+        self.assertEqual(final_messages[2]["content"], "[早前步骤摘要]: 已算出 1+2=3")
+        self.assertIn("10995\n…[已截断 8 字符]", final_messages[4]["content"])
+
+    def test_system_prompt_is_composed_once_and_reused(self):
+        registry = ToolRegistry()
+        registry.register(ReadLocalFileTool())
+        fake_llm = FakeLLM(chat_responses=["一", "二"])
+        agent = ReActAgent(llm=fake_llm, tool_registry=registry, verbose=False)
+
+        agent.run("第一次")
+        agent.reset()
+        agent.run("第二次")
+
+        first, second = (call["messages"][0]["content"] for call in fake_llm.chat_calls)
+        self.assertIs(first, second)
+
     def test_plan_and_execute_runs_planner_executor_summarizer_and_verifier(self):
         fake_llm = FakeLLM(
             simple_responses=[
@@ -1,19 +1,36 @@
 """LLMClient 单元测试。"""
 
+import asyncio
 import importlib
+import importlib.util
 import os
 import sys
+import threading
 import types
 import unittest
+from unittest import mock
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, PROJECT_ROOT)
 
 
+class DummyAsyncOpenAI:
+    def __init__(self, api_key, base_url, **kwargs):
+        self.calls = []
+
+        async def create(**kwargs):
+            self.calls.append(kwargs)
+            message = types.SimpleNamespace(content=f"回复：{kwargs['messages'][-1]['content']}")
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=create))
+
+
 class DummyOpenAI:
-    def __init__(self, api_key, base_url):
+    def __init__(self, api_key, base_url, **kwargs):
         self.api_key = api_key
         self.base_url = base_url
+        self.options = kwargs
         self.chat = types.SimpleNamespace(
             completions=types.SimpleNamespace(create=lambda **kwargs: kwargs)
         )
@@ -26,6 +43,7 @@ def _install_fake_dependencies() -> None:
 
     openai_module = types.ModuleType("openai")
     openai_module.OpenAI = DummyOpenAI
+    openai_module.AsyncOpenAI = DummyAsyncOpenAI
     sys.modules["openai"] = openai_module
     sys.modules["openai.types"] = types.ModuleType("openai.types")
 
@@ -81,6 +99,212 @@ class TestLLMClientDefaults(unittest.TestCase):
         self.assertEqual(client.base_url, "https://example.com/v1")
         self.assertEqual(client.model, "custom-model")
 
+    def test_client_retries_transient_errors_by_default(self):
+        client = self.llm_module.LLMClient(api_key="custom-key")
+
+        self.assertEqual(client.client.options["max_retries"], 2)
+        client.close()
+
+    def test_cache_short_circuits_deterministic_requests(self):
+        cache: dict = {}
+        client = self.llm_module.LLMClient(api_key="custom-key", cache=cache)
+        calls = []
+
+        def create(**kwargs):
+            calls.append(kwargs)
+            tool_calls = [object()] if kwargs.get("tools") else None
+            message = types.SimpleNamespace(content="答案", tool_calls=tool_calls)
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+        client.client.chat.completions.create = create
+        messages = [{"role": "user", "content": "1+1=?"}]
+
+        first = client.chat(messages, temperature=0)
+        second = client.chat(list(messages), temperature=0)
+        client.chat(messages)  # 非零温度不走缓存
+        client.chat(messages, tools=[{"type": "function"}], temperature=0)
+        client.chat(messages, tools=[{"type": "function"}], temperature=0)
+
+        self.assertIs(first, second)
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(len(cache), 1)
+
+    def test_single_flight_locks_are_released_after_use(self):
+        client = self.llm_module.LLMClient(api_key="custom-key", cache={})
+        calls = []
+
+        def create(**kwargs):
+            calls.append(kwargs)
+            threading.Event().wait(0.05)
+            message = types.SimpleNamespace(content="答案", tool_calls=None)
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+        client.client.chat.completions.create = create
+        messages = [{"role": "user", "content": "1+1=?"}]
+        threads = [
+            threading.Thread(target=client.chat, args=(messages,), kwargs={"temperature": 0})
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        client.chat([{"role": "user", "content": "2+2=?"}], temperature=0)
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(client._cache_locks, {})
+
+    def test_achat_shares_cache_and_single_flight(self):
+        cache: dict = {}
+        client = self.llm_module.LLMClient(api_key="custom-key", cache=cache)
+        calls = []
+
+        async def create(**kwargs):
+            calls.append(kwargs)
+            await asyncio.sleep(0.01)
+            message = types.SimpleNamespace(content="答案", tool_calls=None)
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+        messages = [{"role": "user", "content": "1+1=?"}]
+
+        async def ask_concurrently():
+            client.async_client.chat.completions.create = create
+            return await asyncio.gather(*(client.achat(messages, temperature=0) for _ in range(4)))
+
+        responses = asyncio.run(ask_concurrently())
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(response is responses[0] for response in responses))
+        self.assertIs(client.chat(messages, temperature=0), responses[0])
+        self.assertEqual(client._async_cache_locks, {})
+
+    def test_chat_stream_closes_stream_after_finish_reason(self):
+        client = self.llm_module.LLMClient(api_key="custom-key")
+
+        def chunk(content, finish_reason=None):
+            delta = types.SimpleNamespace(content=content, tool_calls=None)
+            choice = types.SimpleNamespace(delta=delta, finish_reason=finish_reason)
+            return types.SimpleNamespace(choices=[choice])
+
+        class FakeStream:
+            closed = False
+
+            def __iter__(self):
+                yield chunk("你好")
+                yield chunk("", "stop")
+                raise AssertionError("finish_reason 之后不应继续读取")
+
+            def close(self):
+                self.closed = True
+
+        stream = FakeStream()
+        client.client.chat.completions.create = lambda **kwargs: stream
+
+        chunks = list(client.chat_stream([{"role": "user", "content": "hi"}]))
+
+        self.assertEqual([c[0] for c in chunks], ["你好", ""])
+        self.assertTrue(stream.closed)
+
+    def test_cache_control_marks_system_prompt_only_when_enabled(self):
+        messages = [
+            {"role": "system", "content": "你是研究员。"},
+            {"role": "user", "content": "任务"},
+        ]
+        plain = self.llm_module.LLMClient(api_key="custom-key")
+        marked = self.llm_module.LLMClient(api_key="custom-key", cache_control=True)
+
+        self.assertIs(plain.chat(messages)["messages"], messages)
+        sent = marked.chat(messages)["messages"]
+        self.assertEqual(
+            sent[0]["content"],
+            [{"type": "text", "text": "你是研究员。", "cache_control": {"type": "ephemeral"}}],
+        )
+        self.assertEqual(messages[0]["content"], "你是研究员。")
+        self.assertIs(sent[1], messages[1])
+
+    def test_achat_simple_uses_async_client(self):
+        client = self.llm_module.LLMClient(api_key="custom-key")
+
+        async def ask():
+            reply = await client.achat_simple("你好", system="简短回答")
+            return reply, client.async_client
+
+        reply, async_client = asyncio.run(ask())
+
+        self.assertEqual(reply, "回复：你好")
+        sent = async_client.calls[0]["messages"]
+        self.assertEqual([m["role"] for m in sent], ["system", "user"])
+
+    def test_async_client_is_built_per_event_loop(self):
+        client = self.llm_module.LLMClient(api_key="custom-key")
+
+        async def current_client():
+            first = client.async_client
+            await client.achat_simple("你好")
+            self.assertIs(client.async_client, first)
+            return first
+
+        first = asyncio.run(current_client())
+        second = asyncio.run(current_client())
+
+        self.assertIsNot(first, second)
+        self.assertEqual(len(first.calls), 1)
+        self.assertEqual(len(second.calls), 1)
+
+    def test_async_pool_is_closed_when_its_event_loop_finishes(self):
+        pools = []
+
+        class FakeAsyncPool:
+            closed = False
+
+            async def aclose(self):
+                self.closed = True
+
+        def build_http_client(asynchronous=False):
+            if not asynchronous:
+                return None
+            pools.append(FakeAsyncPool())
+            return pools[-1]
+
+        with mock.patch.object(self.llm_module, "_build_http_client", build_http_client):
+            client = self.llm_module.LLMClient(api_key="custom-key")
+
+            async def ask():
+                return await client.achat_simple("你好")
+
+            asyncio.run(ask())
+            asyncio.run(ask())
+
+            async def ask_and_close():
+                await ask()
+                await client.aclose()
+                return client._async_clients.get(asyncio.get_running_loop())
+
+            self.assertIsNone(asyncio.run(ask_and_close()))
+
+        self.assertEqual(len(pools), 3)
+        self.assertTrue(all(pool.closed for pool in pools))
+
+    @unittest.skipIf(importlib.util.find_spec("httpx") is None, "需要安装 httpx")
+    def test_real_httpx_async_pool_is_closed_with_its_event_loop(self):
+        client = self.llm_module.LLMClient(api_key="custom-key")
+
+        async def current_pool():
+            client.async_client
+            return client._async_clients[asyncio.get_running_loop()][1]
+
+        pools = [asyncio.run(current_pool()), asyncio.run(current_pool())]
+
+        self.assertIsNot(pools[0], pools[1])
+        self.assertTrue(all(pool.is_closed for pool in pools))
+        client.close()
+
+    def test_close_is_idempotent(self):
+        with self.llm_module.LLMClient(api_key="custom-key") as client:
+            pass
+        client.close()
+        self.assertIsNone(client._http)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -9,10 +9,17 @@ import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import asyncio
+import io
+import threading
 import unittest
+from contextlib import redirect_stdout
+from unittest import mock
 
 from src.multi.base import BaseMultiAgent
-from src.multi.message import Message, MessageType
+from src.multi.debate import DebateMultiAgent
+from src.multi.message import Message, MessageType, PipelineStep
+from src.multi.pipeline import PipelineMultiAgent
 from src.multi.shared_state import SharedState
 from src.multi.roles import AgentRole, get_role, ROLES
 from src.tools.base import ToolRegistry
@@ -42,6 +49,26 @@ class TestMessage(unittest.TestCase):
         )
         self.assertEqual(msg.metadata["score"], 0.9)
 
+    def test_timestamp_is_monotonic_and_convertible(self):
+        from datetime import datetime
+
+        first = Message(sender="a", receiver="b", content="1")
+        second = Message(sender="a", receiver="b", content="2")
+        self.assertIsInstance(first.timestamp, int)
+        self.assertLessEqual(first.timestamp, second.timestamp)
+        created = datetime.fromisoformat(first.isoformat_timestamp)
+        self.assertLess(abs((datetime.now() - created).total_seconds()), 60)
+
+    def test_data_classes_use_slots(self):
+        instances = [
+            Message(sender="a", receiver="b", content="x"),
+            PipelineStep(agent_name="a"),
+            AgentRole(name="a", description="d", system_prompt="p"),
+            SharedState(),
+        ]
+        for instance in instances:
+            self.assertFalse(hasattr(instance, "__dict__"), type(instance).__name__)
+
     def test_repr(self):
         msg = Message(sender="agent_a", receiver="agent_b", content="short")
         r = repr(msg)
@@ -76,6 +103,19 @@ class TestSharedState(unittest.TestCase):
         self.assertIn("result_a", text)
         self.assertIn("result_b", text)
 
+    def test_get_all_results_keeps_order_when_result_is_overwritten(self):
+        self.state.add_result("a", "v1")
+        self.state.add_result("b", "result_b")
+        self.assertIs(self.state.get_all_results(), self.state.get_all_results())
+
+        self.state.add_result("a", "v2")
+        self.assertEqual(
+            self.state.get_all_results(),
+            "[a] 的结果:\nv2\n\n[b] 的结果:\nresult_b",
+        )
+        self.state.reset()
+        self.assertEqual(self.state.get_all_results(), "(暂无结果)")
+
     def test_get_all_results_empty(self):
         self.assertEqual(self.state.get_all_results(), "(暂无结果)")
 
@@ -92,6 +132,20 @@ class TestSharedState(unittest.TestCase):
         msgs = self.state.get_messages_for("b")
         self.assertEqual(len(msgs), 2)  # "for b" + "broadcast"
 
+    def test_get_messages_for_keeps_arrival_order(self):
+        for receiver, content in [("all", "1"), ("b", "2"), ("c", "x"), ("all", "3"), ("b", "4")]:
+            self.state.add_message(Message(sender="a", receiver=receiver, content=content))
+        self.assertEqual([m.content for m in self.state.get_messages_for("b")], ["1", "2", "3", "4"])
+        self.assertEqual([m.content for m in self.state.get_messages_for("all")], ["1", "3"])
+
+        # 直接追加到 messages 的消息也能被查到
+        self.state.messages.append(Message(sender="a", receiver="b", content="5"))
+        self.state.add_message(Message(sender="a", receiver="b", content="6"))
+        self.assertEqual([m.content for m in self.state.get_messages_for("b")][-2:], ["5", "6"])
+
+        self.state.reset()
+        self.assertEqual(self.state.get_messages_for("b"), [])
+
     def test_reset(self):
         self.state.task = "test"
         self.state.add_result("a", "result")
@@ -158,6 +212,36 @@ class TestBaseMultiAgentSkillWiring(unittest.TestCase):
         self.assertIsNotNone(agent)
         self.assertEqual(agent.available_skills, {"report-from-materials"})
         self.assertEqual(agent._role_system_prompt, role.system_prompt)
+        self.assertEqual(
+            [tool["function"]["name"] for tool in agent.preset_openai_tools],
+            ["read_local_file"],
+        )
+
+    def test_role_tool_registry_is_shared_until_global_registry_changes(self):
+        registry = ToolRegistry()
+        registry.register(ReadLocalFileTool())
+        role = AgentRole(name="reader", description="d", system_prompt="p", tools=["read_local_file", "calculator"])
+        first = StubMultiAgent(llm=object(), tool_registry=registry, verbose=False)
+        second = StubMultiAgent(llm=object(), tool_registry=registry, verbose=False)
+        first.add_agent(role)
+        second.add_agent(role)
+        self.assertIs(first.get_agent("reader").tools, second.get_agent("reader").tools)
+
+        registry.register(CalculatorTool())
+        second.add_agent(role)
+        self.assertEqual(second.get_agent("reader").tools.tool_names, ["read_local_file", "calculator"])
+
+    def test_add_agent_uses_short_prompt_for_roles_without_tools(self):
+        from src.agent.prompt import SYSTEM_PROMPT_FUNCTION_CALLING, SYSTEM_PROMPT_NO_TOOLS
+
+        multi_agent = StubMultiAgent(llm=object(), tool_registry=ToolRegistry(), verbose=False)
+        judge = AgentRole(name="judge", description="裁判", system_prompt="你是裁判。", tools=[])
+
+        multi_agent.add_agent(judge)
+        system_prompt = multi_agent.get_agent("judge").system_prompt
+
+        self.assertIn(SYSTEM_PROMPT_NO_TOOLS, system_prompt)
+        self.assertNotIn(SYSTEM_PROMPT_FUNCTION_CALLING, system_prompt)
 
 
 class TestPipelineStep(unittest.TestCase):
@@ -168,6 +252,363 @@ class TestPipelineStep(unittest.TestCase):
         self.assertEqual(step.retry, 1)
         self.assertIsNone(step.transform)
 
+    def test_render_matches_format_and_skips_unused_all_results(self):
+        from src.multi.message import PipelineStep
+
+        step = PipelineStep(agent_name="writer", task_template="任务：{task}\n上一步：{prev_result} {{原样}}")
+        calls = []
+
+        def all_results():
+            calls.append(1)
+            return "汇总"
+
+        rendered = step.render(task="写报告", prev_result="素材", all_results=all_results)
+        self.assertEqual(rendered, step.task_template.format(task="写报告", prev_result="素材"))
+        self.assertEqual(calls, [])
+
+        step.task_template = "{all_results!r}"
+        self.assertEqual(step.render(task="", prev_result="", all_results=all_results), "'汇总'")
+        self.assertEqual(calls, [1])
+
+
+class _FakeAsyncAgent:
+    """只实现 arun/reset 的 Agent 替身；设置 barrier 时需所有辩手同时到达才返回。"""
+
+    def __init__(self, answer: str, barrier: asyncio.Barrier | None = None):
+        self.answer = answer
+        self.barrier = barrier
+        self.tasks: list[str] = []
+
+    async def arun(self, task: str) -> str:
+        self.tasks.append(task)
+        if self.barrier is not None:
+            await asyncio.wait_for(self.barrier.wait(), timeout=1)
+        return self.answer
+
+    def reset(self) -> None:
+        pass
+
+
+class _FakeSyncAgent:
+    """只实现 run/reset 的 Agent 替身；设置 barrier 时需所有辩手同时到达才返回。"""
+
+    def __init__(self, answer: str, barrier: threading.Barrier | None = None):
+        self.answer = answer
+        self.barrier = barrier
+        self.tasks: list[str] = []
+
+    def run(self, task: str) -> str:
+        self.tasks.append(task)
+        if self.barrier is not None:
+            self.barrier.wait(timeout=2)
+        return self.answer
+
+    def reset(self) -> None:
+        pass
+
+
+def _build_debate(pro, con, judge, **kwargs) -> DebateMultiAgent:
+    """通过 add_debater/set_judge 组装 pro、con 两名辩手和裁判，三者的 Agent 依次换成给定替身。"""
+    debate = DebateMultiAgent(llm=None, tool_registry=ToolRegistry(), verbose=False, **kwargs)
+    stubs = iter([pro, con, judge])
+    with mock.patch("src.multi.base.ReActAgent", side_effect=lambda **_: next(stubs)):
+        debate.add_debater(AgentRole(name="pro", description="正方", system_prompt=""))
+        debate.add_debater(AgentRole(name="con", description="反方", system_prompt=""))
+        debate.set_judge(AgentRole(name="judge", description="裁判", system_prompt=""))
+    return debate
+
+
+class TestDebateConcurrency(unittest.TestCase):
+    def test_run_dispatches_debaters_of_a_round_in_parallel(self):
+        barrier = threading.Barrier(2)
+        pro = _FakeSyncAgent("支持", barrier)
+        con = _FakeSyncAgent("反对", barrier)
+        judge = _FakeSyncAgent("裁决")
+        debate = _build_debate(pro, con, judge, max_rounds=2)
+
+        self.assertEqual(debate.run("是否应该远程办公？"), "裁决")
+        self.assertIn("反对", pro.tasks[1])
+        # 观点按辩手注册顺序交给裁判
+        self.assertLess(judge.tasks[0].index("[pro]"), judge.tasks[0].index("[con]"))
+
+    def test_arun_runs_debaters_of_a_round_concurrently(self):
+        async def scenario():
+            barrier = asyncio.Barrier(2)
+            pro = _FakeAsyncAgent("支持", barrier)
+            con = _FakeAsyncAgent("反对", barrier)
+            judge = _FakeAsyncAgent("裁决：支持方胜")
+            debate = _build_debate(pro, con, judge, max_rounds=2)
+            return debate, pro, judge, await debate.arun("是否应该远程办公？")
+
+        debate, pro, judge, result = asyncio.run(scenario())
+
+        self.assertEqual(result, "裁决：支持方胜")
+        self.assertEqual(debate.state.status, "done")
+        self.assertIn("反对", pro.tasks[1])
+        self.assertIn("[pro]:\n支持", judge.tasks[0])
+
+
+class _HistoryAgent(_FakeSyncAgent):
+    """记录 reset 次数，模拟保留对话历史的 Agent。"""
+
+    def __init__(self, answer: str):
+        super().__init__(answer)
+        self.resets = 0
+
+    def reset(self) -> None:
+        self.resets += 1
+
+
+class TestPersistentDebate(unittest.TestCase):
+    def test_later_rounds_send_only_new_opinions_without_reset(self):
+        pro, con, judge = _HistoryAgent("支持"), _HistoryAgent("反对"), _HistoryAgent("裁决")
+        debate = _build_debate(pro, con, judge, max_rounds=3, persistent=True)
+
+        self.assertEqual(debate.run("是否应该远程办公？"), "裁决")
+
+        self.assertIn("是否应该远程办公？", pro.tasks[0])
+        for later in pro.tasks[1:]:
+            self.assertTrue(later.startswith("新信息："))
+            self.assertNotIn("远程办公", later)
+        self.assertIn("[第1轮 - con]", pro.tasks[1])
+        self.assertNotIn("[第1轮", pro.tasks[2])
+        self.assertIn("[第2轮 - con]", pro.tasks[2])
+        self.assertEqual(pro.resets, 1)  # 只在开场时清空上一场的历史
+
+
+class TestDebateFormatting(unittest.TestCase):
+    def test_format_opinions_reuses_blobs_and_keeps_layout(self):
+        debate = DebateMultiAgent(llm=None, tool_registry=ToolRegistry(), verbose=False)
+        all_rounds = [{"pro": "支持", "con": "反对"}]
+
+        self.assertEqual(debate._format_opinions(all_rounds, exclude="pro"), "[第1轮 - con]:\n反对\n")
+        first_blobs = debate._round_blobs[0]
+
+        all_rounds.append({"pro": "仍支持", "con": "仍反对"})
+        self.assertEqual(
+            debate._format_opinions(all_rounds, exclude="con"),
+            "[第1轮 - pro]:\n支持\n\n[第2轮 - pro]:\n仍支持\n",
+        )
+        self.assertIs(debate._round_blobs[0], first_blobs)
+        self.assertEqual(debate._format_opinions([], exclude="pro"), "(暂无其他观点)")
+
+    def test_format_opinions_does_not_reuse_blobs_across_round_lists(self):
+        debate = DebateMultiAgent(llm=None, tool_registry=ToolRegistry(), verbose=False)
+        debate._format_opinions([{"pro": "支持", "con": "反对"}], exclude="pro")
+
+        other_rounds = [{"pro": "别的辩题", "con": "另一种观点"}, {"pro": "二", "con": "三"}]
+        self.assertEqual(
+            debate._format_opinions(other_rounds, exclude="pro"),
+            "[第1轮 - con]:\n另一种观点\n\n[第2轮 - con]:\n三\n",
+        )
+
+
+class TestDispatchCache(unittest.TestCase):
+    def setUp(self):
+        self.multi_agent = StubMultiAgent(llm=object(), tool_registry=ToolRegistry(), verbose=False)
+        self.agent = _FakeSyncAgent("结果")
+        self.multi_agent._agents = {"writer": self.agent}
+
+    def test_cache_is_disabled_by_default(self):
+        self.multi_agent._dispatch("writer", "写摘要")
+        self.multi_agent._dispatch("writer", "写摘要")
+        self.assertEqual(len(self.agent.tasks), 2)
+
+    def test_cache_hit_skips_agent_and_fires_hooks(self):
+        hits = []
+        self.multi_agent.on("on_cache_hit", lambda agent_name, task: hits.append(task))
+        self.multi_agent.enable_cache()
+
+        first = self.multi_agent._dispatch("writer", "写摘要")
+        second = self.multi_agent._dispatch("writer", "写摘要")
+        self.multi_agent._dispatch("writer", "写摘要", use_cache=False)
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.agent.tasks), 2)
+        self.assertEqual(hits, ["写摘要"])
+        self.assertEqual(self.multi_agent.state.get_result("writer"), "结果")
+
+        self.multi_agent.clear_cache()
+        self.multi_agent._dispatch("writer", "写摘要")
+        self.assertEqual(len(self.agent.tasks), 3)
+
+    def test_error_results_are_not_cached(self):
+        self.agent.answer = "错误：失败"
+        self.multi_agent.enable_cache()
+        self.multi_agent._dispatch("writer", "写摘要")
+        self.multi_agent._dispatch("writer", "写摘要")
+        self.assertEqual(len(self.agent.tasks), 2)
+
+
+
+class TestHooks(unittest.TestCase):
+    def test_fire_hook_uses_snapshot_and_isolates_errors(self):
+        multi_agent = StubMultiAgent(llm=object(), tool_registry=ToolRegistry(), verbose=False)
+        calls = []
+
+        def failing(**kwargs):
+            multi_agent.on("on_error", lambda **kw: calls.append("late"))
+            raise RuntimeError("boom")
+
+        multi_agent.on("on_error", failing)
+        multi_agent.on("on_error", lambda **kw: calls.append(kw["agent_name"]))
+
+        multi_agent._fire_hook("on_error", agent_name="writer", error=None)
+        multi_agent._fire_hook("on_unknown")
+
+        self.assertEqual(calls, ["writer"])
+        self.assertEqual(len(multi_agent._hooks["on_error"]), 3)
+
+
+class _StreamingAgent:
+    """流式输出两个段落的 Agent 替身：第一段交出后等待下游开始处理再继续生成。"""
+
+    def __init__(self, downstream_started):
+        self.stream = False
+        self.on_chunk = None
+        self.downstream_started = downstream_started
+        self.overlapped = False
+
+    def run(self, task):
+        if self.on_chunk is not None:
+            self.on_chunk("第一段\n\n")
+            self.overlapped = self.downstream_started.wait(timeout=2)
+            self.on_chunk("第二段")
+        return "第一段\n\n第二段"
+
+    def reset(self):
+        pass
+
+
+class _SummaryAgent(_FakeSyncAgent):
+    def __init__(self, started):
+        super().__init__("")
+        self.started = started
+
+    def run(self, task):
+        self.tasks.append(task)
+        self.started.set()
+        return f"摘要:{task}"
+
+
+class TestPipelineStreaming(unittest.TestCase):
+    def _build(self, stream_to_next):
+        started = threading.Event()
+        pipeline = PipelineMultiAgent(llm=None, tool_registry=ToolRegistry(), verbose=False, steps=[
+            PipelineStep(agent_name="researcher", stream_to_next=stream_to_next),
+            PipelineStep(agent_name="writer", task_template="{prev_result}"),
+        ])
+        researcher, writer = _StreamingAgent(started), _SummaryAgent(started)
+        pipeline._agents = {"researcher": researcher, "writer": writer}
+        return pipeline, researcher, writer
+
+    def test_next_step_consumes_sections_while_previous_step_streams(self):
+        pipeline, researcher, writer = self._build(stream_to_next=True)
+
+        result = pipeline.run("调研")
+
+        self.assertTrue(researcher.overlapped)
+        self.assertFalse(researcher.stream)
+        self.assertEqual(writer.tasks, ["第一段", "第二段"])
+        self.assertEqual(result, "摘要:第一段\n\n摘要:第二段")
+        self.assertEqual(pipeline.state.get_result("writer"), result)
+
+    def test_failed_section_falls_back_to_blocking_next_step(self):
+        pipeline, researcher, writer = self._build(stream_to_next=True)
+        summarize = writer.run
+        writer.run = lambda task: "错误：段落处理失败" if task == "第二段" else summarize(task)
+
+        result = pipeline.run("调研")
+
+        self.assertEqual(writer.tasks, ["第一段", "第一段\n\n第二段"])
+        self.assertEqual(result, "摘要:第一段\n\n第二段")
+
+    def test_streamed_step_records_state_in_step_order(self):
+        pipeline, researcher, writer = self._build(stream_to_next=True)
+        pipeline._steps.append(PipelineStep(agent_name="editor", task_template="{all_results}"))
+        pipeline._agents["editor"] = _FakeSyncAgent("定稿")
+        finished = []
+        pipeline.on("on_agent_finish", lambda agent_name, result: finished.append(agent_name))
+
+        pipeline.run("调研")
+
+        self.assertEqual(list(pipeline.state.results), ["researcher", "writer", "editor"])
+        self.assertEqual(len(pipeline.state.messages), 6)
+        self.assertEqual(finished, ["researcher", "writer", "editor"])
+
+    def test_failed_section_leaves_no_partial_state(self):
+        pipeline, researcher, writer = self._build(stream_to_next=True)
+        summarize = writer.run
+        writer.run = lambda task: "错误：段落处理失败" if task == "第二段" else summarize(task)
+
+        pipeline.run("调研")
+
+        self.assertEqual(list(pipeline.state.results), ["researcher", "writer"])
+        self.assertEqual(len(pipeline.state.messages), 4)
+
+    def test_streaming_is_opt_in(self):
+        pipeline, researcher, writer = self._build(stream_to_next=False)
+
+        result = pipeline.run("调研")
+
+        self.assertEqual(writer.tasks, ["第一段\n\n第二段"])
+        self.assertEqual(result, "摘要:第一段\n\n第二段")
+
+
+class _LoggingMultiAgent(BaseMultiAgent):
+    def run(self, task: str) -> str:
+        try:
+            self._log_header("开始")
+            self._fire_hook("on_step_complete", step=1, state=self.state)
+            self._log(f"任务: {task}")
+            return task
+        finally:
+            self._flush_log()
+
+
+class TestBufferedLog(unittest.TestCase):
+    def test_log_is_buffered_and_flushed_at_hooks_and_run_exit(self):
+        multi_agent = _LoggingMultiAgent(llm=object(), tool_registry=ToolRegistry(), verbose=True)
+        seen_at_hook = []
+        output = io.StringIO()
+        multi_agent.on("on_step_complete", lambda step, state: seen_at_hook.append(output.getvalue()))
+
+        with redirect_stdout(output):
+            multi_agent._log("缓冲中")
+            self.assertEqual(output.getvalue(), "")
+            multi_agent.run("写摘要")
+
+        self.assertIn("开始", seen_at_hook[0])
+        self.assertNotIn("任务", seen_at_hook[0])
+        self.assertTrue(output.getvalue().startswith("缓冲中\n"))
+        self.assertTrue(output.getvalue().endswith("任务: 写摘要\n"))
+
+    def test_collaboration_modes_flush_log_on_run_exit(self):
+        pipeline = PipelineMultiAgent(llm=None, tool_registry=ToolRegistry(), verbose=True, steps=[
+            PipelineStep(agent_name="writer"),
+        ])
+        pipeline._agents = {"writer": _HistoryAgent("摘要")}
+        output = io.StringIO()
+
+        with redirect_stdout(output):
+            pipeline.run("写摘要")
+
+        self.assertIn("Pipeline 完成", output.getvalue())
+        self.assertEqual(pipeline._log_buf.tell(), 0)
+
+    def test_log_is_flushed_at_dispatch_boundaries_without_hooks(self):
+        multi_agent = _LoggingMultiAgent(llm=object(), tool_registry=ToolRegistry(), verbose=True)
+        multi_agent._agents = {"writer": _HistoryAgent("摘要")}
+        output = io.StringIO()
+
+        with redirect_stdout(output):
+            multi_agent._log("分派前")
+            multi_agent._dispatch("writer", "写摘要")
+            self.assertEqual(output.getvalue(), "分派前\n")
+            multi_agent._log("步骤完成")
+            multi_agent._fire_hook("on_step_complete", step=1, state=multi_agent.state)
+            self.assertEqual(output.getvalue(), "分派前\n步骤完成\n")
+
 
 if __name__ == "__main__":
     unittest.main()
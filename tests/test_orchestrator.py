@@ -3,8 +3,10 @@
 验证失败后的重规划行为，不依赖真实 LLM API。
 """
 
+import asyncio
 import os
 import sys
+import threading
 import types
 import unittest
 
@@ -47,6 +49,9 @@ class FakeLLM:
         self.simple_calls.append((prompt, system))
         return self.simple_responses.pop(0) if self.simple_responses else ""
 
+    async def achat_simple(self, prompt: str, system: str = "") -> str:
+        return self.chat_simple(prompt, system)
+
 
 class StubOrchestrator(OrchestratorMultiAgent):
     def __init__(self, *, llm, dispatch_responses, max_replan=1):
@@ -54,9 +59,9 @@ class StubOrchestrator(OrchestratorMultiAgent):
         self._agents = {"researcher": object()}
         self.dispatch_responses = list(dispatch_responses)
 
-    def _dispatch(self, agent_name: str, task: str) -> str:
+    def _dispatch(self, agent_name: str, task: str, result_key: str | None = None) -> str:
         result = self.dispatch_responses.pop(0)
-        self.state.add_result(agent_name, result)
+        self.state.add_result(result_key or agent_name, result)
         return result
 
 
@@ -104,5 +109,182 @@ class TestOrchestratorReplan(unittest.TestCase):
         self.assertEqual(orchestrator.state.status, "done")
 
 
+class ParallelStubOrchestrator(OrchestratorMultiAgent):
+    """前两个独立步骤必须同时到达 barrier 才能完成，用于验证并发执行。"""
+
+    def __init__(self, *, llm):
+        super().__init__(llm=llm, tool_registry=ToolRegistry(), max_replan=0, verbose=False)
+        self._agents = {"researcher": object(), "analyst": object(), "writer": object()}
+        self.barrier = threading.Barrier(2, timeout=2)
+        self.tasks: list[str] = []
+
+    def _dispatch(self, agent_name: str, task: str, result_key: str | None = None) -> str:
+        self.tasks.append(task)
+        if task.startswith("收集"):
+            self.barrier.wait()
+            result = f"{task[:3]}完成"
+        else:
+            result = "报告完成"
+        with self._state_lock:
+            self.state.add_result(result_key or agent_name, result)
+        return result
+
+
+class AsyncStubOrchestrator(ParallelStubOrchestrator):
+    """异步版本：两个独立步骤都开始后才一起完成，用于验证 asyncio.gather 并发分派。"""
+
+    def __init__(self, *, llm):
+        super().__init__(llm=llm)
+        self.in_flight = 0
+        self.both_started: asyncio.Event | None = None
+
+    async def _adispatch(self, agent_name: str, task: str, result_key: str | None = None) -> str:
+        self.tasks.append(task)
+        if task.startswith("收集"):
+            self.both_started = self.both_started or asyncio.Event()
+            self.in_flight += 1
+            if self.in_flight == 2:
+                self.both_started.set()
+            await asyncio.wait_for(self.both_started.wait(), timeout=2)
+            result = f"{task[:3]}完成"
+        else:
+            result = "报告完成"
+        self.state.add_result(result_key or agent_name, result)
+        return result
+
+
+class _SerialAgent:
+    """记录并发进入次数的假 Agent，直接走 BaseMultiAgent._dispatch。"""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def _enter(self, task: str) -> str:
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        return f"done {task}"
+
+    def _exit(self) -> None:
+        with self.lock:
+            self.active -= 1
+
+    def run(self, task: str) -> str:
+        try:
+            result = self._enter(task)
+            threading.Event().wait(0.01)
+            return result
+        finally:
+            self._exit()
+
+    async def arun(self, task: str) -> str:
+        try:
+            result = self._enter(task)
+            await asyncio.sleep(0.01)
+            return result
+        finally:
+            self._exit()
+
+    def reset(self) -> None:
+        pass
+
+
+class TestOrchestratorDependencies(unittest.TestCase):
+    def test_parse_plan_defaults_missing_deps_to_all_previous_steps(self):
+        orchestrator = StubOrchestrator(llm=FakeLLM(), dispatch_responses=[])
+        plan = orchestrator._parse_plan(
+            '[{"agent": "a", "task": "x"}, {"agent": "a", "task": "y"},'
+            ' {"agent": "a", "task": "z", "deps": [1, 5, "2"]}, {"agent": "a", "task": "w", "deps": []}]'
+        )
+        self.assertEqual([step["deps"] for step in plan], [[], [0], [0], []])
+
+    def test_parse_plan_handles_bracketed_prose_around_the_json(self):
+        orchestrator = StubOrchestrator(llm=FakeLLM(), dispatch_responses=[])
+        plan = orchestrator._parse_plan(
+            '计划如下 [草案]：\n```json\n[{"agent": "a", "task": "x"}]\n```\n[完]'
+        )
+        self.assertEqual(plan, [{"agent": "a", "task": "x", "deps": []}])
+        self.assertEqual(orchestrator._parse_plan("没有计划"), [])
+        self.assertEqual(orchestrator._parse_plan("] 倒置 ["), [])
+
+    def test_build_step_task_appends_only_dependency_results(self):
+        from src.multi.orchestrator import OrchestratorMultiAgent
+
+        plan = [
+            {"agent": "a", "task": "x", "deps": []},
+            {"agent": "b", "task": "y", "deps": []},
+            {"agent": "c", "task": "z", "deps": [0, 1]},
+        ]
+        task = OrchestratorMultiAgent._build_step_task(plan, 2, {0: "rx", 1: "ry"})
+        self.assertEqual(
+            task,
+            "z\n\n[参考信息] 前面步骤的结果:\n[a] 的结果:\nrx\n\n[b] 的结果:\nry",
+        )
+        self.assertEqual(OrchestratorMultiAgent._build_step_task(plan, 1, {}), "y")
+
+    def test_independent_steps_run_concurrently_and_get_only_their_deps(self):
+        fake_llm = FakeLLM(
+            simple_responses=[
+                '[{"agent": "researcher", "task": "收集A", "deps": []},'
+                ' {"agent": "analyst", "task": "收集B", "deps": []},'
+                ' {"agent": "writer", "task": "写报告", "deps": [2]}]',
+                "最终总结",
+            ]
+        )
+        orchestrator = ParallelStubOrchestrator(llm=fake_llm)
+
+        result = orchestrator.run("调研并写报告")
+
+        self.assertEqual(result, "最终总结")
+        report_task = orchestrator.tasks[-1]
+        self.assertIn("收集B完成", report_task)
+        self.assertNotIn("收集A完成", report_task)
+
+    def test_arun_gathers_independent_steps_in_one_event_loop(self):
+        fake_llm = FakeLLM(
+            simple_responses=[
+                '[{"agent": "researcher", "task": "收集A", "deps": []},'
+                ' {"agent": "analyst", "task": "收集B", "deps": []},'
+                ' {"agent": "writer", "task": "写报告", "deps": [1, 2]}]',
+                "最终总结",
+            ]
+        )
+        orchestrator = AsyncStubOrchestrator(llm=fake_llm)
+
+        result = asyncio.run(orchestrator.arun("调研并写报告"))
+
+        self.assertEqual(result, "最终总结")
+        self.assertEqual(orchestrator.state.status, "done")
+        self.assertIn("收集A完成", orchestrator.tasks[-1])
+        self.assertIn("收集B完成", orchestrator.tasks[-1])
+
+    def test_same_agent_steps_run_serially_and_all_reach_the_summarizer(self):
+        plan = (
+            '[{"agent": "r", "task": "gather A", "deps": []},'
+            ' {"agent": "r", "task": "gather B", "deps": []},'
+            ' {"agent": "w", "task": "gather C", "deps": []}]'
+        )
+        for use_async in (False, True):
+            fake_llm = FakeLLM(simple_responses=[plan, "最终总结"])
+            orchestrator = OrchestratorMultiAgent(
+                llm=fake_llm, tool_registry=ToolRegistry(), max_replan=0, verbose=False
+            )
+            orchestrator._agents = {"r": _SerialAgent(), "w": _SerialAgent()}
+
+            if use_async:
+                result = asyncio.run(orchestrator.arun("调研"))
+            else:
+                result = orchestrator.run("调研")
+
+            self.assertEqual(result, "最终总结")
+            self.assertEqual(orchestrator._agents["r"].max_active, 1)
+            summary_prompt = fake_llm.simple_calls[-1][0]
+            self.assertIn("[1:r] 的结果:\ndone gather A", summary_prompt)
+            self.assertIn("[2:r] 的结果:\ndone gather B", summary_prompt)
+            self.assertIn("[3:w] 的结果:\ndone gather C", summary_prompt)
+
+
 if __name__ == "__main__":
     unittest.main()
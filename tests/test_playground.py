@@ -20,9 +20,10 @@ def _install_fake_dependencies() -> None:
     openai_module = types.ModuleType("openai")
 
     class DummyOpenAI:
-        def __init__(self, api_key, base_url):
+        def __init__(self, api_key, base_url, **kwargs):
             self.api_key = api_key
             self.base_url = base_url
+            self.options = kwargs
             self.chat = types.SimpleNamespace(
                 completions=types.SimpleNamespace(create=lambda **kwargs: kwargs)
             )
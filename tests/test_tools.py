@@ -1,6 +1,7 @@
 """工具模块单元测试"""
 
 import json
+import math
 import sys
 import os
 
@@ -9,6 +10,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import tempfile
 import unittest
 from pathlib import Path
+from unittest.mock import patch
 
 from src.tools.base import Tool, ToolRegistry
 from src.tools.calculator import CalculatorTool
@@ -49,6 +51,15 @@ class TestCalculatorTool(unittest.TestCase):
         result = self.calc.run(expression="sqrt(16)")
         self.assertEqual(result, "4")
 
+    def test_non_finite_results_are_formatted(self):
+        self.assertEqual(self.calc.run(expression="1e308 * 10"), "inf")
+        self.assertEqual(self.calc.run(expression="-1e308 * 10"), "-inf")
+        self.assertEqual(self.calc.run(expression="1e308 * 10 - 1e308 * 10"), "nan")
+
+    def test_complex_results_are_rejected(self):
+        self.assertIn("结果不是实数", self.calc.run(expression="(-8) ** 0.5"))
+        self.assertIn("结果不是实数", self.calc.run(expression="(-8) ** (1 / 3) + 1"))
+
     def test_division_by_zero(self):
         result = self.calc.run(expression="1 / 0")
         self.assertIn("错误", result)
@@ -57,6 +68,118 @@ class TestCalculatorTool(unittest.TestCase):
         result = self.calc.run(expression="import os")
         self.assertIn("错误", result)
 
+    def test_blocklisted_fragments_skip_the_parser(self):
+        from src.tools import calculator
+
+        calculator._compile_expression.cache_clear()
+        calc = CalculatorTool(cache_size=0)
+        for expression in ["import os", "__import__('os')", "open('x')", "lambda: 1"]:
+            self.assertIn("包含不支持的内容", calc.run(expression=expression))
+        self.assertEqual(calculator._compile_expression.cache_info().misses, 0)
+
+    def test_unsupported_node_types_are_rejected(self):
+        self.assertIn("不支持的表达式类型: List", self.calc.run(expression="[1, 2]"))
+        self.assertIn("不支持的表达式类型: Compare", self.calc.run(expression="1 < 2"))
+        self.assertIn("不支持的变量: x", self.calc.run(expression="x + 1"))
+
+    def test_repeated_expression_is_parsed_once(self):
+        from src.tools import calculator
+
+        calc = CalculatorTool(cache_size=0)  # 关闭结果缓存，只观察编译缓存
+        calculator._compile_expression.cache_clear()
+        self.assertEqual(calc.run(expression="sin(pi/2)"), "1")
+        self.assertEqual(calc.run(expression="sin(pi/2)"), "1")
+        self.assertIn("错误", calc.run(expression="1 +"))
+        info = calculator._compile_expression.cache_info()
+        self.assertEqual((info.hits, info.currsize), (1, 1))
+
+    def test_constant_subexpressions_are_folded_at_compile_time(self):
+        from src.tools import calculator
+
+        self.assertEqual(calculator._compile_expression("sqrt(16) + 2 * 3"), ((calculator.LOAD_CONST, 10.0),))
+        # 折叠出错的子表达式保留到运行时，仍返回原有的错误信息
+        self.assertEqual(self.calc.run(expression="1 / (2 - 2)"), "错误：除以零")
+        self.assertEqual(self.calc.run(expression="log(e) - -1"), "2")
+        self.assertIn("不支持的变量", self.calc.run(expression="sqrt"))
+
+    def test_results_are_memoized_with_lru_eviction(self):
+        calc = CalculatorTool(cache_size=2)
+        for expression in ["1 + 1", "2 + 2", "1 + 1", "3 + 3"]:
+            calc.run(expression=expression)
+        calc.run(expression="1 / 0")
+
+        self.assertEqual(list(calc._cache), ["1 + 1", "3 + 3"])
+        self.assertEqual(calc.run(expression="1 + 1"), "2")
+
+    def test_deeply_nested_expression_compiles_without_recursion(self):
+        expression = "+".join(["1"] * (sys.getrecursionlimit() + 500))
+        self.assertEqual(
+            self.calc.run(expression=expression), str(sys.getrecursionlimit() + 500)
+        )
+
+    def test_vm_executes_every_opcode(self):
+        from src.tools import calculator
+
+        def run(*ops):
+            return calculator._execute([(calculator.LOAD_CONST, 7.0), (calculator.LOAD_CONST, 2.0), *ops])
+
+        self.assertEqual(run((calculator.ADD, None)), 9.0)
+        self.assertEqual(run((calculator.SUB, None)), 5.0)
+        self.assertEqual(run((calculator.MUL, None)), 14.0)
+        self.assertEqual(run((calculator.DIV, None)), 3.5)
+        self.assertEqual(run((calculator.FLOORDIV, None)), 3.0)
+        self.assertEqual(run((calculator.MOD, None)), 1.0)
+        self.assertEqual(run((calculator.POW, None)), 49.0)
+        self.assertEqual(run((calculator.NEG, None), (calculator.ADD, None)), 5.0)
+        self.assertEqual(run((calculator.POS, None), (calculator.SUB, None)), 5.0)
+        self.assertAlmostEqual(run((calculator.CALL, (math.log, 2))), 2.807354922057604)
+        self.assertEqual(run((calculator.CALL1, math.sqrt), (calculator.ADD, None)), 7.0 + math.sqrt(2.0))
+
+    def test_folded_constants_skip_the_vm(self):
+        from src.tools import calculator
+
+        calc = CalculatorTool(cache_size=0)
+        calculator._compile_expression("2 + 3 * 4")  # 编译期折叠本身会调用 _execute，先完成编译
+        calculator._compile_expression("1 / (2 - 2)")
+        with patch.object(calculator, "_execute", wraps=calculator._execute) as execute:
+            self.assertEqual(calc.run(expression="2 + 3 * 4"), "14")
+            execute.assert_not_called()
+            # 折叠失败的子表达式保留在字节码里，由虚拟机在运行时报错
+            self.assertEqual(calc.run(expression="1 / (2 - 2)"), "错误：除以零")
+            execute.assert_called_once()
+
+    def test_vector_mode_validates_before_numexpr(self):
+        values = {"x": [1.0, 4.0, 9.0]}
+        self.assertIn("不支持的变量: y", self.calc.run(expression="x + y", values=values))
+        self.assertIn("不支持的表达式类型: Attribute", self.calc.run(expression="x.T", values=values))
+        self.assertIn("不支持的函数", self.calc.run(expression="round(x)", values=values))
+
+        try:
+            import numexpr  # noqa: F401
+        except ImportError:
+            self.assertIn("numexpr", self.calc.run(expression="sqrt(x) * 2", values=values))
+        else:
+            self.assertEqual(self.calc.run(expression="sqrt(x) * 2", values=values), "[2.0, 4.0, 6.0]")
+
+    def test_run_many_matches_individual_runs(self):
+        expressions = ["2 + 3 * 4", "1 / 0", "sqrt(16) - 1", "abc", "2 ** 0.5"]
+        expected = [CalculatorTool(cache_size=0).run(expression=e) for e in expressions]
+        self.assertEqual(self.calc.run_many(expressions), expected)
+
+    def test_schema_is_a_shared_class_constant(self):
+        from src.tools import CALCULATOR, WEATHER
+
+        self.assertIs(CalculatorTool().parameters, CALCULATOR.parameters)
+        self.assertIs(WeatherTool().parameters, WEATHER.parameters)
+        self.assertIs(SearchTool().parameters, SearchTool(backend="mcp").parameters)
+        self.assertEqual(CALCULATOR.run(expression="6 * 7"), "42")
+
+    def test_static_tools_share_class_level_openai_schema(self):
+        for tool_cls in (CalculatorTool, WeatherTool, SearchTool):
+            schema = tool_cls().to_openai_tool()
+            self.assertIs(schema, tool_cls._SCHEMA)
+            self.assertEqual(schema["function"]["name"], tool_cls().name)
+
     def test_openai_tool_format(self):
         tool_def = self.calc.to_openai_tool()
         self.assertEqual(tool_def["type"], "function")
@@ -73,6 +196,24 @@ class TestWeatherTool(unittest.TestCase):
         self.assertIn("北京", result)
         self.assertIn("°C", result)
 
+    def test_known_city_returns_full_report(self):
+        self.assertEqual(
+            self.weather.run(city="上海"),
+            "上海天气：多云，温度 18°C，湿度 65%，风力 东风2级",
+        )
+
+    def test_unknown_city_uses_module_rng(self):
+        from src.tools import weather
+
+        state = weather._RNG.getstate()
+        try:
+            weather._RNG.seed(7)
+            first = self.weather.run(city="纽约")
+            weather._RNG.seed(7)
+            self.assertEqual(self.weather.run(city="纽约"), first)
+        finally:
+            weather._RNG.setstate(state)
+
     def test_unknown_city(self):
         result = self.weather.run(city="纽约")
         self.assertIn("纽约", result)
@@ -92,6 +233,35 @@ class TestSearchTool(unittest.TestCase):
         result = self.search.run(query="python 编程")
         self.assertIn("Python", result)
 
+    def test_known_query_formats_numbered_results(self):
+        result = self.search.run(query="React Agent 原理")
+        self.assertEqual(
+            result.splitlines()[:3],
+            [
+                "搜索 'React Agent 原理' 的结果：",
+                "  1. [ReAct: Synergizing Reasoning and Acting in LLMs](https://arxiv.org/abs/2210.03629)",
+                "     ReAct 论文提出了一种将推理和行动结合的方法。",
+            ],
+        )
+
+    def test_multiple_keywords_prefer_declaration_order(self):
+        result = self.search.run(query="用 Python 实现 ReAct Agent")
+        self.assertIn("Python 官方文档", result)
+        self.assertNotIn("ReAct: Synergizing", result)
+
+    def test_regex_fallback_prefers_declaration_order(self):
+        from src.tools import search
+
+        with patch.object(search, "_keyword_automaton", return_value=None):
+            self.assertEqual(search._match_keyword("react agent 与 python"), "python")
+            self.assertEqual(search._match_keyword("大语言模型 react agent"), "react agent")
+            self.assertIsNone(search._match_keyword("随机搜索词"))
+
+    def test_keyword_match_is_case_insensitive(self):
+        result = self.search.run(query="什么是 ReAct AGENT？")
+        self.assertIn("ReAct: Synergizing", result)
+        self.assertTrue(result.startswith("搜索 '什么是 ReAct AGENT？' 的结果："))
+
     def test_unknown_query(self):
         result = self.search.run(query="随机搜索词")
         self.assertIn("搜索", result)
@@ -248,6 +418,26 @@ class TestToolRegistry(unittest.TestCase):
         tools = self.registry.to_openai_tools()
         self.assertEqual(len(tools), 2)
 
+    def test_to_openai_tools_cached_until_register(self):
+        tools = self.registry.to_openai_tools()
+        self.assertIs(self.registry.to_openai_tools(), tools)
+
+        self.registry.register(SearchTool())
+        refreshed = self.registry.to_openai_tools()
+        self.assertIsNot(refreshed, tools)
+        self.assertEqual(len(refreshed), 3)
+
+    def test_tool_schema_and_description_are_shared_and_cached(self):
+        calculator = self.registry.get("calculator")
+        other = ToolRegistry()
+        other.register(calculator)
+        self.assertIs(other.to_openai_tools()[0], self.registry.to_openai_tools()[0])
+
+        description = self.registry.get_tools_description()
+        self.assertIs(self.registry.get_tools_description(), description)
+        self.registry.register(SearchTool())
+        self.assertIn("search", self.registry.get_tools_description())
+
     def test_contains(self):
         self.assertIn("calculator", self.registry)
         self.assertNotIn("nonexistent", self.registry)